@@ -0,0 +1,180 @@
+"""
+Admission control: decides, before any work is done, whether a request runs.
+
+Every HTTP request and MQTT command spends a token from a bucket shared by
+everyone and, on arrival, one from the bucket of where it came from (the
+client address).  Once the caller is authenticated it also spends one from
+its user's bucket; charging users only after the password checks out means
+nobody can spend another user's tokens, and inventing usernames gains nothing.
+Buckets refill at a steady rate up to a burst size, so a client can be briefly
+busy but not busy forever, and the server as a whole never takes on more than
+it was sized for.  The costly operations (creating a user runs Argon2,
+creating a game allocates it) are also capped in how many may run at once.
+
+Nothing waits: a request that doesn't fit is refused right away with a 429
+and a Retry-After, which is cheaper for everyone than holding it in a queue
+behind the work that caused the overload.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+import math
+import time
+from fastapi import HTTPException, status
+
+
+class TokenBucket(object):
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        """
+        :param rate: tokens added per second
+        :param burst: most tokens the bucket holds; it starts full
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait_time(self, now: float, cost: float = 1.0) -> float:
+        """
+        Refills the bucket up to ``now``.
+
+        A cost larger than the burst is let through once the bucket is full,
+        and the tokens go negative: the debt is repaid before the next request.
+
+        :return: seconds until ``cost`` tokens are available, 0.0 if they are now
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        cost = min(cost, self.burst)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+
+class AdmissionController(object):
+    def __init__(self, user_rate: float = 20.0, user_burst: float = 40.0,
+                 global_rate: float = 5000.0, global_burst: float = 10000.0,
+                 address_rate: float = 100.0, address_burst: float = 200.0,
+                 concurrency: Optional[Dict[str, int]] = None, max_keys: int = 100000,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param user_rate: requests per second for each authenticated user, 0 for no per-user limit
+        :param user_burst: requests a user may make at once after being idle
+        :param global_rate: requests per second for the whole server, 0 for no limit
+        :param global_burst: requests the server takes at once after being idle
+        :param address_rate: requests per second from each client address (or other
+            unauthenticated source), 0 for no limit
+        :param address_burst: requests an address may make at once after being idle
+        :param concurrency: operation name -> how many may run at once, see limit()
+        :param max_keys: user and address buckets kept; the least recently used ones are dropped
+        """
+        self._rates = {'user': (user_rate, max(user_burst, 1.0)),
+                       'address': (address_rate, max(address_burst, 1.0))}
+        self._clock = clock
+        self._global = TokenBucket(global_rate, max(global_burst, 1.0), clock()) if global_rate > 0 else None
+        self._buckets: 'OrderedDict[Tuple[str, str], TokenBucket]' = OrderedDict()
+        self._max_keys = max_keys
+        self._limits = dict(concurrency or {})
+        self._running: Dict[str, int] = {name: 0 for name in self._limits}
+        self.admitted = 0
+        self.throttled: Dict[str, int] = {'address': 0, 'user': 0, 'global': 0, 'concurrency': 0}
+
+    def _bucket(self, kind: str, name: Optional[str], now: float) -> Optional[TokenBucket]:
+        rate, burst = self._rates[kind]
+        if name is None or rate <= 0:
+            return None
+        key = (kind, name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _refuse(self, reason: str, detail: str, retry_after: float):
+        self.throttled[reason] += 1
+        raise HTTPException(status.HTTP_429_TOO_MANY_REQUESTS, detail,
+                            headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+    def admit(self, address: Optional[str], cost: float = 1.0):
+        """
+        Entry check, before anything is known about the caller: spends ``cost``
+        tokens from the bucket of ``address`` and the global bucket, or neither
+        if either is short.
+
+        :param address: where the request came from, e.g. the client's IP
+            address; None to check only the global bucket
+        :raises: HTTPException 429 with a Retry-After header
+        """
+        now = self._clock()
+        source = self._bucket('address', address, now)
+        if source is not None:
+            wait = source.wait_time(now, cost)
+            if wait:
+                self._refuse('address', f"Too many requests from {address}, slow down.", wait)
+        if self._global is not None:
+            wait = self._global.wait_time(now, cost)
+            if wait:
+                self._refuse('global', "Server busy, try again later.", wait)
+            self._global.tokens -= cost
+        if source is not None:
+            source.tokens -= cost
+        self.admitted += 1
+
+    def charge(self, name: Optional[str], cost: float = 1.0, kind: str = 'user', global_cost: float = 0.0):
+        """
+        Spends ``cost`` tokens from one bucket.  Call it for a user once the
+        user is authenticated, so nobody can spend someone else's tokens.
+
+        :param kind: 'user'; 'address' for an unauthenticated source that only
+            becomes known after the entry check; 'global' (``name`` unused) for
+            work a request turns out to carry beyond its entry token
+        :param global_cost: tokens also spent from the global bucket; neither
+            bucket is spent if either is short
+        :raises: HTTPException 429 with a Retry-After header
+        """
+        now = self._clock()
+        charges = [(kind, self._global if kind == 'global' else self._bucket(kind, name, now), cost)]
+        if global_cost > 0 and kind != 'global':
+            charges.append(('global', self._global, global_cost))
+        for reason, bucket, amount in charges:
+            if bucket is not None:
+                wait = bucket.wait_time(now, amount)
+                if wait:
+                    detail = "Server busy, try again later." if reason == 'global' else \
+                        f"Too many requests from {name}, slow down."
+                    self._refuse(reason, detail, wait)
+        for _, bucket, amount in charges:
+            if bucket is not None:
+                bucket.tokens -= amount
+
+    @contextmanager
+    def limit(self, operation: str, count: int = 1):
+        """
+        Runs the block, which does ``count`` of ``operation``, if they fit
+        within the configured number running at once, without waiting for free
+        slots.  More than the limit at once runs only with no other running.
+        Operations without a limit always run.
+
+        :raises: HTTPException 429 if the operation is at its limit
+        """
+        limit = self._limits.get(operation)
+        if limit is not None:
+            count = min(count, limit)
+            if self._running[operation] + count > limit:
+                self._refuse('concurrency', f"Too many {operation} requests in progress, try again later.", 1.0)
+            self._running[operation] += count
+        try:
+            yield
+        finally:
+            if limit is not None:
+                self._running[operation] -= count
+
+    def running(self, operation: str) -> int:
+        return self._running.get(operation, 0)
+
+    @property
+    def tracked_keys(self) -> int:
+        return len(self._buckets)
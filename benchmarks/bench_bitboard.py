@@ -0,0 +1,50 @@
+"""
+Per-move cost of the Tic-Tac-Toe engine: the original list-based board
+versus the bitboard one.
+
+Run from the repository root:  python -m benchmarks.bench_bitboard
+"""
+import timeit
+from tictactoe.tictactoe import TicTacToe, STATUS_IN_PROGRESS
+
+# a full nine-move game that ends in a draw
+GAME = [1, 2, 3, 5, 8, 7, 4, 6, 9]
+WIN_COND = [[1, 2, 3], [4, 5, 6], [7, 8, 9], [1, 4, 7], [2, 5, 8], [3, 6, 9], [1, 5, 9], [3, 5, 7]]
+
+
+def play_list_board():
+    """The move handling TicTacToe did before the bitboard engine."""
+    values = [' ' for x in range(9)]
+    player_pos = {'X': [], 'O': []}
+    sign = 'X'
+    for move in GAME:
+        if move < 1 or move > 9 or values[move - 1] != ' ':
+            raise ValueError(move)
+        values[move - 1] = sign
+        player_pos[sign].append(move)
+        if any(all(y in player_pos[sign] for y in x) for x in WIN_COND):
+            return sign
+        if len(player_pos['X']) + len(player_pos['O']) == 9:
+            return None
+        sign = 'O' if sign == 'X' else 'X'
+
+
+def play_bitboard():
+    """The path the servers take: apply_move() validates, plays and passes the turn."""
+    game = TicTacToe()
+    game.set_players('X', 'O')
+    for move in GAME:
+        if game.apply_move(move) != STATUS_IN_PROGRESS:
+            break
+    return game.winner()
+
+
+def main(number: int = 20000, repeat: int = 5):
+    for name, func in (('list board', play_list_board), ('bitboard', play_bitboard)):
+        assert func() is None
+        best = min(timeit.repeat(func, number=number, repeat=repeat))
+        print(f"{name:>12}: {best / (number * len(GAME)) * 1e9:8.1f} ns/move")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Size and encode/decode cost of a game state: to_dict() JSON versus the
+binary layout of tictactoe.codec.
+
+Run from the repository root:  python -m benchmarks.bench_codec
+"""
+import json
+import timeit
+from tictactoe.tictactoe import TicTacToe
+
+# a game four moves in, the typical state pushed or stored mid-game
+MOVES = [5, 1, 9, 3]
+
+
+def make_game() -> TicTacToe:
+    game = TicTacToe()
+    game.set_players('alice', 'bob')
+    for move in MOVES:
+        game.apply_move(move)
+    return game
+
+
+def main(number: int = 20000, repeat: int = 5):
+    game = make_game()
+    as_json = json.dumps(game.to_dict()).encode('utf-8')
+    as_bytes = game.to_bytes()
+    cases = (('json', lambda: json.dumps(game.to_dict()).encode('utf-8'),
+              lambda: TicTacToe.from_dict(json.loads(as_json)), len(as_json)),
+             ('binary', game.to_bytes, lambda: TicTacToe.from_buffer(as_bytes), len(as_bytes)))
+    for name, encode, decode, size in cases:
+        assert decode().to_dict() == game.to_dict()
+        encode_time = min(timeit.repeat(encode, number=number, repeat=repeat)) / number
+        decode_time = min(timeit.repeat(decode, number=number, repeat=repeat)) / number
+        print(f"{name:>8}: {size:4d} bytes  encode {encode_time * 1e6:6.2f} us  "
+              f"decode {decode_time * 1e6:6.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Latency and throughput of AsyncTicTacToeDB and the FastAPI app.
+
+Each run creates N games, seats a second player, starts them, plays one move
+in each, lists games and deletes them, keeping ``--concurrency`` requests in
+flight.  The API mode drives web_tictactoe.app in-process through httpx's
+ASGI transport, so no server or network is involved.
+
+Run from the repository root:
+    python -m benchmarks.bench_db_api --games 1000 10000 100000 --mode db
+    python -m benchmarks.bench_db_api --games 1000 --mode api
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+import nacl.pwhash
+from admission import AdmissionController
+from benchmarks.stats import report
+
+LIST_CALLS = 100
+
+
+async def run_ops(name: str, count: int, concurrency: int, op: Callable[[int], Awaitable]):
+    """
+    Runs op(0) .. op(count - 1) with at most ``concurrency`` in flight and reports them.
+    """
+    latencies: List[float] = []
+    next_idx = 0
+
+    async def worker():
+        nonlocal next_idx
+        while next_idx < count:
+            idx = next_idx
+            next_idx += 1
+            start = time.perf_counter()
+            await op(idx)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, count))))
+    report(name, latencies, time.perf_counter() - start)
+
+
+async def bench_db(num_games: int, concurrency: int):
+    from user_db import UserDB
+    from tictactoe_db import AsyncTicTacToeDB
+
+    db = AsyncTicTacToeDB(UserDB())
+    games = [('', '')] * num_games
+
+    async def create(idx):
+        game_id, term_pass, _ = await db.add_game('alice')
+        games[idx] = (game_id, term_pass)
+
+    async def join(idx):
+        await db.add_player(games[idx][0], 'bob')
+        await db.init_game(games[idx][0])
+
+    async def move(idx):
+        await db.play_move(games[idx][0], 'alice', 5)
+
+    async def list_all(idx):
+        await db.list_games()
+
+    async def delete(idx):
+        await db.del_game(*games[idx])
+
+    await run_ops('create', num_games, concurrency, create)
+    await run_ops('join', num_games, concurrency, join)
+    await run_ops('move', num_games, concurrency, move)
+    await run_ops('list', LIST_CALLS, concurrency, list_all)
+    await run_ops('delete', num_games, concurrency, delete)
+
+
+async def bench_api(num_games: int, concurrency: int):
+    import httpx
+    import web_tictactoe
+
+    # cheap hashes so account setup does not dominate; requests hit the credential cache anyway
+    web_tictactoe.USER_DB._opslimit = nacl.pwhash.argon2id.OPSLIMIT_MIN
+    web_tictactoe.USER_DB._memlimit = nacl.pwhash.argon2id.MEMLIMIT_MIN
+    # measure the server, not the rate limits
+    web_tictactoe.ADMISSION = AdmissionController(user_rate=0, global_rate=0, address_rate=0)
+    alice = await web_tictactoe.USER_DB.create_user_async(f'alice-{num_games}')
+    bob = await web_tictactoe.USER_DB.create_user_async(f'bob-{num_games}')
+    games = [('', '')] * num_games
+    transport = httpx.ASGITransport(app=web_tictactoe.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+
+        async def call(method, url, auth, **params):
+            response = await client.request(method, url, auth=auth, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        async def create(idx):
+            body = await call('GET', '/game/create/2', alice)
+            games[idx] = (body['game_id'], body['termination_password'])
+
+        async def join(idx):
+            await call('POST', f'/game/{games[idx][0]}/add_player', alice, username=bob[0])
+            await call('POST', f'/game/{games[idx][0]}/initialize', alice)
+
+        async def move(idx):
+            await call('POST', f'/game/{games[idx][0]}/move', alice, move=5)
+
+        async def list_all(idx):
+            await call('GET', '/games', None)
+
+        async def delete(idx):
+            await call('POST', f'/game/{games[idx][0]}/terminate', alice, password=games[idx][1])
+
+        await run_ops('create', num_games, concurrency, create)
+        await run_ops('join', num_games, concurrency, join)
+        await run_ops('move', num_games, concurrency, move)
+        await run_ops('list', LIST_CALLS, concurrency, list_all)
+        await run_ops('delete', num_games, concurrency, delete)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--mode', choices=['db', 'api', 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+    for num_games in args.games:
+        if args.mode in ('db', 'both'):
+            print(f"AsyncTicTacToeDB, {num_games} games:")
+            asyncio.run(bench_db(num_games, args.concurrency))
+        if args.mode in ('api', 'both'):
+            print(f"FastAPI app, {num_games} games:")
+            asyncio.run(bench_api(num_games, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
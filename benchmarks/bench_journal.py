@@ -0,0 +1,74 @@
+"""
+Game journal throughput: batched appends, a streaming mmap scan of every
+move, and startup recovery from a full replay versus snapshot + tail.
+
+Run from the repository root:  python -m benchmarks.bench_journal --games 20000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB
+from game_journal import GameJournal, iter_journal, EVENT_MOVE
+
+# a full game that ends in a draw: 9 moves
+MOVES = [5, 1, 9, 3, 2, 8, 7, 4, 6]
+
+
+async def play(db: AsyncTicTacToeDB, num_games: int) -> float:
+    game_ids = []
+    for _ in range(num_games):
+        game_id, _, _ = await db.add_game('alice')
+        await db.add_player(game_id, 'bob')
+        await db.init_game(game_id)
+        game_ids.append(game_id)
+    start = time.perf_counter()
+    for idx, move in enumerate(MOVES):
+        player = 'alice' if idx % 2 == 0 else 'bob'
+        for game_id in game_ids:
+            await db.play_move(game_id, player, move)
+    return time.perf_counter() - start
+
+
+async def recover(directory: str) -> float:
+    start = time.perf_counter()
+    db = AsyncTicTacToeDB(UserDB(), journal=GameJournal(directory), snapshot_interval=None)
+    await db.start()
+    elapsed = time.perf_counter() - start
+    await db._journal.stop()  # leave the journal as it was, without a closing checkpoint
+    return elapsed
+
+
+async def run(num_games: int):
+    with tempfile.TemporaryDirectory() as directory:
+        db = AsyncTicTacToeDB(UserDB(), journal=GameJournal(directory), snapshot_interval=None)
+        await db.start()
+        elapsed = await play(db, num_games)
+        await db._journal.stop()
+        num_moves = num_games * len(MOVES)
+        print(f"  append  {num_moves:>9} moves  {num_moves / elapsed:>11.0f} moves/s (play_move included)")
+
+        start = time.perf_counter()
+        scanned = sum(1 for record in iter_journal(directory) if record.kind == EVENT_MOVE)
+        elapsed = time.perf_counter() - start
+        print(f"  scan    {scanned:>9} moves  {scanned / elapsed:>11.0f} moves/s")
+
+        print(f"  recover full replay      {await recover(directory):8.3f} s")
+        db = AsyncTicTacToeDB(UserDB(), journal=GameJournal(directory), snapshot_interval=None)
+        await db.start()
+        await db.close()  # checkpoints
+        print(f"  recover from snapshot    {await recover(directory):8.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, nargs='+', default=[20000])
+    args = parser.parse_args()
+    for num_games in args.games:
+        print(f"{num_games} games")
+        asyncio.run(run(num_games))
+
+
+if __name__ == '__main__':
+    main()
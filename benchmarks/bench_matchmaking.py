@@ -0,0 +1,76 @@
+"""
+Matchmaking under a crowd: enqueue rate, time per matching pass and games
+created per second with a large pool of waiting players, and the wait each
+player saw before its game.
+
+Ratings are normal around 1500 (sd 300) and players arrive spread over
+``--arrival`` seconds of simulated time, so the window growth matters for the
+outliers.  The clock is simulated: passes run back to back, each one
+``--interval`` seconds apart.
+
+Run from the repository root:  python -m benchmarks.bench_matchmaking --players 100000
+"""
+import argparse
+import asyncio
+import random
+import time
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB
+from matchmaking import Matchmaker
+from benchmarks.stats import percentile
+
+
+async def run(num_players: int, interval: float, arrival: float, seed: int):
+    rng = random.Random(seed)
+    now = [0.0]
+    db = AsyncTicTacToeDB(UserDB())
+    matchmaker = Matchmaker(db, interval=interval, clock=lambda: now[0])
+    ratings = [rng.gauss(1500, 300) for _ in range(num_players)]
+    per_pass = max(1, int(num_players * interval / arrival)) if arrival else num_players
+
+    enqueue_time = pass_time = 0.0
+    arrivals = {}
+    waits = []
+    passes = games = 0
+    next_player = 0
+    while next_player < num_players or len(matchmaker) > 1:
+        start = time.perf_counter()
+        for idx in range(next_player, min(num_players, next_player + per_pass)):
+            arrivals[f'player-{idx}'] = now[0]
+            matchmaker.enqueue(f'player-{idx}', ratings[idx])
+        enqueue_time += time.perf_counter() - start
+        next_player = min(num_players, next_player + per_pass)
+
+        start = time.perf_counter()
+        matches = await matchmaker.match_once()
+        pass_time += time.perf_counter() - start
+        passes += 1
+        games += len(matches)
+        for match in matches:
+            waits += [now[0] - arrivals[name] for name in match.players]
+        now[0] += interval
+
+    elapsed = enqueue_time + pass_time
+    waits.sort()
+    print(f"  enqueue {num_players:>9} players {num_players / enqueue_time:>11.0f} players/s")
+    print(f"  match   {passes:>9} passes  {pass_time / passes * 1e3:>11.2f} ms/pass")
+    print(f"  games   {games:>9} created {games / elapsed:>11.0f} games/s")
+    print(f"  wait (simulated)  p50 {percentile(waits, 0.5):.2f} s  p99 {percentile(waits, 0.99):.2f} s  "
+          f"max {waits[-1] if waits else 0.0:.2f} s, {len(matchmaker)} left waiting")
+    await matchmaker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--players', type=int, nargs='+', default=[100000])
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between passes')
+    parser.add_argument('--arrival', type=float, default=10.0, help='seconds over which players arrive')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    for num_players in args.players:
+        print(f"{num_players} players arriving over {args.arrival:g} s")
+        asyncio.run(run(num_players, args.interval, args.arrival, args.seed))
+
+
+if __name__ == '__main__':
+    main()
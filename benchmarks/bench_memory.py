@@ -0,0 +1,101 @@
+"""
+Bytes per live game, measured with tracemalloc: the TicTacToe and
+TicTacToeInfo objects with a per-instance __dict__ (their previous layout)
+versus the slotted classes, and the whole footprint of a game in
+AsyncTicTacToeDB (objects, shard dicts and indexes).
+
+Run from the repository root:  python -m benchmarks.bench_memory --games 100000
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+from uuid import uuid4
+from tictactoe.tictactoe import TicTacToe
+from tictactoe_db import AsyncTicTacToeDB, TicTacToeInfo
+from user_db import UserDB
+
+MOVES = [5, 1, 9]  # every game is a few moves in
+
+
+class DictGame(object):
+    """Same attributes as TicTacToe, kept in a per-instance __dict__."""
+    def __init__(self, game: TicTacToe):
+        self._BOARD = list(game._BOARD)
+        self._HISTORY = bytearray(game._HISTORY)
+        self._PLAYER_CHOICE = dict(game._PLAYER_CHOICE)
+        self._CUR_PLAYER_NAME = game._CUR_PLAYER_NAME
+        self._PLAYER1 = game._PLAYER1
+        self._PLAYER2 = game._PLAYER2
+        self._CUR_SIGN = game._CUR_SIGN
+
+
+class DictInfo(object):
+    """Same fields as TicTacToeInfo, kept in a per-instance __dict__."""
+    def __init__(self, game_uuid, players, termination_password, owner='', num_players=2, status='open'):
+        self.game_uuid = game_uuid
+        self.players = players
+        self.termination_password = termination_password
+        self.owner = owner
+        self.num_players = num_players
+        self.status = status
+
+
+def make_pair(game_cls, info_cls, idx: int):
+    game = TicTacToe()
+    player1, player2 = f'alice{idx}', f'bob{idx}'
+    game.set_players(player1, player2)
+    for move in MOVES:
+        game.apply_move(move)
+    if game_cls is not TicTacToe:
+        game = game_cls(game)
+    info = info_cls(str(uuid4()), [player1, player2], str(uuid4()), player1, 2, 'in_progress')
+    return game, info
+
+
+def measure(build, num_games: int) -> float:
+    """
+    :return: bytes still allocated per game after ``build`` returns
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(num_games)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / num_games
+
+
+def build_objects(game_cls, info_cls):
+    def build(num_games: int):
+        return [make_pair(game_cls, info_cls, idx) for idx in range(num_games)]
+    return build
+
+
+def build_db(num_games: int):
+    async def fill():
+        db = AsyncTicTacToeDB(UserDB())
+        for idx in range(num_games):
+            game_id, _, _ = await db.add_game(f'alice{idx}')
+            await db.add_player(game_id, f'bob{idx}')
+            await db.init_game(game_id)
+            for move, player in zip(MOVES, (f'alice{idx}', f'bob{idx}', f'alice{idx}')):
+                await db.play_move(game_id, player, move)
+        return db
+    return asyncio.run(fill())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--games', type=int, nargs='+', default=[100000])
+    args = parser.parse_args()
+    for num_games in args.games:
+        print(f"{num_games} games")
+        print(f"  game + info, __dict__ : {measure(build_objects(DictGame, DictInfo), num_games):7.0f} B/game")
+        print(f"  game + info, slotted  : {measure(build_objects(TicTacToe, TicTacToeInfo), num_games):7.0f} B/game")
+        print(f"  AsyncTicTacToeDB      : {measure(build_db, num_games):7.0f} B/game")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Per-move cost of m,n,k win detection: the incremental last-move check of
+tictactoe.mnk versus a full-board rescan after every move, as boards grow.
+
+Run from the repository root:  python -m benchmarks.bench_mnk
+"""
+import random
+import time
+from tictactoe.mnk import MNKGame
+
+SHAPES = ((3, 3, 3), (7, 7, 4), (15, 15, 5), (19, 19, 5), (30, 30, 5))
+
+
+def random_games(rows: int, cols: int, k: int, num_games: int, seed: int = 1):
+    """
+    :return: move sequences of random games played to the end
+    """
+    rng = random.Random(seed)
+    games = []
+    for _ in range(num_games):
+        game = MNKGame(rows, cols, k)
+        free = list(range(1, rows * cols + 1))
+        rng.shuffle(free)
+        moves = []
+        for move in free:
+            moves.append(move)
+            if game.apply_move(move) != 'in_progress':
+                break
+        games.append(moves)
+    return games
+
+
+def main(num_games: int = 50):
+    print(f"{'board':>10} {'moves':>7} {'incremental':>14} {'rescan':>12}")
+    for rows, cols, k in SHAPES:
+        games = random_games(rows, cols, k, num_games)
+        num_moves = sum(len(moves) for moves in games)
+
+        start = time.perf_counter()
+        for moves in games:
+            game = MNKGame(rows, cols, k)
+            for move in moves:
+                game.apply_move(move)
+        incremental = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for moves in games:
+            game = MNKGame(rows, cols, k)
+            for move in moves:
+                game.apply_move(move)
+                game.scan_winner()
+        rescan = time.perf_counter() - start - incremental
+
+        print(f"{rows:>4}x{cols:<3}k{k} {num_moves:>7} {incremental / num_moves * 1e6:>11.2f} us "
+              f"{rescan / num_moves * 1e6:>9.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Messages per second through the MQTT command dispatcher, compared with the
+original chain of str.startswith checks on the get_game topic.
+
+Run from the repository root:  python -m benchmarks.bench_mqtt_dispatch
+"""
+import asyncio
+import time
+from mqtt_dispatch import CommandDispatcher
+
+COMMANDS = ['create_user', 'create_game', 'add_player', 'get_player_idx', 'init_game',
+            'get_winners', 'delete_game']
+MESSAGES = 200000
+
+
+async def noop(client, params):
+    pass
+
+
+async def legacy_dispatch(client, message_str):
+    """The if/elif chain mqtt_setup() used before the dispatcher."""
+    for name in COMMANDS:
+        if message_str.startswith(name):
+            message_params = message_str.replace(name, '')
+            await noop(client, message_params)
+            return
+
+
+def make_dispatcher() -> CommandDispatcher:
+    dispatcher = CommandDispatcher()
+    for name in COMMANDS:
+        root = 'users' if name in ('create_user', 'create_game') else 'games'
+        dispatcher.register(root, name, {'player': str} if name == 'add_player' else None,
+                            legacy_name=name)(noop)
+    return dispatcher
+
+
+async def run(label: str, dispatch, messages):
+    start = time.perf_counter()
+    for message in messages:
+        await dispatch(message)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {len(messages) / elapsed:>10.0f} msg/s")
+
+
+async def main():
+    dispatcher = make_dispatcher()
+    last = COMMANDS[-1]  # worst case for the if/elif chain
+    print(f"{MESSAGES} messages for '{last}':")
+    await run('legacy startswith chain', lambda m: legacy_dispatch(None, m), [f'{last}game-1'] * MESSAGES)
+    await run('dispatcher, legacy string', lambda m: dispatcher.dispatch(None, 'get_game', m),
+              [f'{last}game-1'.encode()] * MESSAGES)
+    await run('dispatcher, topic', lambda m: dispatcher.dispatch(None, m, b''),
+              [f'games/game-1/{last}'] * MESSAGES)
+    await run('dispatcher, topic + JSON', lambda m: dispatcher.dispatch(None, 'games/game-1/add_player', m),
+              [b'{"player": "bob"}'] * MESSAGES)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+"""
+Load generator: replays self-play games as concurrent clients against the
+server in-process, to see how many games per second the whole stack
+sustains before a deploy.
+
+The games come from benchmarks.selfplay (same policies and seed, so the same
+traffic every run).  Every client owns a pair of accounts and plays its games
+one after another: create, add the second player, start, then the moves.
+
+    http  drives web_tictactoe.app through httpx's ASGI transport
+    mqtt  runs web_tictactoe.mqtt_setup() against the in-process fake_mqtt
+          broker, and each client publishes commands and waits for replies
+
+Run from the repository root:
+    python -m benchmarks.load_test --mode http --games 2000 --concurrency 64
+    python -m benchmarks.load_test --mode mqtt --games 2000 --ack-delay 0.002
+"""
+from typing import Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import nacl.pwhash
+from admission import AdmissionController
+from benchmarks.selfplay import POLICIES, generate_games
+from benchmarks.stats import report
+
+OPERATIONS = ('create', 'join', 'start', 'move')
+
+
+async def make_accounts(phase: str, num_clients: int) -> List[Tuple[Tuple[str, str], Tuple[str, str]]]:
+    """
+    :param phase: names the accounts, so phases sharing a user database never collide
+    :return: (X credentials, O credentials) for every client
+    """
+    import web_tictactoe
+
+    # cheap hashes so account setup does not dominate; requests hit the credential cache anyway
+    web_tictactoe.USER_DB._opslimit = nacl.pwhash.argon2id.OPSLIMIT_MIN
+    web_tictactoe.USER_DB._memlimit = nacl.pwhash.argon2id.MEMLIMIT_MIN
+    # measure the server, not the rate limits
+    web_tictactoe.ADMISSION = AdmissionController(user_rate=0, global_rate=0, address_rate=0)
+    prefix = f'load-{phase}-{uuid.uuid4().hex[:8]}'
+    return [(await web_tictactoe.USER_DB.create_user_async(f'{prefix}-{idx}-x'),
+             await web_tictactoe.USER_DB.create_user_async(f'{prefix}-{idx}-o'))
+            for idx in range(num_clients)]
+
+
+async def run_clients(games: List[List[int]], concurrency: int, play: Callable) -> Dict[str, List[float]]:
+    """
+    Runs ``concurrency`` clients, each calling play(client_idx, moves, latencies) for its next game.
+    """
+    latencies: Dict[str, List[float]] = {name: [] for name in OPERATIONS}
+    next_game = 0
+
+    async def client(client_idx: int):
+        nonlocal next_game
+        while next_game < len(games):
+            moves = games[next_game]
+            next_game += 1
+            await play(client_idx, moves, latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(idx) for idx in range(min(concurrency, len(games)))))
+    elapsed = time.perf_counter() - start
+    for name in OPERATIONS:
+        report(name, latencies[name], elapsed)
+    print(f"  {len(games)} games in {elapsed:.2f} s, {len(games) / elapsed:.0f} games/s")
+    return latencies
+
+
+async def http_load(games: List[List[int]], concurrency: int):
+    import httpx
+    import web_tictactoe
+
+    accounts = await make_accounts('http', min(concurrency, len(games)))
+    transport = httpx.ASGITransport(app=web_tictactoe.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://load') as http:
+
+        async def call(latencies, operation, method, url, auth, **params) -> dict:
+            start = time.perf_counter()
+            response = await http.request(method, url, auth=auth, params=params)
+            latencies[operation].append(time.perf_counter() - start)
+            response.raise_for_status()
+            return response.json()
+
+        async def play(client_idx, moves, latencies):
+            x, o = accounts[client_idx]
+            game_id = (await call(latencies, 'create', 'GET', '/game/create/2', x))['game_id']
+            await call(latencies, 'join', 'POST', f'/game/{game_id}/add_player', x, username=o[0])
+            await call(latencies, 'start', 'POST', f'/game/{game_id}/initialize', x)
+            for turn, move in enumerate(moves):
+                await call(latencies, 'move', 'POST', f'/game/{game_id}/move', o if turn % 2 else x, move=move)
+
+        await run_clients(games, concurrency, play)
+
+
+async def mqtt_load(games: List[List[int]], concurrency: int, ack_delay: float):
+    import web_tictactoe
+    from fake_mqtt import FakeBroker
+
+    accounts = await make_accounts('mqtt', min(concurrency, len(games)))
+    broker = FakeBroker()
+    server = asyncio.ensure_future(web_tictactoe.mqtt_setup(lambda host: broker.client(ack_delay)))
+    while web_tictactoe.MQTT_PUBLISHER is None:  # subscribed and ready
+        if server.done():
+            server.result()
+        await asyncio.sleep(0.001)
+    clients = [broker.client(ack_delay) for _ in accounts]
+    inboxes = []
+    for client, (x, _) in zip(clients, accounts):
+        await client.__aenter__()
+        await client.subscribe(f'users/{x[0]}/#')
+        inboxes.append(await client.unfiltered_messages().__aenter__())
+
+    async def call(client_idx, latencies, operation, root, subject, action, **params) -> dict:
+        client, messages = clients[client_idx], inboxes[client_idx]
+        reply, error = f'{root}/{subject}/{action}/reply', f'{root}/{subject}/error'
+        start = time.perf_counter()
+        await client.publish(f'{root}/{subject}/{action}', json.dumps(params), qos=1)
+        while True:
+            message = await messages.__anext__()
+            if message.topic == reply:
+                latencies[operation].append(time.perf_counter() - start)
+                return json.loads(message.payload)
+            if message.topic == error:
+                raise RuntimeError(f"{operation} failed: {message.payload.decode('utf-8')}")
+
+    async def play(client_idx, moves, latencies):
+        (x_name, x_password), (o_name, o_password) = accounts[client_idx]
+        client = clients[client_idx]
+        created = await call(client_idx, latencies, 'create', 'users', x_name, 'create_game',
+                             username=x_name, password=x_password, num_players=2)
+        game_id = created['game_id']
+        game_topics = f'games/{game_id}/#'
+        await client.subscribe(game_topics)
+        await call(client_idx, latencies, 'join', 'games', game_id, 'add_player',
+                   username=x_name, password=x_password, player=o_name)
+        await call(client_idx, latencies, 'start', 'games', game_id, 'init_game',
+                   username=x_name, password=x_password)
+        for turn, move in enumerate(moves):
+            username, password = (o_name, o_password) if turn % 2 else (x_name, x_password)
+            await call(client_idx, latencies, 'move', 'games', game_id, 'move',
+                       username=username, password=password, move=move)
+        await client.unsubscribe(game_topics)
+
+    try:
+        await run_clients(games, concurrency, play)
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        for client in clients:
+            await client.__aexit__(None, None, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['http', 'mqtt', 'both'], default='both')
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--x', choices=sorted(POLICIES), default='random', help='policy of the first player')
+    parser.add_argument('--o', choices=sorted(POLICIES), default='random', help='policy of the second player')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--ack-delay', type=float, default=0.0, help='simulated broker PUBACK delay, seconds')
+    args = parser.parse_args()
+    games = generate_games(args.games, args.x, args.o, args.seed)
+    moves = sum(len(game) for game in games)
+    print(f"{len(games)} {args.x} vs {args.o} games, {moves} moves, {args.concurrency} clients")
+    if args.mode in ('http', 'both'):
+        print("HTTP (FastAPI app in-process):")
+        asyncio.run(http_load(games, args.concurrency))
+    if args.mode in ('mqtt', 'both'):
+        print(f"MQTT (fake broker, {args.ack_delay * 1e3:g} ms acks):")
+        asyncio.run(mqtt_load(games, args.concurrency, args.ack_delay))
+
+
+if __name__ == '__main__':
+    main()
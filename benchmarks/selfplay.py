@@ -0,0 +1,169 @@
+"""
+Self-play simulator: how many complete TicTacToe games per second the engine
+sustains, and how the results split, for a pair of move policies.
+
+Games are split into chunks spread over a process pool.  Each chunk seeds its
+own RNG from ``--seed`` and its chunk number, so a run is reproducible for any
+number of workers.  Per-move latency covers the policy's choice plus
+apply_move().
+
+Policies:
+    random   a uniformly random free box
+    greedy   win if possible, otherwise block the opponent's win, otherwise
+             the centre, otherwise random
+    solver   perfect play from tictactoe.solver (TicTacToe.hint())
+
+Run from the repository root:
+    python -m benchmarks.selfplay --games 1000000 --x random --o greedy
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+import argparse
+import os
+import random
+import time
+from metrics import LatencyHistogram
+from tictactoe.tictactoe import TicTacToe, STATUS_IN_PROGRESS, STATUS_DRAW
+from tictactoe.bitboard import FULL_BOARD, SIGN_INDEX, bits_to_moves, is_win, move_bit
+
+Policy = Callable[[TicTacToe, random.Random], int]
+CHUNK_GAMES = 20000
+
+
+def random_policy(game: TicTacToe, rng: random.Random) -> int:
+    x_bits, o_bits = game._BOARD
+    return rng.choice(bits_to_moves(FULL_BOARD & ~(x_bits | o_bits)))
+
+
+def greedy_policy(game: TicTacToe, rng: random.Random) -> int:
+    own_idx = SIGN_INDEX[game._CUR_SIGN]
+    own, opponent = game._BOARD[own_idx], game._BOARD[1 - own_idx]
+    free = bits_to_moves(FULL_BOARD & ~(own | opponent))
+    for bits in (own, opponent):  # take a win, else block one
+        for box in free:
+            if is_win(bits | move_bit(box)):
+                return box
+    return 5 if 5 in free else rng.choice(free)
+
+
+def solver_policy(game: TicTacToe, rng: random.Random) -> int:
+    return game.hint()
+
+
+POLICIES: Dict[str, Policy] = {'random': random_policy, 'greedy': greedy_policy, 'solver': solver_policy}
+
+
+@dataclass
+class SelfPlayStats:
+    games: int = 0
+    x_wins: int = 0
+    o_wins: int = 0
+    draws: int = 0
+    moves: int = 0
+    move_latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def merge(self, other: 'SelfPlayStats'):
+        self.games += other.games
+        self.x_wins += other.x_wins
+        self.o_wins += other.o_wins
+        self.draws += other.draws
+        self.moves += other.moves
+        self.move_latency.merge(other.move_latency)
+
+
+def play_game(x_policy: Policy, o_policy: Policy, rng: random.Random,
+              latency: LatencyHistogram) -> Tuple[TicTacToe, List[int]]:
+    """
+    :return: the finished game and its moves in order
+    """
+    game = TicTacToe()
+    game.set_players('x', 'o')
+    policies = {'X': x_policy, 'O': o_policy}
+    moves = []
+    status = STATUS_IN_PROGRESS
+    clock = time.perf_counter
+    while status == STATUS_IN_PROGRESS:
+        start = clock()
+        move = policies[game._CUR_SIGN](game, rng)
+        status = game.apply_move(move)
+        latency.record(clock() - start)
+        moves.append(move)
+    return game, moves
+
+
+def chunk_rng(seed: int, chunk: int) -> random.Random:
+    return random.Random(seed * 1000003 + chunk)
+
+
+def play_chunk(job: Tuple[int, int, int, str, str]) -> SelfPlayStats:
+    """
+    Plays one chunk of games; runs in a pool worker.
+
+    :param job: (seed, chunk number, games, X policy name, O policy name)
+    """
+    seed, chunk, num_games, x_name, o_name = job
+    rng = chunk_rng(seed, chunk)
+    x_policy, o_policy = POLICIES[x_name], POLICIES[o_name]
+    stats = SelfPlayStats()
+    for _ in range(num_games):
+        game, moves = play_game(x_policy, o_policy, rng, stats.move_latency)
+        stats.games += 1
+        stats.moves += len(moves)
+        if game.status() == STATUS_DRAW:
+            stats.draws += 1
+        elif game.winner() == 'x':
+            stats.x_wins += 1
+        else:
+            stats.o_wins += 1
+    return stats
+
+
+def generate_games(num_games: int, x_name: str, o_name: str, seed: int = 1) -> List[List[int]]:
+    """
+    :return: move sequences of ``num_games`` self-play games, for replaying as client traffic
+    """
+    rng = chunk_rng(seed, 0)
+    latency = LatencyHistogram()
+    return [play_game(POLICIES[x_name], POLICIES[o_name], rng, latency)[1] for _ in range(num_games)]
+
+
+def simulate(num_games: int, x_name: str, o_name: str, workers: int, seed: int = 1) -> Tuple[SelfPlayStats, float]:
+    """
+    :return: merged statistics and wall-clock seconds
+    """
+    jobs = [(seed, chunk, min(CHUNK_GAMES, num_games - first), x_name, o_name)
+            for chunk, first in enumerate(range(0, num_games, CHUNK_GAMES))]
+    total = SelfPlayStats()
+    start = time.perf_counter()
+    if workers <= 1:
+        results = map(play_chunk, jobs)
+        for stats in results:
+            total.merge(stats)
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            for stats in pool.map(play_chunk, jobs):
+                total.merge(stats)
+    return total, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=1000000)
+    parser.add_argument('--x', choices=sorted(POLICIES), default='random', help='policy of the first player')
+    parser.add_argument('--o', choices=sorted(POLICIES), default='random', help='policy of the second player')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    stats, elapsed = simulate(args.games, args.x, args.o, args.workers, args.seed)
+    latency = stats.move_latency
+    print(f"{args.x} (X) vs {args.o} (O): {stats.games} games on {args.workers} workers in {elapsed:.2f} s, "
+          f"{stats.games / elapsed:.0f} games/s")
+    print(f"  X wins {stats.x_wins / stats.games:6.1%}  O wins {stats.o_wins / stats.games:6.1%}  "
+          f"draws {stats.draws / stats.games:6.1%}  {stats.moves / stats.games:.2f} moves/game")
+    print(f"  per move  p50 {latency.quantile(0.5) * 1e6:.1f} us  p99 {latency.quantile(0.99) * 1e6:.1f} us  "
+          f"max {latency.max * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
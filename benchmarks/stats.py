@@ -0,0 +1,30 @@
+"""
+Small helpers shared by the benchmark scripts.
+"""
+from typing import List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    :param sorted_values: ascending samples
+    :param fraction: 0.5 for the median, 0.99 for p99, ...
+    :return: nearest-rank percentile, 0.0 for no samples
+    """
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[rank]
+
+
+def report(name: str, latencies: List[float], elapsed: float):
+    """
+    Prints one result line: op count, ops/sec and p50/p99 latency in microseconds.
+
+    :param latencies: per-operation latencies in seconds
+    :param elapsed: wall-clock seconds for all operations
+    """
+    latencies = sorted(latencies)
+    ops_per_sec = len(latencies) / elapsed if elapsed else 0.0
+    print(f"  {name:<8} {len(latencies):>8} ops  {ops_per_sec:>11.0f} ops/s  "
+          f"p50 {percentile(latencies, 0.5) * 1e6:>9.1f} us  "
+          f"p99 {percentile(latencies, 0.99) * 1e6:>9.1f} us")
@@ -0,0 +1,173 @@
+"""
+Scale-out across several server processes or hosts.
+
+Every worker runs its own web_tictactoe app on its own address and registers
+that address in a SQLite file all workers can reach (the coordination
+stand-in for a real service registry).  Game ids are placed on a consistent
+hash ring of the live workers: a worker only creates games whose ids hash to
+itself, and a request for another worker's game is forwarded to its owner.
+Adding or removing a worker only moves the ids on the arcs next to it.
+"""
+from bisect import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+
+def _point(label: str) -> int:
+    return int.from_bytes(hashlib.blake2b(label.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing(object):
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        """
+        :param nodes: node ids on the ring
+        :param vnodes: points per node; more points spread the keys more evenly
+        """
+        self._vnodes = vnodes
+        self._nodes: List[str] = sorted(set(nodes))
+        ring: List[Tuple[int, str]] = sorted((_point(f"{node}#{idx}"), node)
+                                             for node in self._nodes for idx in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def owner(self, key: str) -> str:
+        """
+        :return: the node that owns ``key``
+        :raises: LookupError if the ring is empty
+        """
+        if not self._points:
+            raise LookupError("no nodes on the ring")
+        pos = bisect(self._points, _point(key))
+        return self._owners[pos % len(self._owners)]
+
+
+class NodeRegistry(object):
+    """
+    Live workers in a shared SQLite file.  A worker counts as live while its
+    heartbeat is younger than ``heartbeat_ttl`` seconds.
+    """
+    def __init__(self, path: str, heartbeat_ttl: float = 10.0, clock=time.time):
+        """
+        :param path: database file shared by every worker, created if missing
+        """
+        self._heartbeat_ttl = heartbeat_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS nodes ("
+                           "node_id TEXT PRIMARY KEY, url TEXT NOT NULL, heartbeat REAL NOT NULL)")
+
+    def heartbeat(self, node_id: str, url: str):
+        """
+        Registers a worker or renews its registration.
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO nodes (node_id, url, heartbeat) VALUES (?, ?, ?)",
+                               (node_id, url, self._clock()))
+
+    def deregister(self, node_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+
+    def live_nodes(self) -> Dict[str, str]:
+        """
+        :return: node_id -> base url of every live worker
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT node_id, url FROM nodes WHERE heartbeat > ?",
+                                      (self._clock() - self._heartbeat_ttl,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class GameRouter(object):
+    def __init__(self, registry: NodeRegistry, node_id: str, url: str,
+                 refresh_interval: float = 2.0, vnodes: int = 64):
+        """
+        :param registry: the shared worker registry
+        :param node_id: this worker's id, stable across restarts
+        :param url: base url other workers reach this one at, e.g. http://10.0.0.5:8001
+        :param refresh_interval: seconds between heartbeats / ring reloads
+        """
+        self._registry = registry
+        self.node_id = node_id
+        self.url = url
+        self._refresh_interval = refresh_interval
+        self._vnodes = vnodes
+        self._ring = HashRing([node_id], vnodes)
+        self._urls: Dict[str, str] = {node_id: url}
+        self._task: Optional[asyncio.Task] = None
+        self.forwarded = 0
+
+    @property
+    def nodes(self) -> Dict[str, str]:
+        return dict(self._urls)
+
+    async def refresh(self):
+        """
+        Renews this worker's heartbeat and rebuilds the ring from the live workers.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._registry.heartbeat, self.node_id, self.url)
+        urls = await loop.run_in_executor(None, self._registry.live_nodes)
+        urls[self.node_id] = self.url
+        if urls != self._urls:
+            self._ring = HashRing(urls, self._vnodes)
+            self._urls = urls
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logging.exception("cluster registry refresh failed")
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.ensure_future(self._refresh_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._registry.deregister, self.node_id)
+
+    def is_local(self, key: str) -> bool:
+        return self._ring.owner(key) == self.node_id
+
+    def owner_url(self, key: str) -> Optional[str]:
+        """
+        :return: base url of the worker owning ``key``, None if it is this one
+        """
+        owner = self._ring.owner(key)
+        return None if owner == self.node_id else self._urls[owner]
+
+    def new_game_id(self) -> str:
+        """
+        :return: a fresh game id that this worker owns (about one try per live worker)
+        """
+        for _ in range(64 * len(self._ring)):
+            game_id = str(uuid4())
+            if self.is_local(game_id):
+                return game_id
+        raise RuntimeError(f"could not draw a game id owned by {self.node_id}")
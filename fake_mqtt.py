@@ -0,0 +1,84 @@
+"""
+In-process stand-in for an MQTT broker and asyncio_mqtt.Client, for tests
+and load generation without a running broker.
+
+FakeClient implements the parts of asyncio_mqtt.Client this server uses:
+``async with``, subscribe(), unsubscribe(), publish() and
+unfiltered_messages().  publish() waits ``ack_delay`` seconds before
+returning, like a QoS 1 publish waiting for the broker's PUBACK.
+"""
+from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+
+
+class FakeMessage(object):
+    def __init__(self, topic: str, payload: bytes, qos: int):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """
+    :return: True if ``topic`` matches the subscription ``pattern`` ('+' and '#' wildcards)
+    """
+    pattern_levels = pattern.split('/')
+    topic_levels = topic.split('/')
+    for idx, level in enumerate(pattern_levels):
+        if level == '#':
+            return True
+        if idx >= len(topic_levels) or (level != '+' and level != topic_levels[idx]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+class FakeBroker(object):
+    def __init__(self):
+        self._clients: List['FakeClient'] = []
+        self.published: List[FakeMessage] = []  # every message, in order
+
+    def client(self, ack_delay: float = 0.0) -> 'FakeClient':
+        return FakeClient(self, ack_delay)
+
+    def route(self, message: FakeMessage):
+        self.published.append(message)
+        for client in self._clients:
+            if any(topic_matches(pattern, message.topic) for pattern in client.subscriptions):
+                client.inbox.put_nowait(message)
+
+
+class FakeClient(object):
+    def __init__(self, broker: FakeBroker, ack_delay: float = 0.0):
+        self._broker = broker
+        self._ack_delay = ack_delay
+        self.subscriptions: List[str] = []
+        self.inbox: Optional[asyncio.Queue] = None
+
+    async def __aenter__(self) -> 'FakeClient':
+        self.inbox = asyncio.Queue()
+        self._broker._clients.append(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._broker._clients.remove(self)
+
+    async def subscribe(self, topic: str, qos: int = 0):
+        self.subscriptions.append(topic)
+
+    async def unsubscribe(self, topic: str):
+        self.subscriptions.remove(topic)
+
+    async def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self._broker.route(FakeMessage(topic, payload or b'', qos))
+        if qos > 0 and self._ack_delay:
+            await asyncio.sleep(self._ack_delay)
+
+    @asynccontextmanager
+    async def unfiltered_messages(self):
+        async def messages():
+            while True:
+                yield await self.inbox.get()
+        yield messages()
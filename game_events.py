@@ -0,0 +1,121 @@
+"""
+In-process fan-out of game updates to Server-Sent Events subscribers.
+
+A move is encoded into an SSE frame once and the same bytes are appended to
+every subscriber's queue, so publishing never waits on a client.  A subscriber
+that falls ``max_pending`` frames behind has its backlog thrown away and is
+told to resync; the stream then sends one fresh snapshot instead of the
+updates it missed.
+"""
+from typing import Deque, Dict, Set, Union
+from collections import deque
+import asyncio
+import json
+
+RESYNC = object()  # returned by Subscription.get() after the backlog was dropped
+
+_json_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def sse_frame(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {_json_encode(data)}\n\n".encode('utf-8')
+
+
+class Subscription(object):
+    def __init__(self, game_id: str, max_pending: int):
+        self.game_id = game_id
+        self._max_pending = max_pending
+        self._pending: Deque[bytes] = deque()
+        self._wakeup = asyncio.Event()
+        self._resync = False
+        self._closed = False
+
+    def _offer(self, frame: bytes) -> bool:
+        """
+        :return: False if the backlog was full and has been dropped
+        """
+        if self._resync:
+            return False  # a snapshot is coming anyway
+        if len(self._pending) >= self._max_pending:
+            self._pending.clear()
+            self._resync = True
+            self._wakeup.set()
+            return False
+        self._pending.append(frame)
+        self._wakeup.set()
+        return True
+
+    def _close(self):
+        self._closed = True
+        self._wakeup.set()
+
+    async def get(self) -> Union[bytes, object, None]:
+        """
+        :return: the next SSE frame, RESYNC if updates were dropped, None once the game is gone
+        """
+        while True:
+            if self._resync:
+                self._resync = False
+                return RESYNC
+            if self._pending:
+                return self._pending.popleft()
+            if self._closed:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+
+class GameEventHub(object):
+    def __init__(self, max_pending: int = 32):
+        """
+        :param max_pending: frames a subscriber may fall behind before it has to resync
+        """
+        self._max_pending = max_pending
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0  # frames not queued because the subscriber was too far behind
+
+    @property
+    def active_subscriptions(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def subscribers(self, game_id: str) -> int:
+        return len(self._subscribers.get(game_id, ()))
+
+    def subscribe(self, game_id: str) -> Subscription:
+        subscription = Subscription(game_id, self._max_pending)
+        self._subscribers.setdefault(game_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.game_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.game_id]
+
+    def publish(self, game_id: str, event: str, data: dict) -> int:
+        """
+        :return: subscribers the update was queued for
+        """
+        subscriptions = self._subscribers.get(game_id)
+        if not subscriptions:
+            return 0
+        frame = sse_frame(event, data)
+        self.published += 1
+        delivered = 0
+        for subscription in subscriptions:
+            if subscription._offer(frame):
+                delivered += 1
+            else:
+                self.dropped += 1
+        self.delivered += delivered
+        return delivered
+
+    def close(self, game_id: str):
+        """
+        Ends every stream of a deleted game.
+        """
+        for subscription in self._subscribers.pop(game_id, ()):
+            subscription._close()
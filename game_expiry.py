@@ -0,0 +1,69 @@
+"""
+Deadline tracking for evicting idle and finished games.
+
+ExpiryQueue is a min-heap of (deadline, game_id).  Activity only records the
+game's new deadline in a dict; the heap entry is left alone and, when it comes
+due, is pushed back with the recorded deadline if that is later.  So a move
+costs a dict store, and finding expired games costs O(log n) per game looked
+at instead of a scan of every game.
+"""
+from heapq import heappop, heappush, heapify
+from typing import Dict, List, Tuple
+
+
+class ExpiryQueue(object):
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._deadline: Dict[str, float] = {}  # key -> current deadline
+        self._scheduled: Dict[str, float] = {}  # key -> deadline of its live heap entry
+
+    def __len__(self):
+        return len(self._deadline)
+
+    def __contains__(self, key: str):
+        return key in self._deadline
+
+    def set(self, key: str, deadline: float):
+        """
+        Sets (or moves) the deadline of ``key``.
+        """
+        self._deadline[key] = deadline
+        scheduled = self._scheduled.get(key)
+        if scheduled is None or deadline < scheduled:
+            # an earlier deadline needs its own entry; the later one goes stale
+            self._scheduled[key] = deadline
+            heappush(self._heap, (deadline, key))
+
+    def discard(self, key: str):
+        self._deadline.pop(key, None)
+        self._scheduled.pop(key, None)
+        if len(self._heap) > 2 * len(self._scheduled) + 64:
+            self._heap = [(deadline, key) for deadline, key in self._heap
+                          if self._scheduled.get(key) == deadline]
+            heapify(self._heap)
+
+    def next_deadline(self) -> float:
+        """
+        :return: earliest scheduled deadline, may be stale; inf if nothing is tracked
+        """
+        return self._heap[0][0] if self._heap else float('inf')
+
+    def pop_expired(self, now: float) -> List[str]:
+        """
+        Removes and returns every key whose deadline is at or before ``now``.
+        """
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            scheduled, key = heappop(heap)
+            if self._scheduled.get(key) != scheduled:
+                continue  # superseded by an earlier entry or discarded
+            deadline = self._deadline[key]
+            if deadline > now:
+                self._scheduled[key] = deadline
+                heappush(heap, (deadline, key))
+            else:
+                del self._deadline[key]
+                del self._scheduled[key]
+                expired.append(key)
+        return expired
@@ -0,0 +1,153 @@
+"""
+Secondary indexes over the games in AsyncTicTacToeDB.
+
+Every game gets an increasing sequence number when it is created.  Each index
+is a list of those numbers in ascending order, so a cursor is just the last
+sequence number returned and a page is a bisect plus ``limit`` steps forward.
+"""
+from bisect import bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+GAME_OPEN = 'open'  # has a free seat
+GAME_IN_PROGRESS = 'in_progress'  # every seat taken, nobody has won yet
+GAME_FINISHED = 'finished'  # won or drawn
+GAME_STATUSES = (GAME_OPEN, GAME_IN_PROGRESS, GAME_FINISHED)
+
+
+class OrderedIndex(object):
+    """
+    Set of sequence numbers that can be scanned in order from any position.
+    Removals are lazy: the number stays in the list until the next compaction.
+    """
+    def __init__(self):
+        self._seqs: List[int] = []
+        self._members: Set[int] = set()
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, seq: int):
+        return seq in self._members
+
+    def add(self, seq: int):
+        if seq in self._members:
+            return
+        self._members.add(seq)
+        if self._seqs and self._seqs[-1] >= seq:
+            pos = bisect_right(self._seqs, seq)
+            if pos == 0 or self._seqs[pos - 1] != seq:  # not a lazily removed copy
+                insort(self._seqs, seq)
+        else:
+            self._seqs.append(seq)
+
+    def discard(self, seq: int):
+        self._members.discard(seq)
+        if len(self._seqs) > 2 * len(self._members) + 64:
+            self._seqs = [member for member in self._seqs if member in self._members]
+
+    def scan(self, after: int = -1) -> Iterator[int]:
+        """
+        :param after: only yield sequence numbers greater than this
+        :return: members in ascending order
+        """
+        seqs = self._seqs
+        for pos in range(bisect_right(seqs, after), len(seqs)):
+            if seqs[pos] in self._members:
+                yield seqs[pos]
+
+
+class GameIndex(object):
+    """
+    Indexes games by status, owner and player, and pages through them.
+    """
+    def __init__(self):
+        self._next_seq = 0
+        self._seq_of: Dict[str, int] = {}
+        self._game_of: Dict[int, str] = {}
+        self._all = OrderedIndex()
+        self._by_status: Dict[str, OrderedIndex] = {name: OrderedIndex() for name in GAME_STATUSES}
+        self._by_owner: Dict[str, OrderedIndex] = {}
+        self._by_player: Dict[str, OrderedIndex] = {}
+        self._entry: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {}  # game_id -> (status, owner, players)
+
+    def __len__(self):
+        return len(self._all)
+
+    def count(self, status: str) -> int:
+        return len(self._by_status[status])
+
+    def update(self, game_id: str, status: str, owner: str, players: List[str]):
+        """
+        Adds a game or moves it to its new status / players.
+        """
+        seq = self._seq_of.get(game_id)
+        if seq is None:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seq_of[game_id] = seq
+            self._game_of[seq] = game_id
+            self._all.add(seq)
+        old = self._entry.get(game_id)
+        new = (status, owner, tuple(players))
+        if old == new:
+            return
+        if old is not None:
+            self._unlink(seq, old)
+        self._by_status[status].add(seq)
+        self._by_owner.setdefault(owner, OrderedIndex()).add(seq)
+        for player in new[2]:
+            self._by_player.setdefault(player, OrderedIndex()).add(seq)
+        self._entry[game_id] = new
+
+    def _unlink(self, seq: int, entry: Tuple[str, str, Tuple[str, ...]]):
+        status, owner, players = entry
+        self._by_status[status].discard(seq)
+        for index, key in [(self._by_owner, owner)] + [(self._by_player, player) for player in players]:
+            key_index = index.get(key)
+            if key_index is not None:
+                key_index.discard(seq)
+                if not key_index:
+                    del index[key]
+
+    def remove(self, game_id: str):
+        seq = self._seq_of.pop(game_id, None)
+        if seq is None:
+            return
+        del self._game_of[seq]
+        self._all.discard(seq)
+        self._unlink(seq, self._entry.pop(game_id))
+
+    def page(self, status: Optional[str] = None, owner: Optional[str] = None,
+             player: Optional[str] = None, cursor: Optional[str] = None,
+             limit: int = 50) -> Tuple[List[str], Optional[str]]:
+        """
+        Pages through the games matching every given filter, oldest first.
+        The smallest matching index is scanned and the others are membership
+        checks, so a page costs O(log n + limit) when the filters agree.
+
+        :param cursor: next_cursor from the previous page, None for the first page
+        :return: (game ids, next_cursor or None if this was the last page)
+        :raises: ValueError for an unknown status or a cursor this index didn't hand out
+        """
+        if status is not None and status not in GAME_STATUSES:
+            raise ValueError(f"status must be one of {', '.join(GAME_STATUSES)}")
+        if cursor and not (cursor.isascii() and cursor.isdigit()):
+            raise ValueError(f"malformed cursor {cursor!r}")
+        indexes = [self._all]
+        if status is not None:
+            indexes.append(self._by_status.get(status, OrderedIndex()))
+        if owner is not None:
+            indexes.append(self._by_owner.get(owner, OrderedIndex()))
+        if player is not None:
+            indexes.append(self._by_player.get(player, OrderedIndex()))
+        indexes.sort(key=len)
+        driver, checks = indexes[0], indexes[1:]
+        after = int(cursor) if cursor else -1
+        game_ids: List[str] = []
+        for seq in driver.scan(after):
+            if all(seq in check for check in checks):
+                if len(game_ids) == limit:
+                    return game_ids, str(after)
+                game_ids.append(self._game_of[seq])
+                after = seq
+        return game_ids, None
@@ -0,0 +1,365 @@
+"""
+Append-only journal of game events, with snapshots for fast recovery.
+
+Every change AsyncTicTacToeDB makes (create, join, start, move, delete,
+evict) is appended as one record with a sequence number that is global to
+the server, so the order of moves across games is kept.  Records are encoded
+on the event loop into an in-memory buffer and written to the current
+segment file in batches, every ``flush_interval`` seconds or once
+``max_buffer`` bytes are waiting.
+
+Record layout (little endian)::
+
+    offset  size  field
+    0       4     body length n
+    4       4     CRC32 of the body
+    8       8     sequence number
+    16      8     wall-clock time, float seconds
+    24      1     kind (EVENT_*)
+    25      1     game id length g
+    26      g     game id, UTF-8
+    26+g    rest  payload: the info document (JSON) for EVENT_CREATE, the
+                  username for EVENT_JOIN, the box for EVENT_MOVE, empty otherwise
+
+A checkpoint writes every live game (info document and TicTacToe.to_bytes()
+state) into a snapshot file tagged with the last sequence number it covers,
+and starts a new segment.  Recovery loads the newest snapshot and replays
+only the records after it.  A record cut short by a crash fails its length or
+CRC check and ends the log there.
+
+iter_journal() streams records from memory-mapped segments, so analytics jobs
+can scan any number of moves in constant memory.
+"""
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+
+EVENT_CREATE = 1
+EVENT_JOIN = 2
+EVENT_START = 3
+EVENT_MOVE = 4
+EVENT_DELETE = 5
+EVENT_EVICT = 6
+
+_FRAME = struct.Struct('<II')  # body length, crc32
+_HEAD = struct.Struct('<QdBB')  # seq, time, kind, game id length
+_SNAPSHOT_HEAD = struct.Struct('<4sBQI')  # magic, version, seq, number of games
+_SNAPSHOT_ENTRY = struct.Struct('<BII')  # game id length, info length, state length
+_SNAPSHOT_MAGIC = b'TTGS'  # not b'TTTS', which starts the solver's table files
+_SNAPSHOT_VERSION = 1
+_SEGMENT_PREFIX = 'journal-'
+_SEGMENT_SUFFIX = '.log'
+_SNAPSHOT_PREFIX = 'snapshot-'
+_SNAPSHOT_SUFFIX = '.snap'
+
+
+class JournalRecord(NamedTuple):
+    seq: int
+    time: float
+    kind: int
+    game_id: str
+    payload: bytes
+
+
+# (game_id, info document, encoded state) of one game in a snapshot
+SnapshotEntry = Tuple[str, dict, bytes]
+
+
+def encode_record(seq: int, stamp: float, kind: int, game_id: str, payload: bytes = b'') -> bytes:
+    encoded_id = game_id.encode('utf-8')
+    if len(encoded_id) > 255:
+        raise ValueError(f"game id {game_id!r} is longer than 255 bytes")
+    body = b''.join((_HEAD.pack(seq, stamp, kind, len(encoded_id)), encoded_id, payload))
+    return _FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def _scan(buffer, offset: int = 0) -> Iterator[Tuple[int, JournalRecord]]:
+    """
+    :return: (offset after the record, record) for every intact record from ``offset``
+    """
+    view = memoryview(buffer)
+    try:
+        end = len(view)
+        while offset + _FRAME.size <= end:
+            length, crc = _FRAME.unpack_from(view, offset)
+            body_start = offset + _FRAME.size
+            body_end = body_start + length
+            if length < _HEAD.size or body_end > end or zlib.crc32(view[body_start:body_end]) != crc:
+                return  # torn or corrupt tail
+            seq, stamp, kind, id_length = _HEAD.unpack_from(view, body_start)
+            id_end = body_start + _HEAD.size + id_length
+            record = JournalRecord(seq, stamp, kind, str(view[body_start + _HEAD.size:id_end], 'utf-8'),
+                                   bytes(view[id_end:body_end]))
+            offset = body_end
+            yield offset, record
+    finally:
+        view.release()
+
+
+def iter_segment(path: str) -> Iterator[JournalRecord]:
+    """
+    Streams the intact records of one segment file through mmap.
+    """
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            records = _scan(mapped)
+            try:
+                for _, record in records:
+                    yield record
+            finally:
+                records.close()  # release the view before the map closes
+
+
+def _list(directory: str, prefix: str, suffix: str) -> List[Tuple[int, str]]:
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            try:
+                found.append((int(name[len(prefix):-len(suffix)]), os.path.join(directory, name)))
+            except ValueError:
+                continue
+    return sorted(found)
+
+
+def _segment_path(directory: str, first_seq: int) -> str:
+    return os.path.join(directory, f"{_SEGMENT_PREFIX}{first_seq:016d}{_SEGMENT_SUFFIX}")
+
+
+def iter_journal(directory: str, after_seq: int = 0) -> Iterator[JournalRecord]:
+    """
+    Streams every record with a sequence number above ``after_seq``, in order.
+
+    :param directory: the journal directory of a GameJournal
+    """
+    segments = _list(directory, _SEGMENT_PREFIX, _SEGMENT_SUFFIX)
+    # segments are named after their first sequence number; skip the ones wholly before after_seq
+    first = 0
+    for idx, (first_seq, _) in enumerate(segments):
+        if first_seq <= after_seq + 1:
+            first = idx
+    for _, path in segments[first:]:
+        for record in iter_segment(path):
+            if record.seq > after_seq:
+                yield record
+
+
+def read_snapshot(path: str) -> Tuple[int, Iterator[SnapshotEntry]]:
+    """
+    :return: the last sequence number the snapshot covers and its games
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, seq, count = _SNAPSHOT_HEAD.unpack_from(data)
+    if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is not a version {_SNAPSHOT_VERSION} game snapshot")
+
+    def entries() -> Iterator[SnapshotEntry]:
+        offset = _SNAPSHOT_HEAD.size
+        for _ in range(count):
+            id_length, info_length, state_length = _SNAPSHOT_ENTRY.unpack_from(data, offset)
+            offset += _SNAPSHOT_ENTRY.size
+            game_id = data[offset:offset + id_length].decode('utf-8')
+            offset += id_length
+            info = json.loads(data[offset:offset + info_length])
+            offset += info_length
+            yield game_id, info, data[offset:offset + state_length]
+            offset += state_length
+    return seq, entries()
+
+
+class GameJournal(object):
+    def __init__(self, directory: str, flush_interval: float = 0.05, max_buffer: int = 1 << 16,
+                 fsync: bool = False, prune_segments: bool = False, clock: Callable[[], float] = time.time):
+        """
+        :param directory: where segments and snapshots are kept, created if missing
+        :param flush_interval: seconds between batched writes
+        :param max_buffer: write early once this many bytes are waiting
+        :param fsync: fsync after every batch, otherwise a crash of the machine
+            (not just the process) can lose the last few batches
+        :param prune_segments: delete the segments a checkpoint makes redundant,
+            instead of keeping the full history for analytics
+        """
+        self.directory = directory
+        self._flush_interval = flush_interval
+        self._max_buffer = max_buffer
+        self._fsync = fsync
+        self._prune_segments = prune_segments
+        self._clock = clock
+        os.makedirs(directory, exist_ok=True)
+        self._pending = bytearray()
+        self._file = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches_written = 0
+        self.snapshot_seq = 0
+        snapshots = _list(directory, _SNAPSHOT_PREFIX, _SNAPSHOT_SUFFIX)
+        if snapshots:
+            self.snapshot_seq = snapshots[-1][0]
+        self.seq = self.snapshot_seq
+        segments = _list(directory, _SEGMENT_PREFIX, _SEGMENT_SUFFIX)
+        if segments:
+            self._segment = segments[-1][1]
+            self.seq = max(self.seq, self._recover_tail(self._segment))
+        else:
+            self._segment = _segment_path(directory, self.seq + 1)
+
+    def _recover_tail(self, path: str) -> int:
+        """
+        Cuts a torn record off the end of the last segment.
+
+        :return: the last intact sequence number in the segment, 0 if there is none
+        """
+        last_seq = 0
+        good_end = 0
+        if os.path.getsize(path):
+            with open(path, 'rb') as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for good_end, record in _scan(mapped):
+                    last_seq = record.seq
+        if good_end != os.path.getsize(path):
+            logging.warning("truncating torn journal tail of %s at byte %d", path, good_end)
+            os.truncate(path, good_end)
+        return last_seq
+
+    @property
+    def pending_bytes(self) -> int:
+        return len(self._pending)
+
+    def append(self, kind: int, game_id: str, payload: bytes = b'') -> int:
+        """
+        Queues a record for the next batch.
+
+        :return: its sequence number
+        """
+        self.seq += 1
+        self._pending += encode_record(self.seq, self._clock(), kind, game_id, payload)
+        if len(self._pending) >= self._max_buffer and self._wakeup is not None:
+            self._wakeup.set()
+        return self.seq
+
+    def _lock(self) -> asyncio.Lock:
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        return self._write_lock
+
+    def _write(self, data: bytes):
+        if self._file is None:
+            self._file = open(self._segment, 'ab', buffering=1 << 16)
+        self._file.write(data)
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+        self.batches_written += 1
+
+    async def flush(self):
+        """
+        Writes every queued record in one batch.
+        """
+        async with self._lock():
+            await self._write_pending()
+
+    async def _write_pending(self):
+        # call with the lock held; the records stay queued if the write fails
+        if not self._pending:
+            return
+        data, self._pending = bytes(self._pending), bytearray()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+        except BaseException:
+            self._pending[:0] = data  # retry them ahead of newer records
+            raise
+
+    async def checkpoint(self, capture: Callable[[], Iterable[SnapshotEntry]]) -> int:
+        """
+        Writes a snapshot and starts a new segment.
+
+        :param capture: returns every live game; called on the event loop right
+            after the last record it covers, so it must not await
+        :return: the sequence number the snapshot covers
+        """
+        async with self._lock():
+            seq = self.seq
+            entries = list(capture())
+            await self._write_pending()  # the records up to seq, before the snapshot that covers them
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write_checkpoint, seq, entries)
+            return seq
+
+    def _write_checkpoint(self, seq: int, entries: List[SnapshotEntry]):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        path = os.path.join(self.directory, f"{_SNAPSHOT_PREFIX}{seq:016d}{_SNAPSHOT_SUFFIX}")
+        temporary = path + '.tmp'
+        with open(temporary, 'wb', buffering=1 << 16) as file:
+            file.write(_SNAPSHOT_HEAD.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, seq, len(entries)))
+            for game_id, info, state in entries:
+                encoded_id, encoded_info = game_id.encode('utf-8'), json.dumps(info).encode('utf-8')
+                file.write(_SNAPSHOT_ENTRY.pack(len(encoded_id), len(encoded_info), len(state)))
+                file.write(encoded_id)
+                file.write(encoded_info)
+                file.write(state)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+        for old_seq, old_path in _list(self.directory, _SNAPSHOT_PREFIX, _SNAPSHOT_SUFFIX):
+            if old_seq < seq:
+                os.remove(old_path)
+        self.snapshot_seq = seq
+        self._segment = _segment_path(self.directory, seq + 1)
+        if self._prune_segments:
+            for first_seq, old_path in _list(self.directory, _SEGMENT_PREFIX, _SEGMENT_SUFFIX):
+                if first_seq <= seq:
+                    os.remove(old_path)
+
+    def recover(self) -> Tuple[Iterator[SnapshotEntry], Iterator[JournalRecord]]:
+        """
+        :return: the games of the newest snapshot (none without one) and the
+            records written after it
+        """
+        snapshots = _list(self.directory, _SNAPSHOT_PREFIX, _SNAPSHOT_SUFFIX)
+        entries: Iterator[SnapshotEntry] = iter(())
+        after_seq = 0
+        if snapshots:
+            after_seq, entries = read_snapshot(snapshots[-1][1])
+        return entries, iter_journal(self.directory, after_seq)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("journal write failed, retrying with the next batch")
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Stops the background task, writes whatever is still queued and closes
+        the segment.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,214 @@
+"""
+Storage backends for AsyncTicTacToeDB.
+
+A backend persists each game as the TicTacToeInfo fields (a JSON document)
+and the TicTacToe.to_bytes() state (see tictactoe.codec).  AsyncTicTacToeDB never writes through on
+every move; it marks games dirty and a WriteBehindFlusher commits all dirty
+games in one transaction every ``flush_interval`` seconds, or as soon as
+``max_batch`` games are waiting (group commit).
+"""
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+from abc import ABC, abstractmethod
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+
+# (info document, encoded state) of one game; state is a to_dict() document
+# for games stored before the binary encoding
+GameRecord = Tuple[dict, Union[bytes, dict]]
+
+
+class GameStorage(ABC):
+    """
+    Interface every storage backend implements.  Methods are blocking; the
+    database calls them from a worker thread.
+    """
+    @abstractmethod
+    def load_all_info(self) -> Dict[str, dict]:
+        """
+        :return: game_id -> info document for every stored game
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_game(self, game_id: str) -> Optional[GameRecord]:
+        """
+        :return: (info, state) of the game, None if it is not stored
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_batch(self, upserts: Dict[str, GameRecord], deletes: Iterable[str]):
+        """
+        Atomically stores ``upserts`` and removes ``deletes``.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(GameStorage):
+    """
+    Keeps records in a dict; useful for tests and single-process development.
+    """
+    def __init__(self):
+        self._records: Dict[str, GameRecord] = {}
+        self.batches_written = 0
+
+    def load_all_info(self) -> Dict[str, dict]:
+        return {game_id: info for game_id, (info, state) in self._records.items()}
+
+    def load_game(self, game_id: str) -> Optional[GameRecord]:
+        return self._records.get(game_id)
+
+    def write_batch(self, upserts: Dict[str, GameRecord], deletes: Iterable[str]):
+        self._records.update(upserts)
+        for game_id in deletes:
+            self._records.pop(game_id, None)
+        self.batches_written += 1
+
+
+class SQLiteStorage(GameStorage):
+    """
+    SQLite backend in WAL mode.  Each batch is one transaction, so a crash
+    leaves every game as of the last committed batch.  States are BLOBs;
+    TEXT states written by older versions are read back as JSON.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: database file, created if missing
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints, still crash-safe in WAL
+        self._conn.execute("CREATE TABLE IF NOT EXISTS games ("
+                           "game_id TEXT PRIMARY KEY, info TEXT NOT NULL, state TEXT NOT NULL)")
+        self.batches_written = 0
+
+    def load_all_info(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT game_id, info FROM games").fetchall()
+        return {game_id: json.loads(info) for game_id, info in rows}
+
+    def load_game(self, game_id: str) -> Optional[GameRecord]:
+        with self._lock:
+            row = self._conn.execute("SELECT info, state FROM games WHERE game_id = ?",
+                                     (game_id,)).fetchone()
+        if row is None:
+            return None
+        state = row[1] if isinstance(row[1], bytes) else json.loads(row[1])
+        return json.loads(row[0]), state
+
+    def write_batch(self, upserts: Dict[str, GameRecord], deletes: Iterable[str]):
+        rows = [(game_id, json.dumps(info), state if isinstance(state, bytes) else json.dumps(state))
+                for game_id, (info, state) in upserts.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO games (game_id, info, state) "
+                                       "VALUES (?, ?, ?)", rows)
+                self._conn.executemany("DELETE FROM games WHERE game_id = ?",
+                                       [(game_id,) for game_id in deletes])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.batches_written += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindFlusher(object):
+    def __init__(self, storage: GameStorage, snapshot: Callable[[str], Optional[GameRecord]],
+                 flush_interval: float = 0.05, max_batch: int = 256):
+        """
+        :param storage: backend the batches are written to
+        :param snapshot: returns the current (info, state) of a game, None if it was deleted
+        :param flush_interval: seconds between group commits
+        :param max_batch: flush early once this many games are dirty
+        """
+        self._storage = storage
+        self._snapshot = snapshot
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._dirty: Dict[str, None] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self, game_id: str):
+        self._dirty[game_id] = None
+        if len(self._dirty) >= self._max_batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    async def flush(self):
+        """
+        Writes every dirty game in one batch.  Snapshots are taken on the event
+        loop, so a batch never contains a half-applied move.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            upserts: Dict[str, GameRecord] = {}
+            deletes = []
+            for game_id in dirty:
+                try:
+                    record = self._snapshot(game_id)
+                except Exception:  # keep it dirty without holding back the rest of the batch
+                    logging.exception("cannot snapshot game %s, retrying with the next batch", game_id)
+                    self._dirty.setdefault(game_id, None)
+                    continue
+                if record is None:
+                    deletes.append(game_id)
+                else:
+                    upserts[game_id] = record
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self._storage.write_batch, upserts, deletes)
+            except BaseException:
+                for game_id in upserts.keys() | set(deletes):  # retry them with the next batch
+                    self._dirty.setdefault(game_id, None)
+                raise
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("write-behind flush failed, retrying with the next batch")
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Stops the background task and writes whatever is still dirty.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,260 @@
+"""
+Matchmaking: players wait in a queue and are paired into games in batches.
+
+Waiting players are kept in a list sorted by (rating, arrival), so a player's
+nearest-rated neighbours are the entries next to it and finding or removing a
+player is a bisect.  Every ``interval`` seconds match_once() walks the list
+once and pairs neighbours whose rating gap fits the matching window.  The
+window starts at ``window`` and widens by ``window_growth`` per second of
+waiting, so an outlier is eventually paired with whoever is closest.  All
+games of a pass are created, joined and started with two
+AsyncTicTacToeDB.apply_batch() calls, however many pairs there are.  A game
+that cannot be started is deleted and both its players go back in the queue.
+
+The lower-rated player of a pair owns the game and moves first.  Each
+player's enqueue() future resolves with the Match, and ``notify`` is called
+once per match, e.g. to push it to both players over MQTT.  The latest match
+of each player is kept for ``keep_matches`` seconds, so a client that polls
+instead of waiting can still find out about it (last_match()).
+"""
+from bisect import bisect_left, insort
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import logging
+import math
+import time
+from fastapi import HTTPException, status
+from metrics import REGISTRY
+from tictactoe_db import AsyncTicTacToeDB, BatchOp, BatchResult
+
+DEFAULT_RATING = 1500.0
+_WAIT_TIME = REGISTRY.histogram('matchmaking_wait_seconds', 'time from joining the matchmaking queue to a game')
+
+
+class Match(NamedTuple):
+    game_id: str
+    players: Tuple[str, str]  # (owner moving first as X, second player)
+    termination_password: str  # for the owner only
+
+
+class _Ticket(object):
+    __slots__ = ('key', 'enqueued_at', 'future')
+
+    def __init__(self, key: Tuple[float, int, str], enqueued_at: float, future: asyncio.Future):
+        self.key = key  # (rating, arrival number, username), the entry in the sorted pool
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+
+class Matchmaker(object):
+    def __init__(self, db: AsyncTicTacToeDB, interval: float = 0.5, window: float = 100.0,
+                 window_growth: float = 50.0, notify: Optional[Callable[[Match], Awaitable]] = None,
+                 keep_matches: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        """
+        :param db: where the games are created
+        :param interval: seconds between matching passes
+        :param window: largest rating gap paired right away
+        :param window_growth: how much the window widens per second a player waits
+        :param notify: awaited with every new match
+        :param keep_matches: seconds each player's latest match is remembered
+        """
+        self._db = db
+        self._interval = interval
+        self._window = window
+        self._window_growth = window_growth
+        self._notify = notify
+        self._clock = clock
+        self._pool: List[Tuple[float, int, str]] = []
+        self._tickets: Dict[str, _Ticket] = {}
+        self._arrivals = 0
+        self._keep_matches = keep_matches
+        self._matched: Dict[str, Tuple[float, Match]] = {}  # username -> (matched at, match), oldest first
+        self._task: Optional[asyncio.Task] = None
+        self.matches = 0
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def __contains__(self, username: str):
+        return username in self._tickets
+
+    def enqueue(self, username: str, rating: float = DEFAULT_RATING) -> asyncio.Future:
+        """
+        Puts a player in the queue.
+
+        :return: future resolved with the player's Match
+        :raises: HTTPException 400 if the player is already waiting, 422 for a rating that isn't finite
+        """
+        if not math.isfinite(rating):  # NaN would break the sort order of the pool
+            raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "rating must be a finite number.")
+        if username in self._tickets:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, f"{username} is already waiting for a game.")
+        self._matched.pop(username, None)
+        self._arrivals += 1
+        key = (float(rating), self._arrivals, username)
+        insort(self._pool, key)
+        ticket = self._tickets[username] = _Ticket(key, self._clock(),
+                                                   asyncio.get_running_loop().create_future())
+        return ticket.future
+
+    def pending(self, username: str) -> Optional[asyncio.Future]:
+        """
+        :return: the future of a player already waiting, or None
+        """
+        ticket = self._tickets.get(username)
+        return ticket.future if ticket is not None else None
+
+    def last_match(self, username: str) -> Optional[Match]:
+        """
+        :return: the player's latest match, None if it is older than keep_matches
+            or the player has queued again since
+        """
+        entry = self._matched.get(username)
+        if entry is None or self._clock() - entry[0] > self._keep_matches:
+            return None
+        return entry[1]
+
+    def _remember(self, match: Match, now: float):
+        matched = self._matched
+        for username in match.players:
+            matched.pop(username, None)  # re-inserted at the end, keeping the dict in time order
+            matched[username] = (now, match)
+        while matched:
+            oldest = next(iter(matched))
+            if now - matched[oldest][0] <= self._keep_matches:
+                break
+            del matched[oldest]
+
+    def cancel(self, username: str) -> bool:
+        """
+        Takes a player out of the queue.
+
+        :return: False if the player was not waiting (or is already being matched)
+        """
+        ticket = self._tickets.pop(username, None)
+        if ticket is None:
+            return False
+        pos = bisect_left(self._pool, ticket.key)
+        assert self._pool[pos] == ticket.key, "matchmaking pool out of order"
+        del self._pool[pos]
+        ticket.future.cancel()
+        return True
+
+    def _window_at(self, ticket: _Ticket, now: float) -> float:
+        return self._window + self._window_growth * (now - ticket.enqueued_at)
+
+    def _pair(self) -> List[Tuple[_Ticket, _Ticket]]:
+        """
+        Takes the pairs of this pass out of the pool: neighbours in rating
+        order whose gap fits the wider of their two windows.
+        """
+        now = self._clock()
+        pool, tickets = self._pool, self._tickets
+        pairs = []
+        waiting = []
+        idx = 0
+        while idx < len(pool):
+            if idx + 1 < len(pool):
+                first, second = tickets[pool[idx][2]], tickets[pool[idx + 1][2]]
+                gap = second.key[0] - first.key[0]
+                if gap <= max(self._window_at(first, now), self._window_at(second, now)):
+                    pairs.append((first, second))
+                    idx += 2
+                    continue
+            waiting.append(pool[idx])
+            idx += 1
+        self._pool = waiting
+        for first, second in pairs:
+            del tickets[first.key[2]], tickets[second.key[2]]
+        return pairs
+
+    def _requeue(self, ticket: _Ticket):
+        insort(self._pool, ticket.key)
+        self._tickets[ticket.key[2]] = ticket
+
+    async def _abandon(self, first: _Ticket, second: _Ticket, created: Optional[BatchResult] = None):
+        """
+        Puts a pair back in the queue and deletes the game created for it, if any.
+        """
+        self._requeue(first)
+        self._requeue(second)
+        if created is not None and not isinstance(created, HTTPException):
+            game_id, term_pass, _ = created
+            try:
+                await self._db.del_game(game_id, term_pass)
+            except Exception:
+                logging.exception("matchmaking could not delete game %s", game_id)
+
+    async def match_once(self) -> List[Match]:
+        """
+        Runs one matching pass.
+
+        :return: the games created
+        """
+        pairs = self._pair()
+        if not pairs:
+            return []
+        created: List = []
+        try:
+            created = await self._db.apply_batch([BatchOp('create', username=first.key[2])
+                                                  for first, _ in pairs])
+            operations = []
+            for (_, second), result in zip(pairs, created):
+                if not isinstance(result, HTTPException):
+                    game_id = result[0]
+                    operations += [BatchOp('join', game_id, second.key[2]), BatchOp('start', game_id)]
+            started = await self._db.apply_batch(operations)
+        except BaseException:
+            for idx, (first, second) in enumerate(pairs):  # back in the queue for the next pass
+                await self._abandon(first, second, created[idx] if idx < len(created) else None)
+            raise
+        now = self._clock()
+        matches = []
+        offset = 0
+        for (first, second), result in zip(pairs, created):
+            if isinstance(result, HTTPException):
+                logging.warning("matchmaking could not create a game: %s", result.detail)
+                await self._abandon(first, second)
+                continue
+            game_id, term_pass, _ = result
+            failure = next((outcome for outcome in started[offset:offset + 2]
+                            if isinstance(outcome, HTTPException)), None)
+            offset += 2
+            if failure is not None:
+                logging.warning("matchmaking could not start game %s: %s", game_id, failure.detail)
+                await self._abandon(first, second, result)
+                continue
+            match = Match(game_id, (first.key[2], second.key[2]), term_pass)
+            self._remember(match, now)
+            for ticket in (first, second):
+                _WAIT_TIME.record(now - ticket.enqueued_at)
+                if not ticket.future.done():
+                    ticket.future.set_result(match)
+            matches.append(match)
+        self.matches += len(matches)
+        if self._notify is not None:
+            for match in matches:
+                await self._notify(match)
+        return matches
+
+    async def _match_forever(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.match_once()
+            except Exception:
+                logging.exception("matchmaking pass failed")
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._match_forever())
+
+    async def stop(self):
+        """
+        Stops matching and cancels every waiting player's future.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for username in list(self._tickets):
+            self.cancel(username)
@@ -0,0 +1,275 @@
+"""
+Built-in instrumentation: latency histograms, callback gauges and counters,
+Prometheus text rendering for /metrics, and an opt-in sampling profiler.
+
+Histograms are HDR-style: each power of two of microseconds is split into 8
+linear sub-buckets, so any recorded latency is known to within 12.5% and
+recording is a couple of integer operations.  Instrumented modules use the
+process-wide REGISTRY:
+
+    @timed('db_query_seconds', 'AsyncTicTacToeDB query time', query='play_move')
+    async def play_move(...): ...
+
+    with REGISTRY.histogram('mqtt_publish_ack_seconds').time():
+        ...
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import Counter
+from contextlib import contextmanager
+import functools
+import sys
+import threading
+import time
+
+_SUB_BITS = 3  # 8 sub-buckets per power of two
+_SUB = 1 << _SUB_BITS
+_MAX_MAGNITUDE = 40  # up to 2**44 us, about 203 days
+# histogram bucket edges exported to Prometheus: powers of two from 16 us to ~16.8 s,
+# which line up exactly with sub-bucket edges
+_EXPORT_EDGES = tuple(1 << power for power in range(4, 25))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _bucket(micros: int) -> int:
+    if micros < 2 * _SUB:
+        return micros
+    magnitude = micros.bit_length() - _SUB_BITS - 1  # leaves micros >> magnitude in [_SUB, 2 * _SUB)
+    if magnitude > _MAX_MAGNITUDE:
+        return _MAX_MAGNITUDE * _SUB + 2 * _SUB - 1
+    return magnitude * _SUB + (micros >> magnitude)
+
+
+def _bucket_upper(idx: int) -> int:
+    """
+    :return: smallest microsecond value above bucket ``idx``
+    """
+    if idx < 2 * _SUB:
+        return idx + 1
+    magnitude = idx // _SUB - 1
+    return (idx - magnitude * _SUB + 1) << magnitude
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self._counts: List[int] = [0] * ((_MAX_MAGNITUDE + 2) * _SUB)
+        self.count = 0
+        self.total = 0.0  # seconds
+        self.max = 0.0
+
+    def record(self, seconds: float, count: int = 1):
+        """
+        :param count: observations this one stands for, when only a sample of them is timed
+        """
+        self._counts[_bucket(int(seconds * 1e6))] += count
+        self.count += count
+        self.total += seconds * count
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram'):
+        """
+        Adds the observations of ``other``, e.g. a histogram sent back by a worker process.
+        """
+        self._counts = [mine + theirs for mine, theirs in zip(self._counts, other._counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def quantile(self, fraction: float) -> float:
+        """
+        :param fraction: 0.5 for the median, 0.99 for p99, ...
+        :return: upper edge of the bucket holding that rank, in seconds (0.0 if empty)
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(fraction * self.count)))
+        seen = 0
+        for idx, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(_bucket_upper(idx) / 1e6, self.max)
+        return self.max
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """
+        :return: (upper edge in seconds, observations at or below it) for the exported edges
+        """
+        result = []
+        seen = 0
+        idx = 0
+        for edge in _EXPORT_EDGES:
+            while idx < len(self._counts) and _bucket_upper(idx) <= edge:
+                seen += self._counts[idx]
+                idx += 1
+            result.append((edge / 1e6, seen))
+        return result
+
+
+def _render_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self._help: Dict[str, str] = {}
+        self._types: Dict[str, str] = {}
+        self._histograms: Dict[str, Dict[Labels, LatencyHistogram]] = {}
+        self._callbacks: Dict[str, Dict[Labels, Callable[[], float]]] = {}
+
+    def _describe(self, name: str, help: str, kind: str):
+        if self._types.setdefault(name, kind) != kind:
+            raise ValueError(f"metric {name} is already a {self._types[name]}")
+        if help:
+            self._help[name] = help
+
+    def histogram(self, name: str, help: str = '', **labels: str) -> LatencyHistogram:
+        """
+        :return: the histogram for ``name`` and ``labels``, created on first use
+        """
+        self._describe(name, help, 'histogram')
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = LatencyHistogram()
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        self.histogram(name, **labels).record(seconds)
+
+    def register_callback(self, name: str, help: str, func: Callable[[], float],
+                          kind: str = 'gauge', **labels: str):
+        """
+        Exports ``func()`` at every scrape; registering the same name and labels
+        again replaces the callback.
+
+        :param kind: 'gauge' or 'counter'
+        """
+        self._describe(name, help, kind)
+        self._callbacks.setdefault(name, {})[tuple(sorted(labels.items()))] = func
+
+    def render(self) -> str:
+        """
+        :return: every metric in the Prometheus text exposition format
+        """
+        lines = []
+        for name in sorted(self._types):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types[name]}")
+            for labels, histogram in sorted(self._histograms.get(name, {}).items()):
+                for edge, seen in histogram.cumulative():
+                    bucket_labels = _render_labels(labels, f'le="{edge!r}"')
+                    lines.append(f"{name}_bucket{bucket_labels} {seen}")
+                bucket_labels = _render_labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{bucket_labels} {histogram.count}")
+                lines.append(f"{name}_sum{_render_labels(labels)} {histogram.total!r}")
+                lines.append(f"{name}_count{_render_labels(labels)} {histogram.count}")
+            for labels, func in sorted(self._callbacks.get(name, {}).items()):
+                lines.append(f"{name}{_render_labels(labels)} {float(func())!r}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def timed(name: str, help: str = '', **labels: str):
+    """
+    Decorator recording the run time of a coroutine function in REGISTRY.
+    """
+    histogram = REGISTRY.histogram(name, help, **labels)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler(object):
+    """
+    Statistical profiler: a background thread snapshots the stack of every
+    other thread each ``interval`` seconds and counts identical stacks.  Costs
+    nothing until started, and can be started and stopped on a live server.
+    """
+    def __init__(self):
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.interval = 0.005
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = 0.005):
+        """
+        Clears the previous samples and starts sampling every ``interval`` seconds.
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self.interval = interval
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    calls.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                calls.append(names.get(thread_id, str(thread_id)))
+                sampled.append(';'.join(reversed(calls)))
+            with self._lock:
+                self._stacks.update(sampled)
+                self.samples += 1
+
+    def collapsed(self, limit: Optional[int] = None) -> str:
+        """
+        :param limit: only the most frequent stacks
+        :return: one ``thread;outer;...;inner count`` line per stack, the input
+            format of flamegraph.pl and speedscope
+        """
+        with self._lock:
+            stacks = self._stacks.most_common(limit)
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+PROFILER = SamplingProfiler()
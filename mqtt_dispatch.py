@@ -0,0 +1,276 @@
+"""
+Table-driven dispatch of MQTT commands.
+
+Commands are addressed by topic, ``{root}/{subject}/{action}`` (for example
+``games/<game_id>/move`` or ``users/<username>/create``), and looked up in a
+dict keyed on (root, action).  Payloads are JSON objects checked against the
+fields each command registered, compiled once into exact-type checks.  For older clients the ``get_game`` topic
+still accepts either a JSON object with a ``cmd`` field or the original
+``<command><parameter>`` strings.
+
+Replies go to ``{root}/{subject}/{action}/reply``, failures to
+``{root}/{subject}/error``, board updates to ``games/{game_id}/state`` and
+matchmaking results to ``users/{username}/match``.
+The server subscribes to its own command topics, so messages on reply topics
+are ignored rather than dispatched.
+
+Game topics repeat for every move, so the dispatcher remembers what each
+recent topic (or legacy command string) resolved to and skips re-parsing it.
+"""
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple, Type
+import json
+import logging
+import re
+import time
+from metrics import REGISTRY, LatencyHistogram
+
+LEGACY_TOPIC = 'get_game'
+REPLY_ACTIONS = frozenset(['error', 'create_success', 'state', 'match'])  # server-published, never commands
+# resolved topics remembered; the memory is cleared when it fills up
+MAX_RESOLVED = 4096
+
+_json_decode = json.JSONDecoder().decode
+_clock = time.perf_counter
+_tuple_new = tuple.__new__  # builds a Command without NamedTuple's Python-level __new__
+
+
+class CommandError(Exception):
+    """
+    Raised by decoders and handlers; the message is published back to
+    ``{root}/{subject}/error``.
+    """
+    pass
+
+
+class Command(NamedTuple):
+    root: str  # 'games' or 'users'
+    subject: str  # game id or username from the topic
+    action: str
+    params: dict
+
+
+Handler = Callable[[object, Command], Awaitable[None]]
+# (field, type, error message) per required field
+FieldChecks = Tuple[Tuple[str, type, str], ...]
+# handler, payload checks and the record() of the command's latency histogram
+Route = Tuple[Handler, FieldChecks, Callable[[float, int], None]]
+# a Route, then the command's root, subject and action, and whether its params are in the JSON payload
+Resolved = Tuple[Handler, FieldChecks, Callable[[float, int], None], str, str, str, bool]
+
+
+def decode_payload(payload: bytes) -> dict:
+    """
+    :return: the JSON object in a payload, {} for an empty payload
+    """
+    if not payload:
+        return {}
+    try:
+        params = _json_decode(payload.decode('utf-8'))
+    except ValueError:
+        raise CommandError("payload is not valid JSON")
+    if not isinstance(params, dict):
+        raise CommandError("payload must be a JSON object")
+    return params
+
+
+def field_checks(fields: Optional[Dict[str, Type]] = None) -> FieldChecks:
+    """
+    Compiles the payload check for a command.  JSON decodes to exact builtin
+    types, so fields are matched on type identity: an int field takes neither
+    true/false nor 1.0.
+
+    :param fields: required payload field -> expected type
+    """
+    return tuple((name, field_type, f"field '{name}' must be {'an' if field_type.__name__[0] in 'aeiou' else 'a'} "
+                                    f"{field_type.__name__}")
+                 for name, field_type in (fields or {}).items())
+
+
+def check_fields(checks: FieldChecks, params: dict) -> dict:
+    """
+    :return: ``params``
+    :raises: CommandError naming the first missing or mistyped field
+    """
+    for name, field_type, error in checks:
+        if type(params.get(name)) is not field_type:
+            raise CommandError(error)
+    return params
+
+
+def reply_topic(command: Command) -> str:
+    return f"{command.root}/{command.subject}/{command.action}/reply"
+
+
+def error_topic(topic: str, command: Optional[Command] = None) -> str:
+    """
+    :return: where failures of a message on ``topic`` are reported
+    """
+    if command is not None:
+        return f"{command.root}/{command.subject}/error"
+    if topic.count('/') == 2:
+        return topic.rsplit('/', 1)[0] + '/error'
+    return LEGACY_TOPIC + '/error'
+
+
+def is_reply(topic: str) -> bool:
+    """
+    :return: True for topics the server publishes itself, which are never commands
+    """
+    return topic.count('/') == 2 and topic.rsplit('/', 1)[1] in REPLY_ACTIONS
+
+
+class CommandDispatcher(object):
+    def __init__(self, reply_errors: Tuple[Type[BaseException], ...] = (CommandError,), time_every: int = 16):
+        """
+        :param reply_errors: exception types reported to the client on the error topic
+            instead of being raised
+        :param time_every: one in this many commands is timed for mqtt_command_seconds and
+            recorded as that many; reading the clock and recording every command would
+            cost more than dispatching it
+        """
+        self._routes: Dict[Tuple[str, str], Route] = {}
+        self._legacy: Dict[str, Tuple[str, str]] = {}
+        self._legacy_pattern: Optional['re.Pattern'] = None
+        self._resolved: Dict[object, Resolved] = {}  # topic, or legacy command payload -> resolution
+        self._reply_errors = reply_errors
+        self._time_every = max(1, time_every)
+        self.dispatched = 0
+        self.errors = 0
+
+    def register(self, root: str, action: str, fields: Optional[Dict[str, Type]] = None,
+                 legacy_name: Optional[str] = None):
+        """
+        Decorator registering an ``async def handler(client, command)``.
+
+        :param root: first topic level, 'games' or 'users'
+        :param action: last topic level
+        :param fields: required payload fields and their types
+        :param legacy_name: command name accepted on the old get_game topic
+        """
+        if action in REPLY_ACTIONS:
+            raise ValueError(f"{action} is a reply topic, not a command")
+
+        def decorator(handler: Handler) -> Handler:
+            timing = REGISTRY.histogram('mqtt_command_seconds', 'MQTT command handling time',
+                                        command=f"{root}/{action}")
+            self._routes[(root, action)] = (handler, field_checks(fields), timing.record)
+            self._resolved.clear()
+            if legacy_name is not None:
+                self._legacy[legacy_name] = (root, action)
+                # longest names first so no command is shadowed by a prefix of it
+                names = sorted(self._legacy, key=len, reverse=True)
+                self._legacy_pattern = re.compile('|'.join(re.escape(name) for name in names))
+            return handler
+        return decorator
+
+    def parse(self, topic: str, payload: bytes) -> Optional[Tuple[Handler, Command, Callable[[float, int], None]]]:
+        """
+        :return: the handler, decoded command and latency recorder for a message,
+            None for a reply topic
+        :raises: CommandError for unknown commands or invalid payloads
+        """
+        if topic == LEGACY_TOPIC:
+            return self._parse_legacy(payload)
+        parts = topic.split('/')
+        if len(parts) != 3:
+            raise CommandError(f"unknown topic {topic}")
+        root, subject, action = parts
+        if action in REPLY_ACTIONS:
+            return None
+        route = self._routes.get((root, action))
+        if route is None:
+            raise CommandError(f"unknown command {root}/{action}")
+        handler, checks, record = route
+        return handler, Command(root, subject, action, check_fields(checks, decode_payload(payload))), record
+
+    def _parse_legacy(self, payload: bytes) -> Tuple[Handler, Command, Callable[[float, int], None]]:
+        if payload[:1] == b'{':
+            params = decode_payload(payload)
+            name = params.pop('cmd', None)
+            subject = str(params.pop('subject', ''))
+        else:
+            text = payload.decode('utf-8', errors='replace')
+            match = self._legacy_pattern.match(text) if self._legacy_pattern else None
+            name = match.group(0) if match else None
+            subject = text[match.end():].strip() if match else ''
+            params = {}
+        if name not in self._legacy:
+            raise CommandError("unknown command")
+        root, action = self._legacy[name]
+        handler, checks, record = self._routes[(root, action)]
+        return handler, Command(root, subject, action, check_fields(checks, params)), record
+
+    def _resolve(self, topic: str, payload: bytes) -> Optional[Resolved]:
+        """
+        :return: the route and command fields a topic (or a legacy command
+            string) stands for, None for anything parse() has to handle
+        """
+        if topic == LEGACY_TOPIC:
+            if payload[:1] == b'{':  # a JSON command: its params differ every time
+                return None
+            text = payload.decode('utf-8', errors='replace')
+            match = self._legacy_pattern.match(text) if self._legacy_pattern else None
+            if match is None:
+                return None
+            root, action = self._legacy[match.group(0)]
+            subject, key, has_params = text[match.end():].strip(), payload, False
+        else:
+            parts = topic.split('/')
+            if len(parts) != 3:
+                return None
+            root, subject, action = parts
+            key, has_params = topic, True
+        route = self._routes.get((root, action))
+        if route is None:
+            return None
+        if len(self._resolved) >= MAX_RESOLVED:
+            self._resolved.clear()
+        resolved = self._resolved[key] = route + (root, subject, action, has_params)
+        return resolved
+
+    def partition_key(self, topic: str, payload: bytes) -> str:
+        """
+        :return: the game id or username a message is about, '' if it cannot be parsed
+        """
+        if topic != LEGACY_TOPIC:
+            parts = topic.split('/')
+            return parts[1] if len(parts) == 3 else ''
+        try:
+            parsed = self._parse_legacy(payload)
+        except CommandError:
+            return ''
+        return parsed[1].subject
+
+    async def dispatch(self, client, topic: str, payload: bytes):
+        """
+        Decodes a message and runs its handler; failures listed in reply_errors
+        are published to the error topic of the command's subject.
+        """
+        command = record = None
+        start = _clock() if self.dispatched % self._time_every == 0 else None
+        try:
+            resolved = self._resolved.get(payload if topic == LEGACY_TOPIC else topic)
+            if resolved is None:
+                resolved = self._resolve(topic, payload)
+            if resolved is not None:  # the common case, parse() inlined
+                handler, checks, record, root, subject, action, has_params = resolved
+                params = decode_payload(payload) if has_params and payload else {}
+                if checks:
+                    for name, field_type, error in checks:
+                        if type(params.get(name)) is not field_type:
+                            raise CommandError(error)
+                command = _tuple_new(Command, (root, subject, action, params))
+            else:  # JSON on the legacy topic, replies and unknown commands
+                parsed = self.parse(topic, payload)
+                if parsed is None:
+                    return
+                handler, command, record = parsed
+            self.dispatched += 1
+            await handler(client, command)
+        except self._reply_errors as error:
+            self.errors += 1
+            logging.info("MQTT command on %s failed: %s", topic, error)
+            await client.publish(error_topic(topic, command), str(getattr(error, 'detail', error)), qos=1)
+        finally:
+            if start is not None and record is not None:
+                record(_clock() - start, self._time_every)
@@ -0,0 +1,139 @@
+"""
+Outbound MQTT publish queue.
+
+Handlers hand their replies to PublishQueue.publish() and move on; a sender
+task keeps up to ``max_in_flight`` publishes outstanding on the client at
+once, so QoS 1 replies are pipelined instead of each waiting a broker round
+trip.  Publishes marked ``coalesce`` (board state pushes) replace any
+not-yet-sent message on the same topic, so a backlog only ever carries the
+latest board of each game.
+"""
+from typing import Deque, Dict, Optional, Set
+from collections import deque
+from dataclasses import dataclass
+import asyncio
+import logging
+import time
+from metrics import REGISTRY
+
+_ACK_TIME = REGISTRY.histogram('mqtt_publish_ack_seconds', 'time from handing a publish to the client to its ack')
+
+
+@dataclass
+class PublishStats:
+    queued: int = 0  # accepted, waiting for an in-flight slot
+    in_flight: int = 0  # handed to the client, waiting for the broker ack
+    published: int = 0
+    coalesced: int = 0  # replaced by a newer message on the same topic before sending
+    failed: int = 0
+    total_ack_latency: float = 0.0  # seconds
+    max_ack_latency: float = 0.0
+
+    @property
+    def avg_ack_latency(self) -> float:
+        return self.total_ack_latency / self.published if self.published else 0.0
+
+
+class _Outgoing(object):
+    __slots__ = ('topic', 'payload', 'qos')
+
+    def __init__(self, topic: str, payload, qos: int):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+
+
+class PublishQueue(object):
+    def __init__(self, client, max_in_flight: int = 64, queue_size: int = 10000):
+        """
+        :param client: an asyncio_mqtt.Client (or anything with the same publish())
+        :param max_in_flight: publishes awaiting their broker ack at once
+        :param queue_size: accepted messages that may wait for a slot before publish() blocks
+        """
+        self._client = client
+        self._max_in_flight = max_in_flight
+        self._queue_size = queue_size
+        self._pending: Deque[_Outgoing] = deque()
+        self._latest: Dict[str, _Outgoing] = {}  # coalescable topic -> its unsent message
+        self._sends: Set[asyncio.Task] = set()
+        self._sender: Optional[asyncio.Task] = None
+        self.stats = PublishStats()
+
+    def start(self):
+        self._has_pending = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._space = asyncio.Semaphore(self._queue_size)
+        self._slots = asyncio.Semaphore(self._max_in_flight)
+        self._sender = asyncio.ensure_future(self._run())
+
+    async def publish(self, topic: str, payload, qos: int = 1, coalesce: bool = False):
+        """
+        Queues a message; returns once it is accepted, not once it is acked.
+
+        :param coalesce: replace an unsent message on the same topic instead of queueing another
+        """
+        if coalesce:
+            unsent = self._latest.get(topic)
+            if unsent is not None:
+                unsent.payload = payload
+                unsent.qos = max(unsent.qos, qos)
+                self.stats.coalesced += 1
+                return
+        await self._space.acquire()
+        outgoing = _Outgoing(topic, payload, qos)
+        if coalesce:
+            self._latest[topic] = outgoing
+        self._pending.append(outgoing)
+        self.stats.queued += 1
+        self._idle.clear()
+        self._has_pending.set()
+
+    async def _run(self):
+        while True:
+            while not self._pending:
+                self._has_pending.clear()
+                await self._has_pending.wait()
+            await self._slots.acquire()
+            outgoing = self._pending.popleft()
+            self._space.release()
+            if self._latest.get(outgoing.topic) is outgoing:
+                del self._latest[outgoing.topic]
+            self.stats.queued -= 1
+            self.stats.in_flight += 1
+            send = asyncio.ensure_future(self._send(outgoing))
+            self._sends.add(send)
+            send.add_done_callback(self._sends.discard)
+
+    async def _send(self, outgoing: _Outgoing):
+        start = time.perf_counter()
+        try:
+            await self._client.publish(outgoing.topic, outgoing.payload, qos=outgoing.qos)
+        except Exception:
+            self.stats.failed += 1
+            logging.exception("MQTT publish to %s failed", outgoing.topic)
+        else:
+            latency = time.perf_counter() - start
+            _ACK_TIME.record(latency)
+            self.stats.published += 1
+            self.stats.total_ack_latency += latency
+            self.stats.max_ack_latency = max(self.stats.max_ack_latency, latency)
+        finally:
+            self.stats.in_flight -= 1
+            self._slots.release()
+            if not self._pending and self.stats.in_flight == 0:
+                self._idle.set()
+
+    async def flush(self):
+        """
+        Waits until every accepted message has been acked (or failed).
+        """
+        await self._idle.wait()
+
+    async def stop(self, drain: bool = True):
+        if drain:
+            await self.flush()
+        if self._sender is not None:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, *self._sends, return_exceptions=True)
+            self._sender = None
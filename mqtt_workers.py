@@ -0,0 +1,80 @@
+"""
+Concurrent processing of MQTT commands with per-key ordering.
+
+Messages are spread over a fixed set of partitions by a hash of their key
+(game id or username).  Each partition is a bounded queue drained by one
+asyncio task, so commands for the same game or user run in arrival order
+while different games proceed in parallel.  When a partition's queue is full,
+submit() waits, which stops the reader from pulling more messages off the
+broker connection (backpressure).
+"""
+from typing import Awaitable, Callable, List
+import asyncio
+import logging
+import zlib
+
+Job = Callable[[], Awaitable[None]]
+
+
+class PartitionedWorkerPool(object):
+    def __init__(self, num_workers: int = 16, queue_size: int = 64):
+        """
+        :param num_workers: partitions, each drained by its own task
+        :param queue_size: messages a partition may hold before submit() waits
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        self._num_workers = num_workers
+        self._queue_size = queue_size
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.blocked_submits = 0  # submits that had to wait for room
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def partition(self, key: str) -> int:
+        return zlib.crc32(key.encode('utf-8')) % self._num_workers
+
+    def start(self):
+        self._queues = [asyncio.Queue(maxsize=self._queue_size) for _ in range(self._num_workers)]
+        self._tasks = [asyncio.ensure_future(self._work(queue)) for queue in self._queues]
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            try:
+                await job()
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                logging.exception("MQTT command failed")
+            finally:
+                queue.task_done()
+
+    async def submit(self, key: str, job: Job):
+        """
+        Queues ``job`` behind every earlier job with the same key, waiting
+        while that partition is full.
+        """
+        queue = self._queues[self.partition(key)]
+        if queue.full():
+            self.blocked_submits += 1
+        await queue.put(job)
+
+    async def stop(self, drain: bool = True):
+        """
+        :param drain: finish the queued jobs first instead of dropping them
+        """
+        if drain:
+            for queue in self._queues:
+                await queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
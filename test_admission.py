@@ -0,0 +1,83 @@
+import pytest
+from fastapi import HTTPException
+from admission import AdmissionController
+
+
+def test_address_user_and_global_buckets():
+    now = [0.0]
+    admission = AdmissionController(user_rate=2, user_burst=3, global_rate=10, global_burst=6,
+                                     address_rate=100, address_burst=4, max_keys=5, clock=lambda: now[0])
+    for _ in range(4):
+        admission.admit('10.0.0.1')
+    with pytest.raises(HTTPException) as refused:
+        admission.admit('10.0.0.1')
+    assert refused.value.status_code == 429 and refused.value.headers['Retry-After'] == '1'
+    for _ in range(3):
+        admission.charge('alice')
+    with pytest.raises(HTTPException):
+        admission.charge('alice')
+    admission.charge('bob')  # users don't share buckets
+    admission.admit(None)
+    admission.admit('10.0.0.2')
+    with pytest.raises(HTTPException):
+        admission.admit('10.0.0.3')  # the global burst of 6 is spent
+    assert admission.admitted == 6
+    assert admission.throttled == {'address': 1, 'user': 1, 'global': 1, 'concurrency': 0}
+
+    now[0] = 0.5  # +1 token for alice, +5 global
+    admission.charge('alice')
+    with pytest.raises(HTTPException):
+        admission.charge('alice')
+    admission.charge('mqtt', kind='address')
+    assert admission.tracked_keys == 5  # 10.0.0.1, the least recently used, was dropped
+
+
+def test_concurrency_limit_refuses_instead_of_waiting():
+    admission = AdmissionController(concurrency={'create_user': 1})
+    with admission.limit('create_user'):
+        with pytest.raises(HTTPException) as refused:
+            with admission.limit('create_user'):
+                pass
+        assert refused.value.status_code == 429
+        with admission.limit('create_game'):  # no limit configured
+            assert admission.running('create_user') == 1
+    with admission.limit('create_user'):
+        pass
+    assert admission.running('create_user') == 0 and admission.throttled['concurrency'] == 1
+
+
+def test_large_cost_runs_on_a_full_bucket_and_leaves_a_debt():
+    now = [0.0]
+    admission = AdmissionController(user_rate=10, user_burst=20, clock=lambda: now[0])
+    admission.charge('alice', 100)  # a 100-operation batch on a full bucket
+    with pytest.raises(HTTPException) as refused:
+        admission.charge('alice')
+    assert refused.value.headers['Retry-After'] == '9'  # 80 tokens of debt to repay at 10/s, plus one
+    now[0] = 9.1
+    admission.charge('alice')
+
+
+def test_batch_takes_as_many_slots_as_it_creates():
+    admission = AdmissionController(concurrency={'create_game': 4})
+    with admission.limit('create_game', 3):
+        with pytest.raises(HTTPException):
+            with admission.limit('create_game', 2):
+                pass
+        with admission.limit('create_game'):
+            assert admission.running('create_game') == 4
+    with admission.limit('create_game', 1000):  # oversized: needs every slot to itself
+        assert admission.running('create_game') == 4
+    assert admission.running('create_game') == 0
+
+
+def test_batch_charge_spends_nothing_unless_every_bucket_has_room():
+    admission = AdmissionController(user_rate=1, user_burst=10, global_rate=1, global_burst=4, clock=lambda: 0.0)
+    admission.admit(None)
+    with pytest.raises(HTTPException) as refused:
+        admission.charge('alice', 5, global_cost=4)  # the global bucket has 3 tokens left
+    assert refused.value.detail == "Server busy, try again later."
+    assert admission.throttled['global'] == 1
+    admission.charge('alice', 10, global_cost=3)  # alice still has all 10 tokens
+    with pytest.raises(HTTPException) as refused:
+        admission.charge(None, kind='global')
+    assert refused.value.detail == "Server busy, try again later."
@@ -0,0 +1,56 @@
+import asyncio
+import nacl.pwhash
+import pytest
+from fastapi import HTTPException
+from cluster import HashRing, NodeRegistry, GameRouter
+from user_db import UserDB, SQLiteAccountStore
+
+
+def test_hash_ring_moves_few_keys():
+    keys = [f'game{idx}' for idx in range(3000)]
+    three = HashRing(['a', 'b', 'c'])
+    owners = [three.owner(key) for key in keys]
+    assert all(owners.count(node) > 600 for node in 'abc')
+    four = HashRing(['a', 'b', 'c', 'd'])
+    moved = [key for key, owner in zip(keys, owners) if four.owner(key) != owner]
+    assert all(four.owner(key) == 'd' for key in moved)  # keys only move to the new node
+    assert len(moved) < len(keys) / 3
+    with pytest.raises(LookupError):
+        HashRing().owner('game0')
+
+
+def test_router_places_new_games_locally(tmp_path):
+    now = [1000.0]
+    path = str(tmp_path / 'cluster.db')
+    registry = NodeRegistry(path, heartbeat_ttl=10, clock=lambda: now[0])
+    registry.heartbeat('b', 'http://b:8000')
+    router = GameRouter(NodeRegistry(path, heartbeat_ttl=10, clock=lambda: now[0]), 'a', 'http://a:8000')
+
+    async def scenario():
+        await router.start()
+        assert router.nodes == {'a': 'http://a:8000', 'b': 'http://b:8000'}
+        game_ids = [router.new_game_id() for _ in range(50)]
+        assert all(router.owner_url(game_id) is None for game_id in game_ids)
+        remote = next(key for key in (f'game{idx}' for idx in range(100)) if not router.is_local(key))
+        assert router.owner_url(remote) == 'http://b:8000'
+        now[0] += 30  # 'b' stopped sending heartbeats
+        await router.refresh()
+        assert router.owner_url(remote) is None
+        await router.stop()
+
+    asyncio.run(scenario())
+    assert registry.live_nodes() == {}
+
+
+def test_shared_account_store(tmp_path):
+    path = str(tmp_path / 'users.db')
+    fast = dict(opslimit=nacl.pwhash.argon2id.OPSLIMIT_MIN, memlimit=nacl.pwhash.argon2id.MEMLIMIT_MIN)
+    worker1 = UserDB(accounts=SQLiteAccountStore(path), **fast)
+    worker2 = UserDB(accounts=SQLiteAccountStore(path), **fast)
+    username, password = worker1.create_user('alice')
+    assert worker1.is_valid(username, password)
+    assert worker2.is_valid(username, password)
+    with pytest.raises(HTTPException):
+        worker2.create_user('alice')
+    assert worker2.delete_user('alice')
+    assert not worker1.is_valid(username, password)  # the cached login is checked against the shared hash
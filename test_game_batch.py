@@ -0,0 +1,34 @@
+import asyncio
+from fastapi import HTTPException
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB, BatchOp, FixedLatency
+
+
+def test_batch_applies_in_order_and_reports_failures():
+    db = AsyncTicTacToeDB(UserDB(), latency=FixedLatency(0.05), num_shards=4)
+
+    async def scenario():
+        created = await db.apply_batch([BatchOp('create', username='alice') for _ in range(20)])
+        game_ids = [game_id for game_id, _, _ in created]
+        assert len(set(game_ids)) == 20
+        operations = []
+        for game_id in game_ids:
+            operations += [BatchOp('join', game_id, 'bob'), BatchOp('start', game_id),
+                           BatchOp('move', game_id, 'alice', 5), BatchOp('move', game_id, 'bob', 5),
+                           BatchOp('move', game_id, 'bob', 1)]
+        operations.append(BatchOp('join', 'no-such-game', 'bob'))
+        operations.append(BatchOp('create', username='alice', num_players=3))
+        start = asyncio.get_running_loop().time()
+        results = await db.apply_batch(operations)
+        assert asyncio.get_running_loop().time() - start < 0.1  # one round trip for 102 operations
+        for idx in range(20):
+            players, started, first, taken, second = results[5 * idx:5 * idx + 5]
+            assert players == ['alice', 'bob'] and started['current_player'] == 'alice'
+            assert first['seq'] == 1 and first['box'] == 5 and first['next'] == 'bob'
+            assert isinstance(taken, HTTPException) and taken.status_code == 400  # box 5 is taken
+            assert second['seq'] == 2 and second['box'] == 1
+        assert results[-2].status_code == 404 and results[-1].status_code == 422
+        the_game = await db.get_game(game_ids[0])
+        assert the_game._PLAYER_POS['X'] == (5,) and the_game._PLAYER_POS['O'] == (1,)
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+import asyncio
+from game_events import GameEventHub, RESYNC
+from tictactoe import TicTacToe
+
+
+def test_fan_out_shares_one_frame():
+    hub = GameEventHub()
+
+    async def scenario():
+        subscriptions = [hub.subscribe('g1') for _ in range(3)]
+        other = hub.subscribe('g2')
+        game = TicTacToe()
+        game.set_players('alice', 'bob')
+        game.apply_move(5)
+        assert hub.publish('g1', 'move', game.move_delta()) == 3
+        frames = [await subscription.get() for subscription in subscriptions]
+        assert frames[0] is frames[1] is frames[2]
+        assert frames[0] == (b'event: move\ndata: {"seq":1,"sign":"X","box":5,"next":"bob",'
+                             b'"status":"in_progress","winner":null}\n\n')
+        hub.close('g1')
+        assert await subscriptions[0].get() is None
+        assert hub.subscribers('g1') == 0 and hub.subscribers('g2') == 1
+        hub.unsubscribe(other)
+        assert hub.publish('g2', 'move', {}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_resyncs():
+    hub = GameEventHub(max_pending=4)
+
+    async def scenario():
+        slow = hub.subscribe('g1')
+        fast = hub.subscribe('g1')
+        received = []
+        for seq in range(10):
+            hub.publish('g1', 'move', {'seq': seq})
+            received.append(await fast.get())
+        assert len(received) == 10
+        # the slow reader's backlog was dropped at the 5th move; one resync replaces it
+        assert await slow.get() is RESYNC
+        hub.publish('g1', 'move', {'seq': 10})
+        assert await slow.get() == b'event: move\ndata: {"seq":10}\n\n'
+        assert hub.dropped == 6
+
+    asyncio.run(scenario())
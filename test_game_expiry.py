@@ -0,0 +1,55 @@
+import asyncio
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB
+from game_storage import MemoryStorage
+from game_expiry import ExpiryQueue
+
+
+def test_expiry_queue_reschedules_lazily():
+    queue = ExpiryQueue()
+    queue.set('a', 10)
+    queue.set('b', 20)
+    queue.set('a', 30)  # activity pushes 'a' back without a new heap entry
+    queue.set('c', 25)
+    queue.set('c', 5)  # finishing brings 'c' forward
+    assert queue.pop_expired(4) == []
+    assert queue.pop_expired(15) == ['c']
+    queue.discard('b')
+    assert queue.pop_expired(29) == []
+    assert queue.pop_expired(30) == ['a']
+    assert len(queue) == 0 and queue.next_deadline() == float('inf')
+
+
+def test_reaper_evicts_idle_and_finished_games():
+    now = [0.0]
+    archive = MemoryStorage()
+    evicted = []
+    db = AsyncTicTacToeDB(UserDB(), idle_ttl=100, finished_ttl=10, archive=archive,
+                          on_evict=evicted.append, clock=lambda: now[0])
+
+    async def scenario():
+        await db.start()
+        finished_id, _, _ = await db.add_game('alice')
+        idle_id, _, _ = await db.add_game('alice')
+        active_id, _, _ = await db.add_game('carol')
+        await db.add_player(finished_id, 'bob')
+        await db.init_game(finished_id)
+        for player, move in [('alice', 1), ('bob', 4), ('alice', 2), ('bob', 5), ('alice', 3)]:
+            await db.play_move(finished_id, player, move)
+        assert db.resident_games == 3
+
+        now[0] = 50.0
+        assert await db.reap() == 1  # won 50 s ago, past the 10 s finished TTL
+        assert evicted == [finished_id]
+        assert archive.load_game(finished_id)[1]  # encoded board kept in the archive
+        await db.add_player(active_id, 'dave')  # activity restarts the idle clock
+
+        now[0] = 120.0
+        assert await db.reap() == 1
+        assert evicted == [finished_id, idle_id]
+        assert (await db.list_games()).games == [(active_id, 2)]
+        assert await db.get_game(idle_id) is None
+        assert db.evictions == 2 and db.archived == 2 and db.resident_games == 1
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB
+from game_index import GameIndex, GAME_OPEN, GAME_IN_PROGRESS, GAME_FINISHED
+
+
+def test_cursor_pages_cover_every_game_once():
+    index = GameIndex()
+    for i in range(25):
+        index.update(f'g{i}', GAME_OPEN if i % 2 else GAME_IN_PROGRESS, 'alice', ['alice'])
+    index.remove('g3')
+    seen, cursor = [], None
+    while True:
+        page, cursor = index.page(status=GAME_OPEN, cursor=cursor, limit=5)
+        seen += page
+        if cursor is None:
+            break
+    assert seen == [f'g{i}' for i in range(25) if i % 2 and i != 3]
+    assert index.page(owner='nobody') == ([], None)
+
+
+def test_status_moves_between_indexes():
+    index = GameIndex()
+    index.update('g0', GAME_OPEN, 'alice', ['alice'])
+    index.update('g1', GAME_OPEN, 'alice', ['alice'])
+    index.update('g0', GAME_IN_PROGRESS, 'alice', ['alice', 'bob'])
+    assert index.page(status=GAME_OPEN) == (['g1'], None)
+    assert index.page(player='bob') == (['g0'], None)
+    index.update('g0', GAME_OPEN, 'alice', ['alice'])  # back to the same position in the order
+    assert index.page(status=GAME_OPEN) == (['g0', 'g1'], None)
+    assert index.page(player='bob') == ([], None)
+
+
+def test_db_lobby_listing():
+    async def scenario():
+        db = AsyncTicTacToeDB(UserDB())
+        open_id, _, _ = await db.add_game('alice')
+        full_id, _, _ = await db.add_game('carol')
+        await db.add_player(full_id, 'dave')
+        await db.init_game(full_id)
+        assert (await db.list_games(status=GAME_OPEN)).games == [(open_id, 1)]
+        assert (await db.list_games(player='dave')).games == [(full_id, 2)]
+        for move, user in [(1, 'carol'), (4, 'dave'), (2, 'carol'), (5, 'dave'), (3, 'carol')]:
+            await db.play_move(full_id, user, move)
+        assert (await db.list_games(status=GAME_FINISHED)).games == [(full_id, 2)]
+        assert (await db.list_games(status=GAME_IN_PROGRESS)).games == []
+        page = await db.list_games(limit=1)
+        assert page.games == [(open_id, 1)]
+        assert (await db.list_games(cursor=page.next_cursor)).games == [(full_id, 2)]
+        for bad in ({'cursor': 'garbage'}, {'cursor': '-5'}, {'status': 'paused'}):
+            with pytest.raises(HTTPException) as refused:
+                await db.list_games(**bad)
+            assert refused.value.status_code == 422
+
+    asyncio.run(scenario())
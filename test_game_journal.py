@@ -0,0 +1,90 @@
+import asyncio
+import os
+import pytest
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB
+from game_index import GAME_FINISHED
+from game_journal import GameJournal, iter_journal, EVENT_CREATE, EVENT_MOVE
+
+
+def test_recovers_from_snapshot_and_tail(tmp_path):
+    directory = str(tmp_path / 'journal')
+
+    async def first_run():
+        db = AsyncTicTacToeDB(UserDB(), journal=GameJournal(directory), snapshot_interval=None)
+        await db.start()
+        game_id, _, _ = await db.add_game('alice')
+        await db.add_player(game_id, 'bob')
+        await db.init_game(game_id)
+        await db.play_move(game_id, 'alice', 5)
+        assert await db.checkpoint() == 4
+        await db.play_move(game_id, 'bob', 1)
+        doomed_id, doomed_pass, _ = await db.add_game('carol')
+        await db.del_game(doomed_id, doomed_pass)
+        await db._journal.stop()  # crash: no final checkpoint
+        return game_id, doomed_id
+
+    async def second_run(game_id, doomed_id):
+        journal = GameJournal(directory)
+        entries, records = journal.recover()
+        assert [entry[0] for entry in entries] == [game_id]
+        assert [record.seq for record in records] == [5, 6, 7]  # only the tail is replayed
+        db = AsyncTicTacToeDB(UserDB(), journal=journal, snapshot_interval=None)
+        await db.start()
+        the_game = await db.get_game(game_id)
+        assert the_game._PLAYER_POS['X'] == (5,) and the_game._PLAYER_POS['O'] == (1,)
+        assert await db.get_game(doomed_id) is None
+        for player, move in [('alice', 2), ('bob', 4), ('alice', 8)]:
+            await db.play_move(game_id, player, move)
+        assert (await db.list_games(status=GAME_FINISHED)).games == [(game_id, 2)]
+        await db.close()
+        assert journal.snapshot_seq == journal.seq == 10
+
+    game_id, doomed_id = asyncio.run(first_run())
+    asyncio.run(second_run(game_id, doomed_id))
+    moves = [record for record in iter_journal(directory) if record.kind == EVENT_MOVE]
+    assert [record.payload[0] for record in moves] == [5, 1, 2, 4, 8]
+    assert all(earlier.seq < later.seq for earlier, later in zip(moves, moves[1:]))
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    directory = str(tmp_path / 'journal')
+
+    async def write():
+        journal = GameJournal(directory)
+        journal.start()
+        for idx in range(3):
+            journal.append(EVENT_CREATE, f'game{idx}', b'{}')
+        await journal.stop()
+
+    asyncio.run(write())
+    segment = os.path.join(directory, os.listdir(directory)[0])
+    with open(segment, 'ab') as file:
+        file.write(b'\x40\x00\x00\x00partial')  # a record cut short by a crash
+    journal = GameJournal(directory)
+    assert journal.seq == 3
+    assert [record.game_id for record in iter_journal(directory)] == ['game0', 'game1', 'game2']
+    assert journal.append(EVENT_CREATE, 'game3', b'{}') == 4
+
+
+def test_failed_checkpoint_keeps_its_records(tmp_path):
+    directory = str(tmp_path / 'journal')
+    journal = GameJournal(directory)
+    write = journal._write
+
+    def broken_write(data):
+        raise OSError('disk full')
+
+    async def scenario():
+        for idx in range(2):
+            journal.append(EVENT_CREATE, f'game{idx}', b'{}')
+        pending = journal.pending_bytes
+        journal._write = broken_write
+        with pytest.raises(OSError):
+            await journal.checkpoint(lambda: [])
+        assert journal.pending_bytes == pending and journal.snapshot_seq == 0
+        journal._write = write
+        assert await journal.checkpoint(lambda: []) == 2
+
+    asyncio.run(scenario())
+    assert [record.game_id for record in iter_journal(directory)] == ['game0', 'game1']
@@ -0,0 +1,169 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB, FixedLatency
+from game_storage import GameStorage, SQLiteStorage, MemoryStorage
+from game_index import GAME_IN_PROGRESS
+from tictactoe import TicTacToe
+
+
+def make_db(storage, **kwargs):
+    return AsyncTicTacToeDB(UserDB(), storage=storage, **kwargs)
+
+
+def test_sqlite_survives_restart(tmp_path):
+    path = str(tmp_path / 'games.db')
+
+    async def first_run():
+        db = make_db(SQLiteStorage(path))
+        await db.start()
+        game_id, term_pass, owner = await db.add_game('alice')
+        await db.add_player(game_id, 'bob')
+        await db.init_game(game_id)
+        await db.play_move(game_id, 'alice', 5)
+        await db.play_move(game_id, 'bob', 1)
+        doomed_id, doomed_pass, _ = await db.add_game('alice')
+        await db.del_game(doomed_id, doomed_pass)
+        await db.close()
+        return game_id, doomed_id
+
+    async def second_run(game_id, doomed_id):
+        db = make_db(SQLiteStorage(path))
+        await db.start()
+        assert (await db.list_games()).games == [(game_id, 2)]
+        assert (await db.list_games(status=GAME_IN_PROGRESS)).games == [(game_id, 2)]
+        info = await db.get_game_info(game_id)
+        assert info.players == ['alice', 'bob'] and info.owner == 'alice'
+        the_game = await db.get_game(game_id)
+        assert the_game._PLAYER_POS['X'] == (5,) and the_game._PLAYER_POS['O'] == (1,)
+        assert await db.get_game(doomed_id) is None
+        await db.play_move(game_id, 'alice', 9)
+        await db.close()
+
+    game_id, doomed_id = asyncio.run(first_run())
+    asyncio.run(second_run(game_id, doomed_id))
+
+
+def test_sqlite_reads_json_states(tmp_path):
+    path = str(tmp_path / 'games.db')
+    game = TicTacToe()
+    game.set_players('alice', 'bob')
+    game.apply_move(5)
+    info = {'game_uuid': 'old', 'players': ['alice', 'bob'], 'termination_password': 'pw',
+            'owner': 'alice', 'num_players': 2, 'status': GAME_IN_PROGRESS}
+    storage = SQLiteStorage(path)
+    storage.write_batch({'old': (info, game.to_dict())}, [])  # a row from before the binary encoding
+    storage.write_batch({'new': (dict(info, game_uuid='new'), game.to_bytes())}, [])
+    assert isinstance(storage.load_game('old')[1], dict)
+    assert isinstance(storage.load_game('new')[1], bytes)
+    storage.close()
+
+    async def scenario():
+        db = make_db(SQLiteStorage(path))
+        await db.start()
+        for game_id in ('old', 'new'):
+            assert (await db.get_game(game_id)).to_dict() == game.to_dict()
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_write_behind_groups_commits():
+    storage = MemoryStorage()
+
+    async def scenario():
+        db = make_db(storage, flush_interval=60, max_batch=10)
+        await db.start()
+        for _ in range(9):
+            await db.add_game('alice')
+        await asyncio.sleep(0)
+        assert storage.batches_written == 0  # below max_batch, waiting for the timer
+        await db.add_game('alice')
+        await asyncio.sleep(0.01)
+        assert storage.batches_written == 1
+        assert len(storage.load_all_info()) == 10
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_unencodable_game_does_not_hold_back_the_batch():
+    storage = MemoryStorage()
+
+    async def scenario():
+        db = make_db(storage, flush_interval=60)
+        await db.start()
+        bad_id, _, _ = await db.add_game('x' * 300)  # the codec stores names of up to 255 bytes
+        await db.add_player(bad_id, 'bob')
+        await db.init_game(bad_id)
+        good_id, _, _ = await db.add_game('alice')
+        await db._flusher.flush()
+        assert list(storage.load_all_info()) == [good_id]
+        assert db.pending_writes == 1 and bad_id in db._flusher._dirty
+        await db.del_game(bad_id, (await db.get_game_info(bad_id)).termination_password)
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_game_starts_once():
+    async def scenario():
+        db = make_db(None)
+        game_id, _, _ = await db.add_game('alice')
+        await db.add_player(game_id, 'bob')
+        await db.init_game(game_id)
+        await db.play_move(game_id, 'alice', 5)
+        with pytest.raises(HTTPException) as refused:
+            await db.init_game(game_id)
+        assert refused.value.status_code == 400
+        assert (await db.get_game(game_id))._CUR_PLAYER_NAME == 'bob'
+        for num_players in (0, 3, '2'):  # TicTacToe only plays 2
+            with pytest.raises(HTTPException) as refused:
+                await db.add_game('alice', num_players)
+            assert refused.value.status_code == 422
+
+    asyncio.run(scenario())
+
+
+def test_add_player_rules():
+    async def scenario():
+        db = make_db(None)
+        game_id, _, _ = await db.add_game('alice')
+        assert await db.add_player(game_id, 'bob') == ['alice', 'bob']
+        with pytest.raises(HTTPException):
+            await db.add_player(game_id, 'carol')
+        with pytest.raises(HTTPException):
+            await db.add_player('missing', 'carol')
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_joins_take_one_seat():
+    async def scenario():
+        db = AsyncTicTacToeDB(UserDB(), latency=FixedLatency(0.001), num_shards=4)
+        game_id, _, _ = await db.add_game('alice')
+        results = await asyncio.gather(db.add_player(game_id, 'bob'),
+                                       db.add_player(game_id, 'carol'),
+                                       return_exceptions=True)
+        assert sum(isinstance(result, HTTPException) for result in results) == 1
+        assert len((await db.get_game_info(game_id)).players) == 2
+        other_ids = [(await db.add_game('dave'))[0] for _ in range(8)]
+        assert {game_id for game_id, _ in db.iter_games()} == {game_id, *other_ids}
+
+    asyncio.run(scenario())
+
+
+def test_storage_backends_must_implement_every_method():
+    class LoadOnly(GameStorage):
+        def load_all_info(self):
+            return {}
+
+        def load_game(self, game_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GameStorage()
+    with pytest.raises(TypeError):
+        LoadOnly()
+    MemoryStorage().close()  # close() is optional
@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from user_db import UserDB
+from tictactoe_db import AsyncTicTacToeDB
+from game_index import GAME_IN_PROGRESS
+from matchmaking import Matchmaker
+
+
+def test_pairs_nearest_ratings_and_widens_window():
+    now = [0.0]
+    notified = []
+    db = AsyncTicTacToeDB(UserDB())
+
+    async def notify(match):
+        notified.append(match)
+
+    matchmaker = Matchmaker(db, window=50, window_growth=100, notify=notify, clock=lambda: now[0])
+
+    async def scenario():
+        futures = {name: matchmaker.enqueue(name, rating)
+                   for name, rating in [('ann', 1500), ('bo', 1900), ('cy', 1520), ('di', 1880), ('ed', 1700)]}
+        with pytest.raises(HTTPException):
+            matchmaker.enqueue('ann')
+        matches = await matchmaker.match_once()
+        assert sorted(match.players for match in matches) == [('ann', 'cy'), ('di', 'bo')]
+        assert futures['ann'].result() == futures['cy'].result() and len(notified) == 2
+        assert len(matchmaker) == 1 and 'ed' in matchmaker
+        game = await db.get_game(futures['di'].result().game_id)
+        assert game._CUR_PLAYER_NAME == 'di'  # the lower rating moves first
+        assert len((await db.list_games(status=GAME_IN_PROGRESS)).games) == 2
+
+        matchmaker.enqueue('fay', 1300)
+        assert await matchmaker.match_once() == []  # 400 apart
+        now[0] = 4.0  # ed has waited 4 s: window 450
+        assert [match.players for match in await matchmaker.match_once()] == [('fay', 'ed')]
+        assert matchmaker.cancel('gus') is False
+        matchmaker.enqueue('gus')
+        assert matchmaker.cancel('gus') and len(matchmaker) == 0
+        for rating in (float('nan'), float('inf')):
+            with pytest.raises(HTTPException) as refused:
+                matchmaker.enqueue('hal', rating)
+            assert refused.value.status_code == 422 and 'hal' not in matchmaker
+
+    asyncio.run(scenario())
+
+
+def test_remembers_latest_match_until_requeued_or_stale():
+    now = [0.0]
+    matchmaker = Matchmaker(AsyncTicTacToeDB(UserDB()), keep_matches=60, clock=lambda: now[0])
+
+    async def scenario():
+        matchmaker.enqueue('ann')
+        matchmaker.enqueue('bo')
+        match, = await matchmaker.match_once()
+        assert matchmaker.last_match('ann') == matchmaker.last_match('bo') == match
+        assert matchmaker.last_match('cy') is None
+        matchmaker.enqueue('ann')  # queuing again forgets the old match
+        assert matchmaker.last_match('ann') is None and matchmaker.last_match('bo') == match
+        now[0] = 61.0
+        assert matchmaker.last_match('bo') is None
+        matchmaker.enqueue('cy')
+        await matchmaker.match_once()  # ann and cy; bo's stale entry is dropped
+        assert 'bo' not in matchmaker._matched
+
+    asyncio.run(scenario())
+
+
+def test_games_that_cannot_start_are_deleted_and_players_requeued():
+    db = AsyncTicTacToeDB(UserDB())
+    matchmaker = Matchmaker(db)
+    apply_batch = db.apply_batch
+    starts = []
+
+    async def failing_starts(operations):
+        if operations[0].action == 'create':
+            return await apply_batch(operations)
+        starts.append(operations)
+        if len(starts) == 1:
+            raise RuntimeError('database went away')
+        return [HTTPException(409, 'seat taken')] * len(operations)
+
+    db.apply_batch = failing_starts
+
+    async def scenario():
+        matchmaker.enqueue('ann')
+        matchmaker.enqueue('bo')
+        with pytest.raises(RuntimeError):
+            await matchmaker.match_once()
+        assert 'ann' in matchmaker and 'bo' in matchmaker
+        assert await matchmaker.match_once() == []
+        assert 'ann' in matchmaker and 'bo' in matchmaker and len(starts) == 2
+        assert (await db.list_games()).games == []  # neither attempt left a game behind
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from metrics import LatencyHistogram, MetricsRegistry, SamplingProfiler, REGISTRY, timed
+
+
+def test_histogram_quantiles_within_bucket_error():
+    histogram = LatencyHistogram()
+    for micros in range(1, 10001):  # 1 us .. 10 ms, uniform
+        histogram.record(micros / 1e6)
+    for fraction in (0.5, 0.9, 0.99):
+        exact = fraction * 10000 / 1e6
+        assert exact <= histogram.quantile(fraction) <= exact * 1.125
+    assert histogram.quantile(1.0) == histogram.max == 0.01
+    assert LatencyHistogram().quantile(0.5) == 0.0
+
+
+def test_histogram_merge():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for micros in range(1, 101):
+        (first if micros % 2 else second).record(micros / 1e6)
+    first.merge(second)
+    assert first.count == 100 and first.max == 0.0001
+    assert 50e-6 <= first.quantile(0.5) <= 50e-6 * 1.125
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.observe('request_seconds', 0.0005, route='/game/{game_id}/move')
+    registry.observe('request_seconds', 2.0, route='/game/{game_id}/move')
+    registry.register_callback('games_resident', 'games held in memory', lambda: 3)
+    text = registry.render()
+    assert '# TYPE request_seconds histogram' in text
+    assert 'request_seconds_bucket{route="/game/{game_id}/move",le="0.000512"} 1' in text
+    assert 'request_seconds_bucket{route="/game/{game_id}/move",le="+Inf"} 2' in text
+    assert 'request_seconds_count{route="/game/{game_id}/move"} 2' in text
+    assert '# HELP games_resident games held in memory\n# TYPE games_resident gauge\ngames_resident 3.0\n' in text
+
+
+def test_timed_records_coroutines():
+    @timed('test_timed_seconds', query='sleep')
+    async def nap():
+        await asyncio.sleep(0.01)
+        return 'done'
+
+    assert asyncio.run(nap()) == 'done'
+    histogram = REGISTRY.histogram('test_timed_seconds', query='sleep')
+    assert histogram.count == 1 and histogram.total >= 0.01
+
+
+def test_sampling_profiler_collects_stacks():
+    profiler = SamplingProfiler()
+    profiler.start(0.001)
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    profiler.stop()
+    assert not profiler.running and profiler.samples > 0
+    assert 'test_metrics.py:test_sampling_profiler_collects_stacks' in profiler.collapsed()
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import pytest
+from mqtt_dispatch import CommandDispatcher, reply_topic
+
+
+class RecordingClient(object):
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, topic, payload, qos=0):
+        self.published.append((topic, payload))
+
+
+def make_dispatcher():
+    dispatcher = CommandDispatcher()
+    seen = []
+
+    @dispatcher.register('users', 'create', legacy_name='create_user')
+    async def create(client, command):
+        seen.append(command)
+
+    @dispatcher.register('games', 'move', {'move': int}, legacy_name='move')
+    async def move(client, command):
+        seen.append(command)
+        await client.publish(reply_topic(command), json.dumps(command.params))
+
+    @dispatcher.register('users', 'create_game', legacy_name='create_game')
+    async def create_game(client, command):
+        seen.append(command)
+
+    return dispatcher, seen
+
+
+def test_topic_and_legacy_forms():
+    dispatcher, seen = make_dispatcher()
+    client = RecordingClient()
+
+    async def scenario():
+        await dispatcher.dispatch(client, 'users/jimbo/create', b'')
+        await dispatcher.dispatch(client, 'games/g1/move', b'{"move": 5}')
+        await dispatcher.dispatch(client, 'get_game', b'{"cmd": "move", "subject": "g2", "move": 1}')
+        # the parameter contains a command name; only the leading command is stripped
+        await dispatcher.dispatch(client, 'get_game', b'create_usercreate_game')
+        await dispatcher.dispatch(client, 'get_game', b'create_gamealice')
+
+    asyncio.run(scenario())
+    assert [(c.root, c.subject, c.action) for c in seen] == [
+        ('users', 'jimbo', 'create'), ('games', 'g1', 'move'), ('games', 'g2', 'move'),
+        ('users', 'create_game', 'create'), ('users', 'alice', 'create_game')]
+    assert client.published == [('games/g1/move/reply', '{"move": 5}'),
+                                ('games/g2/move/reply', '{"move": 1}')]
+
+
+def test_errors_are_replied_and_replies_ignored():
+    dispatcher, seen = make_dispatcher()
+    client = RecordingClient()
+
+    async def scenario():
+        await dispatcher.dispatch(client, 'games/g1/move', b'{"move": "five"}')
+        await dispatcher.dispatch(client, 'games/g1/move', b'{"move": true}')  # a bool is not an int
+        await dispatcher.dispatch(client, 'games/g1/fly', b'')
+        await dispatcher.dispatch(client, 'get_game', b'not_a_command')
+        await dispatcher.dispatch(client, 'games/g1/error', b'whatever')
+
+    asyncio.run(scenario())
+    assert seen == []
+    assert [topic for topic, _ in client.published] == ['games/g1/error'] * 3 + ['get_game/error']
+    assert client.published[1] == ('games/g1/error', "field 'move' must be an int")
+    assert dispatcher.errors == 4
+
+
+def test_repeated_topics_reuse_their_resolution():
+    dispatcher, seen = make_dispatcher()
+    client = RecordingClient()
+
+    async def scenario():
+        for move in (1, 2):
+            await dispatcher.dispatch(client, 'games/g1/move', json.dumps({'move': move}).encode())
+            await dispatcher.dispatch(client, 'get_game', b'create_gamealice')
+        await dispatcher.dispatch(client, 'games/g1/move', b'{"move": "three"}')
+
+    asyncio.run(scenario())
+    assert [(c.subject, c.action, c.params) for c in seen] == [
+        ('g1', 'move', {'move': 1}), ('alice', 'create_game', {}),
+        ('g1', 'move', {'move': 2}), ('alice', 'create_game', {})]
+    assert client.published[-1] == ('games/g1/error', "field 'move' must be an int")
+
+
+def test_reply_actions_cannot_be_registered():
+    with pytest.raises(ValueError):
+        CommandDispatcher().register('games', 'error')
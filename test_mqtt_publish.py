@@ -0,0 +1,66 @@
+import asyncio
+import json
+import time
+from fake_mqtt import FakeBroker
+from mqtt_publish import PublishQueue
+
+
+def test_pipelined_acks():
+    broker = FakeBroker()
+
+    async def scenario():
+        async with broker.client(ack_delay=0.02) as client:
+            queue = PublishQueue(client, max_in_flight=50)
+            queue.start()
+            for idx in range(100):
+                await queue.publish(f'users/user{idx}/create_success', '{}', qos=1)
+            await queue.stop()
+            return queue.stats
+
+    start = time.perf_counter()
+    stats = asyncio.run(scenario())
+    elapsed = time.perf_counter() - start
+    assert len(broker.published) == 100
+    assert [message.topic for message in broker.published][:2] == ['users/user0/create_success',
+                                                                   'users/user1/create_success']
+    assert stats.published == 100 and stats.in_flight == 0 and stats.queued == 0
+    assert stats.max_ack_latency >= 0.02
+    assert elapsed < 100 * 0.02 / 4  # two waves of acks, not one round trip per message
+
+
+def test_coalesce_keeps_latest_board():
+    broker = FakeBroker()
+
+    async def scenario():
+        async with broker.client(ack_delay=0.01) as client:
+            queue = PublishQueue(client, max_in_flight=1)
+            queue.start()
+            await queue.publish('games/a/move/reply', 'first', qos=1)
+            await asyncio.sleep(0)  # the reply is now in flight, everything below waits
+            for move in range(1, 6):
+                await queue.publish('games/a/state', json.dumps({'move': move}), qos=1, coalesce=True)
+                await queue.publish('games/b/state', json.dumps({'move': move}), qos=0, coalesce=True)
+            await queue.stop()
+            return queue.stats
+
+    stats = asyncio.run(scenario())
+    states = [(message.topic, json.loads(message.payload)) for message in broker.published[1:]]
+    assert states == [('games/a/state', {'move': 5}), ('games/b/state', {'move': 5})]
+    assert stats.coalesced == 8
+    assert stats.published == 3
+
+
+def test_failed_publish_is_counted():
+    class BrokenClient(object):
+        async def publish(self, topic, payload=None, qos=0, retain=False):
+            raise ConnectionError("broker gone")
+
+    async def scenario():
+        queue = PublishQueue(BrokenClient())
+        queue.start()
+        await queue.publish('games/a/state', '{}')
+        await queue.stop()
+        return queue.stats
+
+    stats = asyncio.run(scenario())
+    assert stats.failed == 1 and stats.published == 0 and stats.in_flight == 0
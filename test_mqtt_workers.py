@@ -0,0 +1,57 @@
+import asyncio
+import random
+import time
+from mqtt_workers import PartitionedWorkerPool
+
+
+def test_per_key_order_and_parallelism():
+    pool = PartitionedWorkerPool(num_workers=8, queue_size=4)
+    done = {f'game{g}': [] for g in range(8)}
+
+    def job(key, seq):
+        async def run():
+            await asyncio.sleep(random.random() * 0.005)
+            done[key].append(seq)
+        return run
+
+    async def scenario():
+        pool.start()
+        for seq in range(10):
+            for key in done:
+                await pool.submit(key, job(key, seq))
+        await pool.stop()
+
+    start = time.perf_counter()
+    asyncio.run(scenario())
+    elapsed = time.perf_counter() - start
+    assert all(seqs == list(range(10)) for seqs in done.values())
+    assert pool.processed == 80
+    assert elapsed < 80 * 0.0025  # well under the serial expectation
+
+
+def test_backpressure_and_failures():
+    pool = PartitionedWorkerPool(num_workers=1, queue_size=2)
+
+    async def scenario():
+        gate = asyncio.Event()
+        pool.start()
+
+        async def blocked():
+            await gate.wait()
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        await pool.submit('a', blocked)
+        await asyncio.sleep(0)  # the worker takes it and waits on the gate
+        await pool.submit('a', broken)
+        await pool.submit('a', broken)
+        waiting = asyncio.ensure_future(pool.submit('a', broken))
+        await asyncio.sleep(0.01)
+        assert not waiting.done() and pool.blocked_submits == 1
+        gate.set()
+        await waiting
+        await pool.stop()
+
+    asyncio.run(scenario())
+    assert pool.processed == 1 and pool.failed == 3
@@ -1,5 +1,8 @@
+import asyncio
+import nacl.pwhash
 import pytest
-from user_db import UserDB
+from fastapi import HTTPException
+from user_db import UserDB, CredentialCache, AccountStore, MemoryAccountStore
 
 
 @pytest.fixture
@@ -12,6 +15,9 @@ def test_create_user(empty_userdb):
     username, passtoken = empty_userdb.create_user(test_username)
     assert username == test_username
     assert passtoken != empty_userdb._accounts[username]
+    with pytest.raises(HTTPException) as too_long:
+        empty_userdb.create_user('é' * 128)  # 256 bytes
+    assert too_long.value.status_code == 422
 
 
 def test_check_login(empty_userdb):
@@ -25,5 +31,69 @@ def test_check_login(empty_userdb):
         test_username, passtoken) is True
 
 
+def test_async_hashing():
+    fast_userdb = UserDB(max_hash_workers=2,
+                         opslimit=nacl.pwhash.argon2id.OPSLIMIT_MIN,
+                         memlimit=nacl.pwhash.argon2id.MEMLIMIT_MIN)
+
+    async def scenario():
+        created = await asyncio.gather(*(fast_userdb.create_user_async(f'user{i}') for i in range(5)))
+        with pytest.raises(HTTPException):
+            await fast_userdb.create_user_async('user0')
+        username, passtoken = created[0]
+        assert await fast_userdb.is_valid_async(username, passtoken) is True
+        assert await fast_userdb.is_valid_async(username, 'baddpasstoken') is False
+        assert await fast_userdb.is_valid_async('nobody', passtoken) is False
+
+    asyncio.run(scenario())
+    assert fast_userdb.is_valid('user1', 'baddpasstoken') is False
+    stats = fast_userdb.hash_stats
+    assert stats.completed == 7
+    assert stats.queue_depth == 0 and stats.in_flight == 0
+    assert stats.max_latency >= stats.avg_latency > 0
+
+
+def test_credential_cache():
+    now = [0.0]
+    cache = CredentialCache(max_entries=2, ttl=10.0, clock=lambda: now[0])
+    fast_userdb = UserDB(opslimit=nacl.pwhash.argon2id.OPSLIMIT_MIN,
+                         memlimit=nacl.pwhash.argon2id.MEMLIMIT_MIN,
+                         credential_cache=cache)
+    username, passtoken = fast_userdb.create_user('cached')
+    assert fast_userdb.is_valid(username, passtoken) is True
+    assert cache.misses == 1 and len(cache) == 1
+    assert fast_userdb.is_valid(username, passtoken) is True
+    assert cache.hits == 1
+    assert fast_userdb.is_valid(username, 'baddpasstoken') is False
+    assert len(cache) == 1  # failures are never cached
+    now[0] = 11.0
+    assert fast_userdb.is_valid(username, passtoken) is True
+    assert cache.hits == 1  # expired, verified again
+    assert fast_userdb.delete_user(username) is True
+    assert len(cache) == 0
+    assert fast_userdb.is_valid(username, passtoken) is False
+    for name in ('a', 'b', 'c'):
+        assert fast_userdb.is_valid(*fast_userdb.create_user(name)) is True
+    assert len(cache) == 2
+
+
+def test_account_store_subclasses_must_implement_every_method():
+    class NoDelete(AccountStore):
+        def get(self, username):
+            return None
+
+        def add(self, username, password_hash):
+            return True
+
+        def __len__(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        AccountStore()
+    with pytest.raises(TypeError):
+        NoDelete()
+    assert len(MemoryAccountStore()) == 0
+
+
 if __name__ == '__main__':
     pytest.main()
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import httpx
+import nacl.pwhash
+import pytest
+import web_tictactoe as web
+from admission import AdmissionController
+
+
+@pytest.fixture(autouse=True)
+def fast_server(monkeypatch):
+    monkeypatch.setattr(web.USER_DB, '_opslimit', nacl.pwhash.argon2id.OPSLIMIT_MIN)
+    monkeypatch.setattr(web.USER_DB, '_memlimit', nacl.pwhash.argon2id.MEMLIMIT_MIN)
+    monkeypatch.setattr(web, 'ADMISSION', AdmissionController(concurrency={'create_user': 4, 'create_game': 256}))
+
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=web.app), base_url='http://test')
+
+
+async def new_user(api: httpx.AsyncClient, username: str) -> tuple:
+    response = await api.post('/user/create', params={'username': username})
+    assert response.status_code == 200
+    return username, response.json()['password']
+
+
+async def new_game(api: httpx.AsyncClient, owner: tuple, other: tuple) -> dict:
+    created = (await api.get('/game/create/2', auth=owner)).json()  # seats the owner
+    assert (await api.post(f"/game/{created['game_id']}/add_player", params={'username': other[0]},
+                           auth=owner)).status_code == 200
+    assert (await api.post(f"/game/{created['game_id']}/initialize", auth=owner)).status_code == 200
+    return created
+
+
+async def play(api: httpx.AsyncClient, game_id: str, first: tuple, second: tuple, boxes=(1, 4, 2, 5, 3)):
+    for turn, box in enumerate(boxes):
+        response = await api.post(f"/game/{game_id}/move", params={'move': box},
+                                  auth=first if turn % 2 == 0 else second)
+        assert response.status_code == 200
+    return response.json()
+
+
+def test_batch_route():
+    async def scenario():
+        async with client() as api:
+            alice = await new_user(api, 'batch-alice')
+            bob = await new_user(api, 'batch-bob')
+            created = await api.post('/games/batch', json={'operations': [{'action': 'create'}] * 2}, auth=alice)
+            assert created.status_code == 200 and created.json()['succeeded'] == 2
+            game_id = created.json()['results'][0]['game_id']
+            operations = [{'action': 'join', 'game_id': game_id, 'username': 'batch-bob'},
+                          {'action': 'start', 'game_id': game_id},
+                          {'action': 'move', 'game_id': game_id, 'move': 5},
+                          {'action': 'join', 'game_id': 'no-such-game', 'username': 'batch-bob'},
+                          {'action': 'create', 'num_players': 3},
+                          {'action': 'join', 'game_id': game_id}]
+            reply = (await api.post('/games/batch', json={'operations': operations}, auth=alice)).json()
+            assert reply['succeeded'] == 3 and reply['failed'] == 3
+            assert reply['results'][0]['player_idx'] == 1 and reply['results'][2]['box'] == 5
+            assert [result['status_code'] for result in reply['results'][3:]] == [404, 422, 422]
+
+            moved = (await api.post('/games/batch', json={'operations': [
+                {'action': 'move', 'game_id': game_id, 'move': 5}]}, auth=bob)).json()
+            assert moved['results'][0]['status_code'] == 400  # box 5 is taken
+            assert (await api.post('/games/batch', json={'operations': []},
+                                   auth=('batch-alice', 'wrong'))).status_code == 401
+            assert (await api.post('/games/batch', json={'operations': [{'action': 'fly'}]},
+                                   auth=alice)).status_code == 422
+            web.MAX_BATCH, max_batch = 2, web.MAX_BATCH
+            try:
+                too_big = await api.post('/games/batch', json={'operations': [{'action': 'create'}] * 3}, auth=alice)
+            finally:
+                web.MAX_BATCH = max_batch
+            assert too_big.status_code == 413
+
+    asyncio.run(scenario())
+
+
+def test_event_stream_and_hint():
+    async def scenario():
+        async with client() as api:
+            alice = await new_user(api, 'sse-alice')
+            bob = await new_user(api, 'sse-bob')
+            created = await new_game(api, alice, bob)
+            game_id = created['game_id']
+            subscriptions = web.GAME_EVENTS.active_subscriptions
+            stream = asyncio.ensure_future(api.get(f"/game/{game_id}/events"))
+            while web.GAME_EVENTS.active_subscriptions == subscriptions:
+                await asyncio.sleep(0.01)
+            assert (await api.get(f"/game/{game_id}/hint")).json()['move'] in range(1, 10)
+            assert (await play(api, game_id, alice, bob))['status'] != 'In progress'
+            assert (await api.get(f"/game/{game_id}/hint")).json()['move'] == 0  # nothing left to play
+            assert (await api.post(f"/game/{game_id}/terminate", params={'password': 'wrong'},
+                                   auth=alice)).status_code == 401
+            assert (await api.post(f"/game/{game_id}/terminate", params={'password': created['termination_password']},
+                                   auth=alice)).status_code == 200
+            response = await asyncio.wait_for(stream, 5)  # deleting the game ends the stream
+            assert response.headers['content-type'].startswith('text/event-stream')
+            events = [frame.split('\n') for frame in response.text.split('\n\n') if frame]
+            assert [lines[0] for lines in events] == ['event: snapshot'] + ['event: move'] * 5
+            assert json.loads(events[-1][1][len('data: '):])['winner'] == 'sse-alice'
+            assert (await api.get(f"/game/{game_id}/events")).status_code == 404
+
+    asyncio.run(scenario())
+
+
+def test_metrics():
+    async def scenario():
+        async with client() as api:
+            await api.get('/')
+            response = await api.get('/metrics')
+            assert response.status_code == 200 and response.headers['content-type'].startswith('text/plain')
+            assert 'http_request_seconds_count{method="GET",route="/"}' in response.text
+            assert 'admission_requests_total{result="admitted"}' in response.text
+
+    asyncio.run(scenario())
+
+
+def test_matchmaking_routes():
+    async def scenario():
+        async with client() as api:
+            ann = await new_user(api, 'match-ann')
+            bo = await new_user(api, 'match-bo')
+            for rating in ('nan', 'inf'):
+                assert (await api.post('/matchmaking/join', params={'rating': rating}, auth=ann)).status_code == 422
+            assert (await api.post('/matchmaking/join', params={'rating': 1400}, auth=ann)).json()['queued']
+            assert (await api.post('/matchmaking/join', auth=ann)).json()['queued']  # keeps its place
+            waiting = asyncio.ensure_future(api.post('/matchmaking/join', params={'wait': 5}, auth=bo))
+            while 'match-bo' not in web.MATCHMAKER:
+                await asyncio.sleep(0.01)
+            match, = await web.MATCHMAKER.match_once()
+            assert match.players == ('match-ann', 'match-bo')  # the lower rating owns the game
+            waited = (await waiting).json()
+            assert waited['matched'] and waited['player_idx'] == 1 and 'termination_password' not in waited
+            polled = (await api.post('/matchmaking/join', auth=ann)).json()
+            assert polled['game_id'] == match.game_id and polled['termination_password']
+            assert (await api.post('/matchmaking/join', auth=ann)).json() == polled
+
+            await play(api, match.game_id, ann, bo)
+            assert (await api.post('/matchmaking/join', auth=ann)).json()['queued']  # game over: a new game
+            assert (await api.post('/matchmaking/leave', auth=ann)).json()['success']
+            assert not (await api.post('/matchmaking/leave', auth=ann)).json()['success']
+            assert (await api.post('/matchmaking/join', auth=('match-ann', 'wrong'))).status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_game_listing_rejects_bad_queries():
+    async def scenario():
+        async with client() as api:
+            assert (await api.get('/games', params={'cursor': '12abc'})).status_code == 422
+            assert (await api.get('/games', params={'status': 'paused'})).status_code == 422
+            assert (await api.get('/games', params={'status': 'open'})).status_code == 200
+
+    asyncio.run(scenario())
+
+
+def test_admission_refuses_with_429(monkeypatch):
+    monkeypatch.setattr(web, 'ADMISSION', AdmissionController(user_rate=1, user_burst=1, address_rate=1,
+                                                              address_burst=4, clock=lambda: 0.0))
+
+    async def scenario():
+        async with client() as api:
+            carol = await new_user(api, 'throttled-carol')
+            response = await api.post('/matchmaking/leave', auth=('throttled-carol', 'wrong'))
+            assert response.status_code == 401  # bad passwords don't spend carol's tokens
+            assert (await api.post('/matchmaking/leave', auth=carol)).status_code == 200
+            refused = await api.post('/matchmaking/leave', auth=carol)  # over carol's rate
+            assert refused.status_code == 429 and refused.headers['Retry-After'] == '1'
+            refused = await api.get('/')  # over the address's rate
+            assert refused.status_code == 429 and refused.headers['Retry-After'] == '1'
+            assert (await api.get('/metrics')).status_code == 200  # never throttled
+            assert web.ADMISSION.throttled == {'address': 1, 'user': 1, 'global': 0, 'concurrency': 0}
+
+    asyncio.run(scenario())
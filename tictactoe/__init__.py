@@ -0,0 +1,3 @@
+from tictactoe.tictactoe import TicTacToe, TicTacToe_INSTRUCTIONS, main, \
+    STATUS_IN_PROGRESS, STATUS_WON, STATUS_DRAW
+from tictactoe.mnk import MNKGame
@@ -0,0 +1,3 @@
+from tictactoe.tictactoe import main
+
+main()
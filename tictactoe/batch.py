@@ -0,0 +1,60 @@
+"""
+Vectorized evaluation of many Tic-Tac-Toe boards at once.
+
+Boards are rows of an (N, 9) int8 array, box n in column n - 1, with
+EMPTY / X / O cell codes.  One call scores every row with NumPy instead of
+calling check_winner() once per game.
+"""
+from typing import Iterable, NamedTuple
+import numpy as np
+from tictactoe.bitboard import WIN_LINES
+from tictactoe.tictactoe import TicTacToe
+
+EMPTY = 0
+X = 1
+O = 2
+
+# (8, 3) column indices of every winning line
+_LINE_IDX = np.array(WIN_LINES, dtype=np.intp) - 1
+_BIT_SHIFTS = np.arange(9, dtype=np.int16)
+
+
+class BatchResult(NamedTuple):
+    winner: np.ndarray  # (N,) int8: EMPTY, X or O
+    draw: np.ndarray  # (N,) bool: board full and nobody won
+    legal_moves: np.ndarray  # (N, 9) bool: empty boxes of unfinished games
+
+
+def evaluate_boards(boards: np.ndarray) -> BatchResult:
+    """
+    Scores every board in one vectorized pass.
+
+    :param boards: (N, 9) array of EMPTY / X / O cell codes
+    :return: per-board winner, draw flag and legal-move mask
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    if boards.ndim != 2 or boards.shape[1] != 9:
+        raise ValueError(f"expected an (N, 9) array of boards, got shape {boards.shape}")
+    lines = boards[:, _LINE_IDX]  # (N, 8, 3)
+    x_wins = (lines == X).all(axis=2).any(axis=1)
+    o_wins = (lines == O).all(axis=2).any(axis=1)
+    winner = np.where(x_wins, X, np.where(o_wins, O, EMPTY)).astype(np.int8)
+    empty = boards == EMPTY
+    finished = winner != EMPTY
+    draw = ~finished & ~empty.any(axis=1)
+    legal_moves = empty & ~finished[:, None]
+    return BatchResult(winner, draw, legal_moves)
+
+
+def pack_games(games: Iterable[TicTacToe]) -> np.ndarray:
+    """
+    Packs live games into an (N, 9) board array straight from their bitboards,
+    e.g. ``pack_games(game for _, game in db.iter_games())``.
+
+    :param games: iterable of TicTacToe objects
+    :return: (N, 9) int8 array of EMPTY / X / O cell codes
+    """
+    bits = np.array([game._BOARD for game in games], dtype=np.int16).reshape(-1, 2)
+    x_cells = (bits[:, 0:1] >> _BIT_SHIFTS) & 1
+    o_cells = (bits[:, 1:2] >> _BIT_SHIFTS) & 1
+    return (x_cells * X + o_cells * O).astype(np.int8)
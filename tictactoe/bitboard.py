@@ -0,0 +1,66 @@
+"""
+Bitboard helpers for the Tic-Tac-Toe engine.
+
+A board is held as two 9-bit integers, one per sign.  Box ``n`` (1-9, the
+numbering the players type in) maps to bit ``n - 1``.  Win and draw checks
+are a handful of mask tests against the constants below instead of list scans.
+"""
+from typing import List
+
+SIGNS = ('X', 'O')
+SIGN_INDEX = {'X': 0, 'O': 1}
+
+FULL_BOARD = 0x1FF  # all nine boxes taken
+
+# box numbers for every winning line, kept for readability and for tests
+WIN_LINES = ((1, 2, 3), (4, 5, 6), (7, 8, 9),
+             (1, 4, 7), (2, 5, 8), (3, 6, 9),
+             (1, 5, 9), (3, 5, 7))
+WIN_MASKS = tuple(sum(1 << (box - 1) for box in line) for line in WIN_LINES)
+
+# WINNING_BOARDS[bits] is True when the 9-bit position contains a full line,
+# so a win check is a single index instead of eight mask tests.
+WINNING_BOARDS = bytes(any(bits & mask == mask for mask in WIN_MASKS)
+                       for bits in range(FULL_BOARD + 1))
+
+
+def move_bit(move: int) -> int:
+    """
+    :param move: box number 1-9
+    :return: the bit for that box
+    """
+    return 1 << (move - 1)
+
+
+def is_win(bits: int) -> bool:
+    """
+    :param bits: 9-bit position of one sign
+    :return: True if the position holds three in a row
+    """
+    return WINNING_BOARDS[bits] == 1
+
+
+def is_full(x_bits: int, o_bits: int) -> bool:
+    """
+    :return: True if every box is taken
+    """
+    return (x_bits | o_bits) == FULL_BOARD
+
+
+def bits_to_moves(bits: int) -> List[int]:
+    """
+    :param bits: 9-bit position of one sign
+    :return: the box numbers (1-9) set in the position, ascending
+    """
+    return [box for box in range(1, 10) if bits & (1 << (box - 1))]
+
+
+def moves_to_bits(moves) -> int:
+    """
+    :param moves: iterable of box numbers (1-9)
+    :return: the 9-bit position holding those boxes
+    """
+    bits = 0
+    for move in moves:
+        bits |= 1 << (move - 1)
+    return bits
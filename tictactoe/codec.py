@@ -0,0 +1,145 @@
+"""
+Fixed-layout binary encoding of a TicTacToe game.
+
+Version 1 layout (little endian)::
+
+    offset  size  field
+    0       1     magic b'T'
+    1       1     version (1)
+    2       1     flags: bits 0-1 status, 2-3 current sign, 4-5 player 1 sign,
+                  6-7 current player (0 none, 1 player 1, 2 player 2)
+    3       3     board: X bits 0-8, O bits 9-17
+    6       1     number of moves n
+    7       n     move history, one byte per move (sign index << 4 | box)
+    7+n     1+a   player 1 name, length-prefixed UTF-8
+    8+n+a   1+b   player 2 name, length-prefixed UTF-8
+
+Signs are coded 0 none, 1 X, 2 O and status 0 in progress, 1 won, 2 draw.  A
+game in progress encodes to 9 bytes plus its moves and player names.
+decode_into() reads straight from any buffer (bytes, bytearray, mmap) through
+a memoryview, without slicing out intermediate bytes objects.
+"""
+from typing import Tuple
+import struct
+from tictactoe.bitboard import is_win, is_full
+
+MAGIC = b'T'
+VERSION = 1
+
+_HEADER = struct.Struct('<cBBHBB')  # magic, version, flags, board bits 0-15, board bits 16-17, moves
+_SIGN_CODES = {'': 0, 'X': 1, 'O': 2}
+_CODE_SIGNS = ('', 'X', 'O')
+_STATUSES = ('in_progress', 'won', 'draw')
+
+
+def _status_code(x_bits: int, o_bits: int) -> int:
+    if is_win(x_bits) or is_win(o_bits):
+        return 1
+    if is_full(x_bits, o_bits):
+        return 2
+    return 0
+
+
+def _name_bytes(name: str) -> bytes:
+    encoded = name.encode('utf-8')
+    if len(encoded) > 255:
+        raise ValueError(f"player name {name!r} is longer than 255 bytes")
+    return encoded
+
+
+def encode(game) -> bytes:
+    """
+    :param game: the TicTacToe to encode
+    :return: the game in the version 1 layout
+    :raises: ValueError if the game cannot be represented (names over 255 bytes,
+        signs assigned to someone other than the two players)
+    """
+    x_bits, o_bits = game._BOARD
+    player1, player2 = game._PLAYER1, game._PLAYER2
+    choice = game._PLAYER_CHOICE
+    if choice.get('X') == player1 and choice.get('O') == player2 and (player1 or player2):
+        player1_sign = 1
+    elif choice.get('O') == player1 and choice.get('X') == player2 and (player1 or player2):
+        player1_sign = 2
+    elif not choice.get('X') and not choice.get('O'):
+        player1_sign = 0
+    else:
+        raise ValueError("signs must be assigned to player 1 and player 2")
+    if not game._CUR_PLAYER_NAME:
+        current_player = 0
+    elif game._CUR_PLAYER_NAME == player1:
+        current_player = 1
+    elif game._CUR_PLAYER_NAME == player2:
+        current_player = 2
+    else:
+        raise ValueError("the current player must be player 1 or player 2")
+    flags = (_status_code(x_bits, o_bits)
+             | _SIGN_CODES[game._CUR_SIGN] << 2
+             | player1_sign << 4
+             | current_player << 6)
+    board = x_bits | o_bits << 9
+    name1, name2 = _name_bytes(player1), _name_bytes(player2)
+    return b''.join((_HEADER.pack(MAGIC, VERSION, flags, board & 0xFFFF, board >> 16, len(game._HISTORY)),
+                     game._HISTORY,
+                     bytes((len(name1),)), name1,
+                     bytes((len(name2),)), name2))
+
+
+def _header(view: memoryview, offset: int) -> Tuple[int, int, int]:
+    magic, version, flags, board_low, board_high, num_moves = _HEADER.unpack_from(view, offset)
+    if magic != MAGIC:
+        raise ValueError("not an encoded TicTacToe game")
+    if version != VERSION:
+        raise ValueError(f"unsupported game encoding version {version}")
+    return flags, board_low | board_high << 16, num_moves
+
+
+def record_size(buffer, offset: int = 0) -> int:
+    """
+    :return: length in bytes of the encoded game starting at ``offset``
+    """
+    view = memoryview(buffer)
+    _, _, num_moves = _header(view, offset)
+    pos = offset + _HEADER.size + num_moves
+    pos += 1 + view[pos]
+    pos += 1 + view[pos]
+    return pos - offset
+
+
+def peek_status(buffer, offset: int = 0) -> str:
+    """
+    :return: 'in_progress', 'won' or 'draw' of an encoded game, without decoding the rest
+    """
+    flags, _, _ = _header(memoryview(buffer), offset)
+    return _STATUSES[flags & 0x03]
+
+
+def decode_into(game, buffer, offset: int = 0):
+    """
+    Loads an encoded game into a fresh TicTacToe.
+
+    :param game: the TicTacToe to fill in
+    :param buffer: any object supporting the buffer protocol
+    :param offset: where the encoded game starts in ``buffer``
+    :return: ``game``
+    """
+    view = memoryview(buffer)
+    flags, board, num_moves = _header(view, offset)
+    pos = offset + _HEADER.size
+    game._BOARD = [board & 0x1FF, board >> 9]
+    game._HISTORY = bytearray(view[pos:pos + num_moves])
+    pos += num_moves
+    length = view[pos]
+    player1 = str(view[pos + 1:pos + 1 + length], 'utf-8')
+    pos += 1 + length
+    length = view[pos]
+    player2 = str(view[pos + 1:pos + 1 + length], 'utf-8')
+    game._PLAYER1, game._PLAYER2 = player1, player2
+    player1_sign = _CODE_SIGNS[flags >> 4 & 0x03]
+    if player1_sign:
+        game._PLAYER_CHOICE = {player1_sign: player1, 'O' if player1_sign == 'X' else 'X': player2}
+    else:
+        game._PLAYER_CHOICE = {'X': '', 'O': ''}
+    game._CUR_SIGN = _CODE_SIGNS[flags >> 2 & 0x03]
+    game._CUR_PLAYER_NAME = ('', player1, player2)[flags >> 6 & 0x03]
+    return game
@@ -0,0 +1,209 @@
+"""
+Generalized m,n,k game: an m-row by n-column board, k in a row to win, and
+any number of players taking turns (Tic-Tac-Toe is 3,3,3 with two players,
+Gomoku is 15,15,5).
+
+Cells are one byte each in a row-major bytearray (0 empty, player index + 1).
+A move can only complete lines through the cell just played, so the win check
+walks out from that cell along the four directions and stops after k cells:
+O(k) per move whatever the board size.  scan_winner() is the full-board
+rescan, kept for tests and for the benchmark that compares the two.
+
+Boxes are numbered 1 to m*n row by row, like the 1-9 boxes of TicTacToe, and
+the methods mirror TicTacToe's (apply_move, status, winner, to_dict,
+move_delta), so the same front ends can drive either engine.
+"""
+from typing import List, Optional, Sequence
+from tictactoe.tictactoe import STATUS_IN_PROGRESS, STATUS_WON, STATUS_DRAW
+
+# sign of each player, by turn order
+SIGNS = 'XOYZWVUTSR'
+_EMPTY = '.'
+_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))  # row, column steps
+
+
+class MNKGame(object):
+    __slots__ = ('rows', 'cols', 'k', 'num_players', '_cells', '_history', '_players', '_turn', '_winner')
+
+    def __init__(self, rows: int = 3, cols: int = 3, k: int = 3, num_players: int = 2):
+        """
+        :param rows: board height m
+        :param cols: board width n
+        :param k: stones in a row needed to win
+        :param num_players: players taking turns, 2 to 10
+        :raises: ValueError if k does not fit on the board or the player count is out of range
+        """
+        if rows < 1 or cols < 1 or not 1 <= k <= max(rows, cols):
+            raise ValueError(f"{k} in a row does not fit on a {rows}x{cols} board")
+        if not 2 <= num_players <= len(SIGNS):
+            raise ValueError(f"num_players must be between 2 and {len(SIGNS)}")
+        if rows * cols > 0xFFFF:
+            raise ValueError("boards are limited to 65535 cells")
+        self.rows = rows
+        self.cols = cols
+        self.k = k
+        self.num_players = num_players
+        self._cells = bytearray(rows * cols)
+        self._history: List[int] = []  # cell indexes in play order
+        self._players: List[str] = [''] * num_players
+        self._turn = 0  # index of the player to move
+        self._winner: Optional[int] = None  # index of the winning player
+
+    def set_players(self, *names: str):
+        """
+        Names the players in turn order; the first one moves first.
+        """
+        if len(names) != self.num_players:
+            raise ValueError(f"expected {self.num_players} player names, got {len(names)}")
+        self._players = list(names)
+        self._turn = len(self._history) % self.num_players
+
+    def box(self, row: int, col: int) -> int:
+        """
+        :param row: 0-based row
+        :param col: 0-based column
+        :return: the box number (1 to m*n) of that cell
+        """
+        return row * self.cols + col + 1
+
+    @property
+    def current_player(self) -> str:
+        return self._players[self._turn]
+
+    @property
+    def current_sign(self) -> str:
+        return SIGNS[self._turn]
+
+    def legal_moves(self) -> List[int]:
+        """
+        :return: free box numbers, ascending; empty once the game is over
+        """
+        if self._winner is not None:
+            return []
+        return [idx + 1 for idx, cell in enumerate(self._cells) if not cell]
+
+    def apply_move(self, move: int) -> str:
+        """
+        Plays ``move`` for the current player and passes the turn if the game goes on.
+
+        :raises: ValueError if the game is over or the box is not free
+        :param move: box number 1 to m*n
+        :return: the game status after the move
+        """
+        if self.status() != STATUS_IN_PROGRESS:
+            raise ValueError("game is already over")
+        idx = move - 1
+        if not 0 <= idx < len(self._cells) or self._cells[idx]:
+            raise ValueError(f"box {move} is not available")
+        self._cells[idx] = self._turn + 1
+        self._history.append(idx)
+        if self._completes_line(idx):
+            self._winner = self._turn
+        elif len(self._history) < len(self._cells):
+            self._turn = (self._turn + 1) % self.num_players
+        return self.status()
+
+    def _completes_line(self, idx: int) -> bool:
+        """
+        :return: True if the stone on cell ``idx`` is part of k in a row
+        """
+        cells, rows, cols, k = self._cells, self.rows, self.cols, self.k
+        code = cells[idx]
+        row, col = divmod(idx, cols)
+        for d_row, d_col in _DIRECTIONS:
+            run = 1
+            for step_row, step_col in ((d_row, d_col), (-d_row, -d_col)):
+                r, c = row + step_row, col + step_col
+                while run < k and 0 <= r < rows and 0 <= c < cols and cells[r * cols + c] == code:
+                    run += 1
+                    r += step_row
+                    c += step_col
+            if run >= k:
+                return True
+        return False
+
+    def scan_winner(self) -> Optional[int]:
+        """
+        Full-board rescan for k in a row, the O(m*n*k) check that
+        apply_move() avoids.
+
+        :return: index of a player holding k in a row, None if nobody does
+        """
+        cells, rows, cols, k = self._cells, self.rows, self.cols, self.k
+        for idx, code in enumerate(cells):
+            if not code:
+                continue
+            row, col = divmod(idx, cols)
+            for d_row, d_col in _DIRECTIONS:
+                end_row, end_col = row + d_row * (k - 1), col + d_col * (k - 1)
+                if not (0 <= end_row < rows and 0 <= end_col < cols):
+                    continue
+                if all(cells[(row + d_row * step) * cols + col + d_col * step] == code for step in range(1, k)):
+                    return code - 1
+        return None
+
+    def status(self) -> str:
+        """
+        :return: STATUS_WON, STATUS_DRAW or STATUS_IN_PROGRESS
+        """
+        if self._winner is not None:
+            return STATUS_WON
+        if len(self._history) == len(self._cells):
+            return STATUS_DRAW
+        return STATUS_IN_PROGRESS
+
+    def winner(self) -> Optional[str]:
+        """
+        :return: name of the winning player, None if nobody has won
+        """
+        return self._players[self._winner] if self._winner is not None else None
+
+    def board_rows(self) -> List[str]:
+        """
+        :return: one string per row, a sign per cell and '.' for empty cells
+        """
+        signs = _EMPTY + SIGNS
+        return [''.join(signs[code] for code in self._cells[row * self.cols:(row + 1) * self.cols])
+                for row in range(self.rows)]
+
+    def to_dict(self) -> dict:
+        """
+        :return: JSON-friendly snapshot of the game
+        """
+        return {'rows': self.rows,
+                'cols': self.cols,
+                'k': self.k,
+                'board': self.board_rows(),
+                'moves': [[SIGNS[seq % self.num_players], idx + 1] for seq, idx in enumerate(self._history)],
+                'players': list(self._players),
+                'current_player': self.current_player,
+                'current_sign': self.current_sign,
+                'status': self.status(),
+                'winner': self.winner()}
+
+    def move_delta(self) -> dict:
+        """
+        :return: compact update for the latest move; 'seq' is the number of moves played
+        """
+        return {'seq': len(self._history),
+                'sign': SIGNS[(len(self._history) - 1) % self.num_players],
+                'box': self._history[-1] + 1,
+                'next': self.current_player,
+                'status': self.status(),
+                'winner': self.winner()}
+
+    @classmethod
+    def from_moves(cls, rows: int, cols: int, k: int, players: Sequence[str], moves: Sequence[int]) -> 'MNKGame':
+        """
+        Rebuilds a game by replaying its moves, e.g. from a to_dict() snapshot.
+        """
+        game = cls(rows, cols, k, len(players))
+        game.set_players(*players)
+        for move in moves:
+            game.apply_move(move)
+        return game
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'MNKGame':
+        return cls.from_moves(state['rows'], state['cols'], state['k'], state['players'],
+                              [move for _, move in state['moves']])
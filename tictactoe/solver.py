@@ -0,0 +1,182 @@
+"""
+Perfect-play solver for Tic-Tac-Toe.
+
+Every reachable position is solved once with negamax and stored in a
+transposition table indexed by the position's base-3 code (0 empty,
+1 side to move, 2 opponent).  Positions are collapsed under the 8
+rotations/reflections of the board, so only the canonical (smallest code)
+orientation of each position is stored.  A best-move query is then a
+canonicalization plus one table lookup.
+
+The table is built lazily on first use (a few hundred milliseconds) or
+loaded from a file written by Solver.save().
+"""
+import os
+from typing import List, Optional, Tuple
+from tictactoe.bitboard import FULL_BOARD, SIGN_INDEX, is_win
+
+TABLE_SIZE = 3 ** 9
+_MAGIC = b'TTTS\x01'
+_NO_SCORE = 0
+_SCORE_OFFSET = 64  # stored byte = score + offset, so 0 means "not solved"
+
+
+def _symmetries() -> List[Tuple[int, ...]]:
+    """
+    :return: the 8 cell permutations p of the board, where the transformed
+        board holds old cell p[i] in cell i
+    """
+    identity = tuple(range(9))
+    rotate = tuple(3 * (2 - (i % 3)) + i // 3 for i in range(9))
+    mirror = tuple(3 * (i // 3) + 2 - (i % 3) for i in range(9))
+    perms = []
+    perm = identity
+    for _ in range(4):
+        perms.append(perm)
+        perms.append(tuple(perm[mirror[i]] for i in range(9)))
+        perm = tuple(perm[rotate[i]] for i in range(9))
+    return perms
+
+
+SYMMETRIES = _symmetries()
+
+# _CODE_PARTS[s][bits] is the base-3 code contribution of the 9-bit position
+# ``bits`` under symmetry s, so a code costs two lookups per symmetry.
+_CODE_PARTS = []
+for _perm in SYMMETRIES:
+    _inverse = [0] * 9
+    for _i, _j in enumerate(_perm):
+        _inverse[_j] = _i
+    _CODE_PARTS.append([sum(3 ** _inverse[j] for j in range(9) if bits >> j & 1)
+                        for bits in range(FULL_BOARD + 1)])
+
+
+def canonical(me: int, opp: int) -> Tuple[int, int]:
+    """
+    :param me: bits of the side to move
+    :param opp: bits of the opponent
+    :return: (canonical base-3 code, index of the symmetry that produced it)
+    """
+    best_code, best_sym = TABLE_SIZE, 0
+    for sym, parts in enumerate(_CODE_PARTS):
+        code = parts[me] + 2 * parts[opp]
+        if code < best_code:
+            best_code, best_sym = code, sym
+    return best_code, best_sym
+
+
+class Solver(object):
+    def __init__(self, scores: Optional[bytearray] = None, moves: Optional[bytearray] = None):
+        """
+        :param scores: prebuilt score table, built on demand if None
+        :param moves: prebuilt best-move table, built on demand if None
+        """
+        self._scores = scores if scores is not None else bytearray(TABLE_SIZE)
+        self._moves = moves if moves is not None else bytearray(TABLE_SIZE)
+        if scores is None:
+            self._solve(0, 0)
+
+    def _solve(self, me: int, opp: int) -> int:
+        """
+        Negamax over the whole game tree below (me, opp), filling the tables.
+        Scores favour quicker wins and slower losses.
+
+        :return: score for the side to move
+        """
+        code, sym = canonical(me, opp)
+        stored = self._scores[code]
+        if stored != _NO_SCORE:
+            return stored - _SCORE_OFFSET
+        taken = me | opp
+        empty = 9 - bin(taken).count('1')
+        best_move = 0
+        if is_win(opp):
+            best = -(empty + 1)
+        elif taken == FULL_BOARD:
+            best = 0
+        else:
+            best = -TABLE_SIZE
+            perm = SYMMETRIES[sym]
+            for cell in range(9):
+                bit = 1 << perm[cell]
+                if taken & bit:
+                    continue
+                score = -self._solve(opp, me | bit)
+                if score > best:
+                    best, best_move = score, cell + 1
+        self._scores[code] = best + _SCORE_OFFSET
+        self._moves[code] = best_move
+        return best
+
+    def value(self, me: int, opp: int) -> int:
+        """
+        :param me: bits of the side to move
+        :param opp: bits of the opponent
+        :return: 1 if the side to move wins with perfect play, 0 draw, -1 loss
+        """
+        code, _ = canonical(me, opp)
+        stored = self._scores[code]
+        if stored == _NO_SCORE:
+            raise ValueError("position is not reachable in a legal game")
+        score = stored - _SCORE_OFFSET
+        return (score > 0) - (score < 0)
+
+    def best_move(self, me: int, opp: int) -> int:
+        """
+        :param me: bits of the side to move
+        :param opp: bits of the opponent
+        :return: best box (1-9) for the side to move, 0 if the game is over
+        """
+        code, sym = canonical(me, opp)
+        if self._scores[code] == _NO_SCORE:
+            raise ValueError("position is not reachable in a legal game")
+        move = self._moves[code]
+        if move == 0:
+            return 0
+        return SYMMETRIES[sym][move - 1] + 1
+
+    def save(self, path: str):
+        with open(path, 'wb') as table_file:
+            table_file.write(_MAGIC)
+            table_file.write(self._scores)
+            table_file.write(self._moves)
+
+    @classmethod
+    def load(cls, path: str) -> 'Solver':
+        with open(path, 'rb') as table_file:
+            data = table_file.read()
+        if not data.startswith(_MAGIC) or len(data) != len(_MAGIC) + 2 * TABLE_SIZE:
+            raise ValueError(f"{path} is not a solver table")
+        start = len(_MAGIC)
+        return cls(bytearray(data[start:start + TABLE_SIZE]),
+                   bytearray(data[start + TABLE_SIZE:]))
+
+
+_DEFAULT_SOLVER: Optional[Solver] = None
+
+
+def get_solver(path: Optional[str] = None) -> Solver:
+    """
+    Returns the process-wide solver, loading it from ``path`` if that file
+    exists, otherwise building it on first use.
+    """
+    global _DEFAULT_SOLVER
+    if _DEFAULT_SOLVER is None:
+        if path is not None and os.path.exists(path):
+            _DEFAULT_SOLVER = Solver.load(path)
+        else:
+            _DEFAULT_SOLVER = Solver()
+    return _DEFAULT_SOLVER
+
+
+def best_move(game) -> int:
+    """
+    :param game: a TicTacToe game
+    :return: best box (1-9) for the player whose turn it is, 0 if the game is over
+    """
+    sign = game._CUR_SIGN or 'X'
+    me = game._BOARD[SIGN_INDEX[sign]]
+    opp = game._BOARD[1 - SIGN_INDEX[sign]]
+    if is_win(me) or is_win(opp) or me | opp == FULL_BOARD:
+        return 0
+    return get_solver().best_move(me, opp)
@@ -0,0 +1,36 @@
+import unittest
+from unittest import TestCase
+import numpy as np
+from tictactoe import TicTacToe
+from tictactoe.batch import evaluate_boards, pack_games, EMPTY, X, O
+
+
+class TestBatch(TestCase):
+    def test__evaluate_boards(self):
+        boards = np.array([[X, X, X, O, O, EMPTY, EMPTY, EMPTY, EMPTY],
+                           [X, O, X, X, O, O, O, X, X],
+                           [O, X, X, EMPTY, O, EMPTY, X, EMPTY, O],
+                           [EMPTY] * 9], dtype=np.int8)
+        result = evaluate_boards(boards)
+        self.assertEqual(result.winner.tolist(), [X, EMPTY, O, EMPTY])
+        self.assertEqual(result.draw.tolist(), [False, True, False, False])
+        self.assertFalse(result.legal_moves[0].any())
+        self.assertTrue(result.legal_moves[3].all())
+
+    def test__evaluate_boards_shape(self):
+        with self.assertRaises(ValueError):
+            evaluate_boards(np.zeros((2, 8), dtype=np.int8))
+
+    def test__pack_games(self):
+        game = TicTacToe()
+        for box, sign in ((1, 'X'), (9, 'O'), (5, 'X')):
+            game._place(box, sign)
+        packed = pack_games([game, TicTacToe()])
+        self.assertEqual(packed.shape, (2, 9))
+        self.assertEqual(packed[0].tolist(), [X, 0, 0, 0, X, 0, 0, 0, O])
+        self.assertEqual(packed[1].tolist(), [EMPTY] * 9)
+        self.assertEqual(pack_games([]).shape, (0, 9))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from unittest import TestCase
+from tictactoe import TicTacToe
+from tictactoe.codec import record_size, peek_status
+
+
+class TestCodec(TestCase):
+    def test__round_trip(self):
+        game = TicTacToe()
+        self.assertEqual(len(game.to_bytes()), 9)
+        self.assertEqual(TicTacToe.from_buffer(game.to_bytes()).to_dict(), game.to_dict())
+        game.set_players('alice', 'bøb', 'O')
+        for move in (5, 1, 9, 3, 2):
+            game.apply_move(move)
+        data = game.to_bytes()
+        self.assertEqual(len(data), 9 + 5 + len('alice') + len('bøb'.encode('utf-8')))
+        self.assertEqual(TicTacToe.from_buffer(data).to_dict(), game.to_dict())
+        self.assertEqual(peek_status(data), 'in_progress')
+
+    def test__buffer_offsets(self):
+        won = TicTacToe()
+        won.set_players('alice', 'bob')
+        for move in (1, 4, 2, 5, 3):
+            won.apply_move(move)
+        fresh = TicTacToe()
+        fresh.set_players('carol', 'dave')
+        buffer = bytearray(won.to_bytes() + fresh.to_bytes())
+        size = record_size(buffer)
+        self.assertEqual(size, len(won.to_bytes()))
+        self.assertEqual(peek_status(buffer), 'won')
+        self.assertEqual(TicTacToe.from_buffer(memoryview(buffer), size).to_dict(), fresh.to_dict())
+        self.assertEqual(record_size(buffer, size), len(buffer) - size)
+
+    def test__invalid(self):
+        with self.assertRaises(ValueError):
+            TicTacToe.from_buffer(b'{"board": ""}')
+        with self.assertRaises(ValueError):
+            TicTacToe.from_buffer(b'T\x02' + bytes(7))
+        game = TicTacToe()
+        game.set_players('a' * 256, 'bob')
+        with self.assertRaises(ValueError):
+            game.to_bytes()
+
+
+if __name__ == '__main__':
+    unittest.main()
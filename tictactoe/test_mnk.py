@@ -0,0 +1,57 @@
+import random
+import unittest
+from unittest import TestCase
+from tictactoe import TicTacToe
+from tictactoe.mnk import MNKGame
+
+
+class TestMNKGame(TestCase):
+    def test__matches_tictactoe(self):
+        for moves in ([1, 4, 2, 5, 3], [5, 1, 9, 3, 2, 8, 7, 4, 6], [5, 1, 9]):
+            classic, general = TicTacToe(), MNKGame()
+            classic.set_players('alice', 'bob')
+            general.set_players('alice', 'bob')
+            for move in moves:
+                self.assertEqual(general.apply_move(move), classic.apply_move(move))
+            self.assertEqual(general.winner(), classic.winner())
+            self.assertEqual(general.current_player, classic._CUR_PLAYER_NAME)
+
+    def test__gomoku_three_players(self):
+        game = MNKGame(15, 15, 5, num_players=3)
+        game.set_players('alice', 'bob', 'carol')
+        # alice builds a diagonal from (2, 2); bob and carol play along the top edge
+        for step in range(4):
+            game.apply_move(game.box(2 + step, 2 + step))
+            game.apply_move(game.box(0, step))
+            game.apply_move(game.box(0, 14 - step))
+        self.assertEqual(game.status(), 'in_progress')
+        self.assertEqual(game.current_sign, 'X')
+        self.assertEqual(game.apply_move(game.box(6, 6)), 'won')
+        self.assertEqual(game.winner(), 'alice')
+        self.assertEqual(game.move_delta()['seq'], 13)
+        with self.assertRaises(ValueError):
+            game.apply_move(game.box(10, 10))
+        restored = MNKGame.from_dict(game.to_dict())
+        self.assertEqual(restored.to_dict(), game.to_dict())
+
+    def test__incremental_agrees_with_rescan(self):
+        rng = random.Random(7)
+        for rows, cols, k in ((3, 3, 3), (6, 7, 4), (9, 9, 5), (4, 10, 4)):
+            for _ in range(50):
+                game = MNKGame(rows, cols, k, num_players=rng.choice((2, 3)))
+                while game.legal_moves():
+                    game.apply_move(rng.choice(game.legal_moves()))
+                    expected = game.scan_winner()
+                    self.assertEqual(game._winner, expected)
+
+    def test__rejects_bad_shapes(self):
+        with self.assertRaises(ValueError):
+            MNKGame(3, 3, 4)
+        with self.assertRaises(ValueError):
+            MNKGame(num_players=1)
+        with self.assertRaises(ValueError):
+            MNKGame().set_players('alice')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+from tictactoe import TicTacToe
+from tictactoe.solver import Solver, get_solver
+
+
+class TestSolver(TestCase):
+    def setUp(self) -> None:
+        self.solver = get_solver()
+
+    def test__empty_board_is_draw(self):
+        self.assertEqual(self.solver.value(0, 0), 0)
+
+    def test__takes_win(self):
+        # side to move holds 1, 2; opponent holds 4, 5
+        self.assertEqual(self.solver.best_move(0b000000011, 0b000011000), 3)
+        self.assertEqual(self.solver.value(0b000000011, 0b000011000), 1)
+
+    def test__blocks_loss(self):
+        # opponent holds 1, 2; side to move holds 5
+        self.assertEqual(self.solver.best_move(0b000010000, 0b000000011), 3)
+
+    def test__game_hint(self):
+        game = TicTacToe()
+        game._CUR_SIGN = 'O'
+        for box, sign in ((7, 'X'), (5, 'O'), (9, 'X')):
+            game._place(box, sign)
+        self.assertEqual(game.hint(), 8)
+
+    def test__finished_game_hint(self):
+        won = TicTacToe()
+        won.set_players('alice', 'bob')
+        for box in (1, 4, 2, 5, 3):  # X takes the top row
+            won.apply_move(box)
+        self.assertEqual(won.hint(), 0)
+        drawn = TicTacToe()
+        drawn.set_players('alice', 'bob')
+        for box in (5, 1, 9, 3, 2, 8, 7, 4, 6):
+            drawn.apply_move(box)
+        self.assertEqual(drawn.hint(), 0)
+
+    def test__save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'solver.bin')
+            self.solver.save(path)
+            loaded = Solver.load(path)
+        self.assertEqual(loaded.best_move(0b000000011, 0b000011000), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from unittest import TestCase, mock
-from tictactoe import TicTacToe
+from tictactoe import TicTacToe, STATUS_IN_PROGRESS, STATUS_WON
 
 USER1 = 'user1'
 USER2 = 'user2'
@@ -10,10 +10,9 @@ class TestTicTacToe(TestCase):
     def setUp(self) -> None:
         self.tictactoe = TicTacToe()
 
-    @mock.patch('tictactoe.input', side_effect=[USER1, USER2])
+    @mock.patch('builtins.input', side_effect=[USER1, USER2])
     def test__initial_setup(self, mock_inputs):
-        self.tictactoe.initial_setup()
-        self.assertEqual(self.tictactoe.initial_setup(), [USER1, USER2])
+        self.assertEqual(self.tictactoe.initial_setup(), (USER1, USER1, USER2))
 
     def test__current_sign(self):
         self.tictactoe._PLAYER_CHOICE = {'X': "user1", 'O': "user2"}
@@ -22,10 +21,9 @@ class TestTicTacToe(TestCase):
         self.tictactoe._CUR_PLAYER_NAME = 'user2'
         self.assertEqual(self.tictactoe.current_sign(), 'O')
 
-    def test__player_move_req(self, cur_sign='X', move: int = None):
-        if move is None:
-            move = 5
-            self.assertEqual(self.tictactoe.player_move_req(), move)
+    @mock.patch('builtins.input', return_value='5')
+    def test__player_move_req(self, mock_input):
+        self.assertEqual(self.tictactoe.player_move_req(), 5)
 
     def test__player_move_check(self):
         move = 3
@@ -44,28 +42,65 @@ class TestTicTacToe(TestCase):
                                                              {'X': [5], 'O': []}))
 
     def test__switch_player(self):
-        player1 = USER1
-        player2 = USER2
-        self.tictactoe._PLAYER_CHOICE = {'X': "user1", 'O': "user2"}
-        self.tictactoe._CUR_PLAYER_NAME = player1
-        self.assertEqual(self.tictactoe.switch_turn(), ('O', 'user2'))
+        self.tictactoe.set_players(USER1, USER2)
+        self.assertEqual(self.tictactoe.switch_turn(), (USER2, 'O'))
+        self.assertEqual(self.tictactoe.switch_turn(), (USER1, 'X'))
 
     def test__check_draw(self):
-        self.tictactoe._PLAYER_POS['X'] = [2, 3, 4, 5, 9]
-        self.tictactoe._PLAYER_POS['O'] = [1, 6, 7, 8]
+        for box, sign in zip([2, 1, 3, 6, 4, 7, 5, 8, 9], 'XOXOXOXOX'):
+            self.tictactoe._place(box, sign)
         self.assertEqual(self.tictactoe.check_draw(), True)
-        self.tictactoe._PLAYER_POS['X'] = [2, 3, 4, 5]
-        self.tictactoe._PLAYER_POS['O'] = [1, 6, 7, 8]
+        self.tictactoe._place(9, ' ')
         self.assertEqual(self.tictactoe.check_draw(), False)
 
     def test__check_win(self):
-        self.tictactoe._PLAYER_POS['X'] = [3, 1, 2]
-        self.tictactoe._PLAYER_POS['O'] = [4, 5]
+        self.tictactoe.set_players(USER1, USER2)  # check_winner() looks at X, the sign to move
+        for box, sign in zip([3, 4, 1, 5, 2], 'XOXOX'):
+            self.tictactoe._place(box, sign)
         self.assertEqual(self.tictactoe.check_winner(), True)
-        self.tictactoe._PLAYER_POS['X'] = [3, 1, 9]
-        self.tictactoe._PLAYER_POS['O'] = [4, 5]
+        self.tictactoe._place(2, ' ')
+        self.tictactoe._place(9, 'X')
         self.assertEqual(self.tictactoe.check_winner(), False)
 
+    def test__positions_are_read_only(self):
+        self.tictactoe.set_players(USER1, USER2)
+        self.tictactoe.apply_move(5)
+        self.assertEqual(self.tictactoe._PLAYER_POS['X'], (5,))
+        with self.assertRaises(AttributeError):
+            self.tictactoe._PLAYER_POS['O'].append(1)
+        with self.assertRaises(TypeError):
+            self.tictactoe._PLAYER_POS['O'] = [1]
+
+    def test__apply_move(self):
+        self.tictactoe.set_players(USER1, USER2)
+        self.assertEqual(self.tictactoe.apply_move(1), STATUS_IN_PROGRESS)
+        self.assertEqual(self.tictactoe._CUR_PLAYER_NAME, USER2)
+        with self.assertRaises(ValueError):
+            self.tictactoe.apply_move(1)
+        for move in [4, 2, 5]:
+            self.tictactoe.apply_move(move)
+        self.assertEqual(self.tictactoe.apply_move(3), STATUS_WON)
+        self.assertEqual(self.tictactoe.winner(), USER1)
+        with self.assertRaises(ValueError):
+            self.tictactoe.apply_move(9)
+
+    def test__to_dict(self):
+        self.tictactoe.set_players(USER1, USER2, 'O')
+        for move in [5, 1, 9]:
+            self.tictactoe.apply_move(move)
+        state = self.tictactoe.to_dict()
+        self.assertEqual(state['board'], 'X   O   O')
+        self.assertEqual(state['current_player'], USER2)
+        restored = TicTacToe.from_dict(state)
+        self.assertEqual(restored.to_dict(), state)
+
+    def test__slots(self):
+        self.assertFalse(hasattr(self.tictactoe, '__dict__'))
+        self.tictactoe._PLAYER_CHOICE = {'X': USER2, 'O': USER1}
+        self.assertEqual(self.tictactoe._PLAYER_CHOICE, {'X': USER2, 'O': USER1})
+        self.tictactoe._CUR_PLAYER_NAME = USER1
+        self.assertEqual(self.tictactoe.current_sign(), 'O')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,9 @@
 import logging
-from typing import List, Union, Tuple
+from typing import Union, Tuple
+from collections.abc import Mapping
 import random
-from dataclasses import dataclass
-import numpy as np
+from tictactoe.bitboard import SIGNS, SIGN_INDEX, move_bit, is_win, is_full
+from tictactoe import solver, codec
 
 TicTacToe_INSTRUCTIONS = {
     'English': {
@@ -11,24 +12,115 @@ TicTacToe_INSTRUCTIONS = {
     }
 }
 
+STATUS_IN_PROGRESS = 'in_progress'
+STATUS_WON = 'won'
+STATUS_DRAW = 'draw'
+
+
+class _BoardValues(object):
+    """
+    List-like view of a game's bitboard: index 0-8 holds 'X', 'O' or ' '.
+    """
+    def __init__(self, game: 'TicTacToe'):
+        self._game = game
+
+    def __len__(self):
+        return 9
+
+    def __getitem__(self, idx: int) -> str:
+        bit = 1 << range(9)[idx]
+        x_bits, o_bits = self._game._BOARD
+        if x_bits & bit:
+            return 'X'
+        if o_bits & bit:
+            return 'O'
+        return ' '
+
+    def __setitem__(self, idx: int, sign: str):
+        self._game._place(range(9)[idx] + 1, sign)
+
+    def __iter__(self):
+        return (self[idx] for idx in range(9))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _PlayerPositions(Mapping):
+    """
+    Read-only dict-like view of a game's move history: sign -> tuple of the
+    boxes taken, in move order.  Play moves through the game, not the view.
+    """
+    def __init__(self, game: 'TicTacToe'):
+        self._game = game
+
+    def __len__(self):
+        return len(SIGNS)
+
+    def __iter__(self):
+        return iter(SIGNS)
+
+    def __getitem__(self, sign: str) -> Tuple[int, ...]:
+        player = SIGN_INDEX[sign]
+        return tuple(entry & 0x0F for entry in self._game._HISTORY if entry >> 4 == player)
+
+    def __repr__(self):
+        return repr(dict(self))
+
 
-@dataclass
 class TicTacToe(object):
     """ TicTacToe game
+
+    The game state methods (set_players, apply_move, status, winner, to_dict,
+    from_dict) never touch the terminal, so servers can drive games directly.
+    The input()/print() methods are the console front end used by run().
     """
+    # servers keep many games resident, so no per-instance __dict__
+    __slots__ = ('_BOARD', '_HISTORY', '_SIGN_PLAYERS', '_CUR_PLAYER_NAME', '_PLAYER1', '_PLAYER2', '_CUR_SIGN')
+
     def __init__(self, num_player: int = 2):
         """
         Constructor for the TicTacToe game object.
+
+        The board is held as two 9-bit integers in ``_BOARD`` (X, O) and the
+        move order in ``_HISTORY`` (one byte per move: sign index << 4 | box).
+        ``_VALUES`` and ``_PLAYER_POS`` are views over them.  ``_SIGN_PLAYERS``
+        holds the (X, O) player names behind the ``_PLAYER_CHOICE`` dict.
+
+        :param num_player: must be 2; tictactoe.mnk.MNKGame plays other player
+            counts and board sizes
         """
+        if num_player != 2:
+            raise ValueError("TicTacToe is a two-player game, use tictactoe.mnk.MNKGame for more players")
 
-        self._VALUES = [' ' for x in range(9)]
-        self._PLAYER_POS = {'X': [], 'O': []}
-        self._PLAYER_CHOICE = {'X': "", 'O': ""}
+        self._BOARD = [0, 0]
+        self._HISTORY = bytearray()
+        self._SIGN_PLAYERS = ('', '')
         self._CUR_PLAYER_NAME = ''
         self._PLAYER1 = ''
         self._PLAYER2 = ''
         self._CUR_SIGN = ''
 
+    def set_players(self, player1: str, player2: str, player1_sign: str = 'X'):
+        """
+        Names both players and gives player 1 the first move.
+
+        :param player1: name of the player moving first
+        :param player2: name of the other player
+        :param player1_sign: 'X' or 'O' for player 1, player 2 gets the other one
+        """
+        if player1_sign not in SIGN_INDEX:
+            raise ValueError(f"sign must be 'X' or 'O', not {player1_sign!r}")
+        player2_sign = SIGNS[1 - SIGN_INDEX[player1_sign]]
+        self._PLAYER1 = player1
+        self._PLAYER2 = player2
+        self._PLAYER_CHOICE = {player1_sign: player1, player2_sign: player2}
+        self._CUR_PLAYER_NAME = player1
+        self._CUR_SIGN = player1_sign
+
     def initial_setup(self):
         print("Player 1 - ")
         self._PLAYER1 = input("Enter the name: ")
@@ -56,28 +148,53 @@ class TicTacToe(object):
                 continue
 
             if choice == 1:
-                self._PLAYER_CHOICE['X'] = self._CUR_PLAYER_NAME
-                if self._CUR_PLAYER_NAME == self._PLAYER1:
-                    self._PLAYER_CHOICE['O'] = self._PLAYER2
-                else:
-                    self._PLAYER_CHOICE['O'] = self._PLAYER1
+                self.set_players(self._PLAYER1, self._PLAYER2, 'X')
                 return False
 
             elif choice == 2:
-                self._PLAYER_CHOICE['O'] = self._CUR_PLAYER_NAME
-                if self._CUR_PLAYER_NAME == self._PLAYER1:
-                    self._PLAYER_CHOICE['X'] = self._PLAYER2
-                else:
-                    self._PLAYER_CHOICE['X'] = self._PLAYER1
+                self.set_players(self._PLAYER1, self._PLAYER2, 'O')
                 return False
             else:
                 print("Invalid Choice! :( Try Again\n")
                 return True
 
+    @property
+    def _VALUES(self) -> _BoardValues:
+        return _BoardValues(self)
+
+    @property
+    def _PLAYER_POS(self) -> _PlayerPositions:
+        return _PlayerPositions(self)
+
+    @property
+    def _PLAYER_CHOICE(self) -> dict:
+        """
+        sign -> player name; assign a new dict to change it
+        """
+        return {'X': self._SIGN_PLAYERS[0], 'O': self._SIGN_PLAYERS[1]}
+
+    @_PLAYER_CHOICE.setter
+    def _PLAYER_CHOICE(self, choice: dict):
+        self._SIGN_PLAYERS = (choice.get('X', ''), choice.get('O', ''))
+
+    def _place(self, move: int, sign: str):
+        """
+        Put ``sign`` in box ``move`` (1-9), or clear the box if ``sign`` is ' '.
+        """
+        bit = move_bit(move)
+        self._BOARD[0] &= ~bit
+        self._BOARD[1] &= ~bit
+        self._HISTORY[:] = bytes(entry for entry in self._HISTORY if entry & 0x0F != move)
+        if sign != ' ':
+            player = SIGN_INDEX[sign]
+            self._BOARD[player] |= bit
+            self._HISTORY.append((player << 4) | move)
+
     def current_sign(self):
-        for key, value in self._PLAYER_CHOICE.items():
+        for key, value in zip(SIGNS, self._SIGN_PLAYERS):
             if value == self._CUR_PLAYER_NAME:
                 self._CUR_SIGN = key
+                break
         return self._CUR_SIGN
 
     def print_tic_tac_toe(self):
@@ -105,16 +222,115 @@ class TicTacToe(object):
         if move < 1 or move > 9:
             return False
 
-        if self._VALUES[move - 1] != ' ':
+        if (self._BOARD[0] | self._BOARD[1]) & move_bit(move):
             return False
         else:
             return True
 
     def update_board(self, move):
-        cur_sign = self.current_sign()
-        self._VALUES[move - 1] = cur_sign
-        self._PLAYER_POS[cur_sign].append(move)
-        self.print_tic_tac_toe()
+        """
+        Puts the current player's sign in box ``move`` without validating it.
+
+        :return: (board values, positions per sign)
+        """
+        self._play(move)
+        return list(self._VALUES), {sign: list(moves) for sign, moves in self._PLAYER_POS.items()}
+
+    def _play(self, move: int):
+        player = SIGN_INDEX[self.current_sign()]
+        self._BOARD[player] |= move_bit(move)
+        self._HISTORY.append((player << 4) | move)
+
+    def apply_move(self, move: int) -> str:
+        """
+        Plays ``move`` for the current player and passes the turn if the game goes on.
+
+        :raises: ValueError if the game is over or the box is not free
+        :param move: box number 1-9
+        :return: the game status after the move
+        """
+        if self.status() != STATUS_IN_PROGRESS:
+            raise ValueError("game is already over")
+        if not self.player_move_check(move):
+            raise ValueError(f"box {move} is not available")
+        self._play(move)
+        status = self.status()
+        if status == STATUS_IN_PROGRESS:
+            self.switch_turn()
+        return status
+
+    def status(self) -> str:
+        """
+        :return: STATUS_WON, STATUS_DRAW or STATUS_IN_PROGRESS
+        """
+        if is_win(self._BOARD[0]) or is_win(self._BOARD[1]):
+            return STATUS_WON
+        if is_full(self._BOARD[0], self._BOARD[1]):
+            return STATUS_DRAW
+        return STATUS_IN_PROGRESS
+
+    def winner(self) -> Union[str, None]:
+        """
+        :return: name of the winning player, None if nobody has won
+        """
+        for sign in SIGNS:
+            if is_win(self._BOARD[SIGN_INDEX[sign]]):
+                return self._SIGN_PLAYERS[SIGN_INDEX[sign]]
+        return None
+
+    def to_dict(self) -> dict:
+        """
+        :return: JSON-friendly snapshot of the game
+        """
+        return {'board': ''.join(self._VALUES),
+                'moves': [[SIGNS[entry >> 4], entry & 0x0F] for entry in self._HISTORY],
+                'players': [self._PLAYER1, self._PLAYER2],
+                'player_choice': self._PLAYER_CHOICE,
+                'current_player': self._CUR_PLAYER_NAME,
+                'current_sign': self._CUR_SIGN,
+                'status': self.status(),
+                'winner': self.winner()}
+
+    def move_delta(self) -> dict:
+        """
+        :return: compact update for the latest move; 'seq' is the number of moves played
+        """
+        entry = self._HISTORY[-1]
+        return {'seq': len(self._HISTORY),
+                'sign': SIGNS[entry >> 4],
+                'box': entry & 0x0F,
+                'next': self._CUR_PLAYER_NAME,
+                'status': self.status(),
+                'winner': self.winner()}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'TicTacToe':
+        """
+        Rebuilds a game from a to_dict() snapshot.
+        """
+        game = cls()
+        game._PLAYER1, game._PLAYER2 = state['players']
+        game._PLAYER_CHOICE = state['player_choice']
+        game._CUR_PLAYER_NAME = state['current_player']
+        game._CUR_SIGN = state['current_sign']
+        for sign, move in state['moves']:
+            player = SIGN_INDEX[sign]
+            game._BOARD[player] |= move_bit(move)
+            game._HISTORY.append((player << 4) | move)
+        return game
+
+    def to_bytes(self) -> bytes:
+        """
+        :return: the game in the compact binary layout of tictactoe.codec
+        """
+        return codec.encode(self)
+
+    @classmethod
+    def from_buffer(cls, buffer, offset: int = 0) -> 'TicTacToe':
+        """
+        Rebuilds a game from to_bytes() output held in any buffer (bytes, mmap, ...).
+        """
+        return codec.decode_into(cls(), buffer, offset)
 
     def player_move_exe(self):
         while True:
@@ -122,6 +338,7 @@ class TicTacToe(object):
 
             if self.player_move_check(move) == True:
                 self.update_board(move)
+                self.print_tic_tac_toe()
                 return False
             elif self.player_move_check(move) == False:
                 print("Invalid Input! Try again!")
@@ -135,35 +352,40 @@ class TicTacToe(object):
         return self._CUR_PLAYER_NAME, self._CUR_SIGN
 
     def check_draw(self):
-        if len(self._PLAYER_POS['X']) + len(self._PLAYER_POS['O']) == 9:
-            return True
-        return False
+        return is_full(self._BOARD[0], self._BOARD[1])
 
     def check_winner(self):
-        win_cond = [[1, 2, 3], [4, 5, 6], [7, 8, 9], [1, 4, 7], [2, 5, 8], [3, 6, 9], [1, 5, 9], [3, 5, 7]]
-        for x in win_cond:
-            if all(y in (self._PLAYER_POS[self._CUR_SIGN]) for y in x):
-                return True
-        return False
+        return is_win(self._BOARD[SIGN_INDEX[self._CUR_SIGN]])
+
+    def hint(self) -> int:
+        """
+        :return: the perfect-play box (1-9) for the player whose turn it is, 0 once the game is won or drawn
+        """
+        if self.status() != STATUS_IN_PROGRESS:  # the turn doesn't pass after the last move
+            return 0
+        return solver.best_move(self)
 
     def run(self):
 
         self.player_choice()
         self.print_tic_tac_toe()
         while True:
-            self.player_move_exe()
+            try:
+                status = self.apply_move(self.player_move_req())
+            except ValueError:
+                print("Invalid Input! Try again!")
+                continue
+            self.print_tic_tac_toe()
 
-            if self.check_winner():
-                print(" ", self._CUR_PLAYER_NAME, " has won the game! :D")
+            if status == STATUS_WON:
+                print(" ", self.winner(), " has won the game! :D")
                 print("\n")
                 break
-            if self.check_draw():
+            if status == STATUS_DRAW:
                 print("Game Drawn :(")
                 print("\n")
                 break
 
-            self.switch_turn()
-
 
 def main():
     play_another = True
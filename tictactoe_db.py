@@ -1,76 +1,604 @@
 from uuid import uuid4
-from typing import List, Tuple, Dict, Union
-from dataclasses import dataclass
+from typing import Callable, List, Tuple, Dict, Union, Optional, NamedTuple, Iterator, Sequence
 from fastapi import HTTPException, status
 import asyncio
+import json
+import logging
+import time
+import zlib
 from user_db import UserDB
-from tictactoe.tictactoe import TicTacToe
+from tictactoe.tictactoe import TicTacToe, STATUS_IN_PROGRESS
+from game_storage import GameStorage, GameRecord, WriteBehindFlusher
+from game_index import GameIndex, GAME_OPEN, GAME_IN_PROGRESS, GAME_FINISHED
+from game_expiry import ExpiryQueue
+from game_journal import (GameJournal, JournalRecord, SnapshotEntry, EVENT_CREATE, EVENT_JOIN, EVENT_START,
+                          EVENT_MOVE, EVENT_DELETE, EVENT_EVICT)
+from metrics import REGISTRY, timed
 
+_QUERY_HELP = 'AsyncTicTacToeDB query time, simulated latency and shard lock wait included'
+_MOVE_TIME = REGISTRY.histogram('game_move_seconds', 'TicTacToe.apply_move time')
 
-@dataclass
-class TicTacToeInfo:
-    game_uuid: str
-    players: List[str]
-    termination_password: str
+
+class LatencyModel(object):
+    """
+    Simulated query latency, awaited at the start of every database query.
+    The base model adds none; pass FixedLatency to emulate a remote database.
+    """
+    async def wait(self, query: str):
+        """
+        :param query: name of the query being simulated, e.g. 'get_game'
+        """
+        pass
+
+
+class FixedLatency(LatencyModel):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    async def wait(self, query: str):
+        await asyncio.sleep(self.seconds)
+
+
+NO_LATENCY = LatencyModel()
+
+
+class TicTacToeInfo(object):
+    # one per game, so slotted rather than a dataclass with a per-instance __dict__
+    __slots__ = ('game_uuid', 'players', 'termination_password', 'owner', 'num_players', 'status')
+
+    def __init__(self, game_uuid: str, players: List[str], termination_password: str,
+                 owner: str = '', num_players: int = 2, status: str = GAME_OPEN):
+        self.game_uuid = game_uuid
+        self.players = players
+        self.termination_password = termination_password
+        self.owner = owner
+        self.num_players = num_players
+        self.status = status
+
+    def to_dict(self) -> dict:
+        """
+        :return: the fields as a dict, safe to serialize off the event loop
+        """
+        return {'game_uuid': self.game_uuid,
+                'players': list(self.players),
+                'termination_password': self.termination_password,
+                'owner': self.owner,
+                'num_players': self.num_players,
+                'status': self.status}
+
+    def __eq__(self, other):
+        if not isinstance(other, TicTacToeInfo):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"TicTacToeInfo({fields})"
+
+
+class GamePage(NamedTuple):
+    games: List[Tuple[str, int]]  # (game_id, number of players in game)
+    next_cursor: Optional[str]  # pass back to list_games for the next page, None on the last page
+
+
+class BatchOp(NamedTuple):
+    action: str  # 'create', 'join', 'start' or 'move'
+    game_id: str = ''  # unused for 'create'
+    username: str = ''  # the owner for 'create', the player joining or moving otherwise
+    move: int = 0  # box number 1-9 for 'move'
+    num_players: int = 2  # seats for 'create'
+
+
+BATCH_ACTIONS = ('create', 'join', 'start', 'move')
+# add_game's (game_id, termination password, owner), the players after a join, the
+# to_dict() of a started game, the move_delta() of a move, or the HTTPException the
+# operation failed with; states are copied because later operations change the game
+BatchResult = Union[Tuple[str, str, str], List[str], dict, HTTPException]
+
+
+class GameShard(object):
+    """
+    One slice of the game store.  Check-and-mutate operations on games in the
+    shard hold its lock, so two joins can never both take the last seat while
+    games in other shards are never blocked.
+    """
+    def __init__(self):
+        self.games: Dict[str, TicTacToe] = {}
+        self.info: Dict[str, TicTacToeInfo] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:  # created on the running loop
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
 
 
 class AsyncTicTacToeDB(object):
-    def __init__(self, user_db: UserDB):
-        self._current_games: Dict[str, TicTacToe] = {}
-        self._current_games_info: Dict[str, TicTacToeInfo] = {}
-        self._QUERY_TIME: float = 0.05
+    def __init__(self, user_db: UserDB, storage: Optional[GameStorage] = None,
+                 flush_interval: float = 0.05, max_batch: int = 256,
+                 latency: LatencyModel = NO_LATENCY, num_shards: int = 16,
+                 idle_ttl: Optional[float] = None, finished_ttl: Optional[float] = None,
+                 archive: Optional[GameStorage] = None, reap_interval: float = 1.0,
+                 on_evict: Optional[Callable[[str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 new_game_id: Optional[Callable[[], str]] = None,
+                 journal: Optional[GameJournal] = None, snapshot_interval: Optional[float] = 300.0):
+        """
+        :param user_db: the Web API's UserDB
+        :param storage: backend games are persisted to, None to keep them in memory only
+        :param flush_interval: seconds between write-behind group commits
+        :param max_batch: commit early once this many games are dirty
+        :param latency: simulated query latency, none by default
+        :param num_shards: how many independently locked slices the games are split into
+        :param idle_ttl: evict unfinished games this many seconds after their last change, None to keep them
+        :param finished_ttl: evict won or drawn games this many seconds after their last move, None to keep them
+        :param archive: backend evicted games are copied to before they are deleted
+        :param reap_interval: seconds between eviction passes
+        :param on_evict: called with the id of every evicted game
+        :param clock: monotonic time source for the TTLs
+        :param new_game_id: returns the id of each new game (a uuid4 if None),
+            e.g. GameRouter.new_game_id in a cluster
+        :param journal: event log games are recovered from at start, instead of a storage backend
+        :param snapshot_interval: seconds between journal checkpoints, None to only checkpoint on close
+        """
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        if storage is not None and journal is not None:
+            raise ValueError("games are persisted either to storage or to a journal, not both")
+        self._shards: List[GameShard] = [GameShard() for _ in range(num_shards)]
+        self._index = GameIndex()
+        self._latency = latency
         self._user_db = user_db  # pointer to the Web API's UserDB
+        self._storage = storage
+        self._flusher = None
+        if storage is not None:
+            self._flusher = WriteBehindFlusher(storage, self._snapshot, flush_interval, max_batch)
+        self._idle_ttl = idle_ttl
+        self._finished_ttl = finished_ttl
+        self._archive = archive
+        self._reap_interval = reap_interval
+        self._on_evict = on_evict
+        self._clock = clock
+        self._new_game_id = new_game_id if new_game_id is not None else lambda: str(uuid4())
+        self._expiry = ExpiryQueue()
+        self._reaper: Optional[asyncio.Task] = None
+        self._journal = journal
+        self._snapshot_interval = snapshot_interval
+        self._checkpointer: Optional[asyncio.Task] = None
+        self.evictions = 0
+        self.archived = 0
+
+    def _shard_index(self, game_id: str) -> int:
+        # crc32 rather than hash() so every process maps a game to the same shard
+        return zlib.crc32(game_id.encode('utf-8')) % len(self._shards)
+
+    def _shard(self, game_id: str) -> GameShard:
+        return self._shards[self._shard_index(game_id)]
+
+    def iter_games(self) -> Iterator[Tuple[str, TicTacToe]]:
+        """
+        :return: (game_id, game) for every game held in memory
+        """
+        for shard in self._shards:
+            yield from list(shard.games.items())
+
+    @property
+    def resident_games(self) -> int:
+        return sum(len(shard.info) for shard in self._shards)
+
+    @property
+    def pending_writes(self) -> int:
+        """
+        :return: dirty games waiting for the next write-behind batch
+        """
+        return self._flusher.pending if self._flusher is not None else 0
+
+    async def start(self):
+        """
+        Loads the stored game index and starts the write-behind flusher and
+        the eviction task.  Game boards are loaded from storage the first time
+        they are requested.  With a journal, every game is rebuilt from the
+        latest snapshot and the records after it instead.  Stored games count
+        as active from startup.
+        """
+        if self._journal is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._recover)
+            self._journal.start()
+            if self._snapshot_interval is not None:
+                self._checkpointer = asyncio.ensure_future(self._checkpoint_forever())
+        if self._storage is not None:
+            loop = asyncio.get_running_loop()
+            stored_info = await loop.run_in_executor(None, self._storage.load_all_info)
+            for game_id, info in stored_info.items():
+                shard = self._shard(game_id)
+                if game_id not in shard.info:
+                    info = shard.info[game_id] = TicTacToeInfo(**info)
+                    self._index.update(game_id, info.status, info.owner, info.players)
+                    self._touch(game_id)
+            self._flusher.start()
+        if self._idle_ttl is not None or self._finished_ttl is not None:
+            self._reaper = asyncio.ensure_future(self._reap_forever())
+
+    async def close(self):
+        """
+        Stops the eviction task, writes every pending change and closes the
+        storage and archive backends.  A journal gets a final checkpoint, so
+        the next start has nothing to replay.
+        """
+        for task in (self._reaper, self._checkpointer):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._reaper = self._checkpointer = None
+        if self._journal is not None:
+            await self.checkpoint()
+            await self._journal.stop()
+        if self._storage is not None:
+            await self._flusher.stop()
+            self._storage.close()
+        if self._archive is not None:
+            self._archive.close()
+
+    def _log(self, kind: int, game_id: str, payload: bytes = b''):
+        if self._journal is not None:
+            self._journal.append(kind, game_id, payload)
+
+    def _capture(self) -> List[SnapshotEntry]:
+        return [(game_id, shard.info[game_id].to_dict(), game.to_bytes())
+                for shard in self._shards for game_id, game in shard.games.items()]
+
+    async def checkpoint(self) -> int:
+        """
+        Snapshots every game into the journal, so recovery only replays what follows.
+
+        :return: the journal sequence number the snapshot covers
+        """
+        return await self._journal.checkpoint(self._capture)
+
+    async def _checkpoint_forever(self):
+        while True:
+            await asyncio.sleep(self._snapshot_interval)
+            try:
+                await self.checkpoint()
+            except Exception:
+                logging.exception("journal checkpoint failed")
 
-    async def add_game(self) -> Tuple[str, str]:
+    def _recover(self):
+        """
+        Rebuilds the games from the journal; runs in a worker thread before the
+        database serves anything.
+        """
+        entries, records = self._journal.recover()
+        for game_id, info, state in entries:
+            shard = self._shard(game_id)
+            shard.info[game_id] = TicTacToeInfo(**info)
+            shard.games[game_id] = TicTacToe.from_buffer(state)
+        for record in records:
+            self._replay(record)
+        for shard in self._shards:
+            for game_id in shard.info:
+                self._reindex(game_id)
+                self._touch(game_id)
+
+    def _replay(self, record: JournalRecord):
+        game_id = record.game_id
+        shard = self._shard(game_id)
+        if record.kind == EVENT_CREATE:
+            shard.info[game_id] = TicTacToeInfo(**json.loads(record.payload))
+            shard.games[game_id] = TicTacToe()
+        elif game_id not in shard.info:
+            logging.warning("journal record %d refers to unknown game %s", record.seq, game_id)
+        elif record.kind == EVENT_JOIN:
+            shard.info[game_id].players.append(record.payload.decode('utf-8'))
+        elif record.kind == EVENT_START:
+            shard.games[game_id].set_players(*shard.info[game_id].players[:2])
+        elif record.kind == EVENT_MOVE:
+            shard.games[game_id].apply_move(record.payload[0])
+        elif record.kind in (EVENT_DELETE, EVENT_EVICT):
+            shard.games.pop(game_id, None)
+            del shard.info[game_id]
+
+    def _touch(self, game_id: str):
+        """
+        Records activity on a game, pushing back (or, once it is finished,
+        bringing forward) the time it is evicted.
+        """
+        ttl = self._finished_ttl if self._shard(game_id).info[game_id].status == GAME_FINISHED else self._idle_ttl
+        if ttl is None:
+            self._expiry.discard(game_id)
+        else:
+            self._expiry.set(game_id, self._clock() + ttl)
+
+    async def reap(self) -> int:
+        """
+        Evicts every game whose TTL has run out, archiving it first if an
+        archive backend was given.
+
+        :return: number of games evicted
+        """
+        archived: Dict[str, GameRecord] = {}
+        evicted = 0
+        for game_id in self._expiry.pop_expired(self._clock()):
+            shard = self._shard(game_id)
+            async with shard.lock():
+                if game_id not in shard.info or game_id in self._expiry:
+                    continue  # deleted, or touched again while we waited for the lock
+                if self._archive is not None and await self._load_game(game_id) is not None:
+                    archived[game_id] = self._snapshot(game_id)
+                shard.games.pop(game_id, None)
+                del shard.info[game_id]
+                self._index.remove(game_id)
+                self._mark_dirty(game_id)
+                self._log(EVENT_EVICT, game_id)
+                evicted += 1
+            if self._on_evict is not None:
+                self._on_evict(game_id)
+        if archived:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._archive.write_batch, archived, [])
+            self.archived += len(archived)
+        self.evictions += evicted
+        return evicted
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self._reap_interval)
+            try:
+                await self.reap()
+            except Exception:
+                logging.exception("game eviction pass failed")
+
+    def _snapshot(self, game_id: str) -> Optional[GameRecord]:
+        shard = self._shard(game_id)
+        info = shard.info.get(game_id)
+        game = shard.games.get(game_id)
+        if info is None or game is None:
+            return None
+        return info.to_dict(), game.to_bytes()
+
+    def _mark_dirty(self, game_id: str):
+        if self._flusher is not None:
+            self._flusher.mark_dirty(game_id)
+
+    def _reindex(self, game_id: str):
+        """
+        Recomputes a game's lobby status and updates the secondary indexes.
+        """
+        shard = self._shard(game_id)
+        info = shard.info[game_id]
+        game = shard.games.get(game_id)
+        if game is not None and game.status() != STATUS_IN_PROGRESS:
+            info.status = GAME_FINISHED
+        elif len(info.players) < info.num_players:
+            info.status = GAME_OPEN
+        else:
+            info.status = GAME_IN_PROGRESS
+        self._index.update(game_id, info.status, info.owner, info.players)
+
+    def _info(self, game_id: str) -> TicTacToeInfo:
+        try:
+            return self._shard(game_id).info[game_id]
+        except KeyError:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "game_id not found")
+
+    async def _load_game(self, game_id: str) -> Union[TicTacToe, None]:
+        shard = self._shard(game_id)
+        the_game = shard.games.get(game_id, None)
+        if the_game is None and self._storage is not None and game_id in shard.info:
+            loop = asyncio.get_running_loop()
+            record = await loop.run_in_executor(None, self._storage.load_game, game_id)
+            if record is not None and game_id in shard.info:
+                state = record[1]
+                stored = TicTacToe.from_dict(state) if isinstance(state, dict) else TicTacToe.from_buffer(state)
+                the_game = shard.games.setdefault(game_id, stored)
+        return the_game
+
+    @timed('db_query_seconds', _QUERY_HELP, query='add_game')
+    async def add_game(self, owner: str = '', num_players: int = 2) -> Tuple[str, str, str]:
         """
         Asks the database to create a new game.
 
+        :param owner: username of the player creating the game, who joins it as player 0
+        :param num_players: seats in the game, which must be 2
         :return: the UUID (universally-unique ID) of the game, termination password, and owner username
+        :raises: HTTPException 422 for any other number of players
         """
-        await asyncio.sleep(self._QUERY_TIME)  # simulate query time
-        game_uuid = str(uuid4())
+        await self._latency.wait('add_game')
+        return self._create_game(owner, num_players)
+
+    def _create_game(self, owner: str, num_players: int) -> Tuple[str, str, str]:
+        if type(num_players) is not int or num_players != 2:  # a game with other seats could never start
+            raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "TicTacToe is a two-player game.")
+        game_uuid = self._new_game_id()
         game_term_password = str(uuid4())
-        self._current_games[game_uuid] = TicTacToe()
-        self._current_games_info[game_uuid] = TicTacToeInfo(
-            list(),
-            game_term_password)
-        return game_uuid, game_term_password
+        shard = self._shard(game_uuid)
+        shard.games[game_uuid] = TicTacToe()
+        shard.info[game_uuid] = TicTacToeInfo(
+            game_uuid,
+            [owner] if owner else [],
+            game_term_password,
+            owner,
+            num_players)
+        self._reindex(game_uuid)
+        self._touch(game_uuid)
+        self._mark_dirty(game_uuid)
+        self._log(EVENT_CREATE, game_uuid, json.dumps(shard.info[game_uuid].to_dict()).encode('utf-8'))
+        return game_uuid, game_term_password, owner
 
-    async def get_game_info(self, game_id: str):
+    @timed('db_query_seconds', _QUERY_HELP, query='get_game_info')
+    async def get_game_info(self, game_id: str) -> TicTacToeInfo:
         """
-        Asks the database for the blackjack info in a specific game.
+        Asks the database for the tictactoe info in a specific game.
 
         :param game_id: the UUID of the specific game
         :return: all game info
         """
-        return self._current_games_info[game_id]
+        return self._info(game_id)
 
-    async def add_player(self, game_id: str, username: str):
-        if not self._current_games_info[game_id].players:
-            self._current_games_info[game_id].players += 1
-            self._current_games_info[game_id].players.append(username)
-            self._current_games[game_id].players = self._current_games_info[game_id].players
-        return self._current_games[game_id].players
+    @timed('db_query_seconds', _QUERY_HELP, query='add_player')
+    async def add_player(self, game_id: str, username: str) -> List[str]:
+        """
+        Asks the database to seat a player in a game.
 
-    async def list_games(self) -> List[str]:
+        :param game_id: the UUID of the specific game
+        :param username: the player joining
+        :return: the players of the game
         """
-        Asks the database for a list of all active games.
+        async with self._shard(game_id).lock():
+            await self._latency.wait('add_player')
+            return self._seat_player(game_id, username)
+
+    def _seat_player(self, game_id: str, username: str) -> List[str]:
+        info = self._info(game_id)
+        if len(info.players) >= info.num_players:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Game, Max players capped.")
+        if username in info.players:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "player already added.")
+        info.players.append(username)
+        self._reindex(game_id)
+        self._touch(game_id)
+        self._mark_dirty(game_id)
+        self._log(EVENT_JOIN, game_id, username.encode('utf-8'))
+        return info.players
 
-        :return: list of (game_id, number of players in game)
+    @timed('db_query_seconds', _QUERY_HELP, query='init_game')
+    async def init_game(self, game_id: str) -> TicTacToe:
         """
-        await asyncio.sleep(self._QUERY_TIME)  # simulate query time
-        return [game_id for game_id, game in self._current_games.items()]
+        Asks the database to start a game between its two seated players.
 
+        :param game_id: the UUID of the specific game
+        :return: pointer to the TicTacToe object
+        :raises: HTTPException 400 unless two players are seated and the game hasn't started
+        """
+        async with self._shard(game_id).lock():
+            await self._latency.wait('init_game')
+            return await self._start_game(game_id)
+
+    async def _start_game(self, game_id: str) -> TicTacToe:
+        info = self._info(game_id)
+        if len(info.players) != 2:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Game needs two players to start.")
+        the_game = await self._load_game(game_id)
+        if the_game._CUR_SIGN:  # set_players() again would hand the turn back to player 1
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Game already started.")
+        the_game.set_players(info.players[0], info.players[1])
+        self._touch(game_id)
+        self._mark_dirty(game_id)
+        self._log(EVENT_START, game_id)
+        return the_game
+
+    @timed('db_query_seconds', _QUERY_HELP, query='play_move')
+    async def play_move(self, game_id: str, username: str, move: int) -> TicTacToe:
+        """
+        Asks the database to play a move for a player.
+
+        :param game_id: the UUID of the specific game
+        :param username: the player moving, must be the one whose turn it is
+        :param move: box number 1-9
+        :return: pointer to the TicTacToe object
+        """
+        async with self._shard(game_id).lock():
+            await self._latency.wait('play_move')
+            return await self._move(game_id, username, move)
+
+    async def _move(self, game_id: str, username: str, move: int) -> TicTacToe:
+        the_game = await self._load_game(game_id)
+        if the_game is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "game_id not found")
+        if username != the_game._CUR_PLAYER_NAME:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, f"It is not {username}'s turn.")
+        start = time.perf_counter()
+        try:
+            the_game.apply_move(move)
+        except ValueError as error:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, str(error))
+        finally:
+            _MOVE_TIME.record(time.perf_counter() - start)
+        self._reindex(game_id)
+        self._touch(game_id)
+        self._mark_dirty(game_id)
+        self._log(EVENT_MOVE, game_id, bytes((move,)))
+        return the_game
+
+    @timed('db_query_seconds', _QUERY_HELP, query='apply_batch')
+    async def apply_batch(self, operations: Sequence[BatchOp]) -> List[BatchResult]:
+        """
+        Applies many operations in one database round trip.  Operations on the
+        same game run in the order given, and each shard's lock is taken once
+        for all of its operations.  A failed operation doesn't stop the others.
+
+        :param operations: BatchOp entries; 'create', 'join', 'start' and 'move'
+            work like add_game, add_player, init_game and play_move
+        :return: a BatchResult per operation
+        """
+        await self._latency.wait('apply_batch')
+        results: List = [None] * len(operations)
+        by_shard: Dict[int, List[int]] = {}
+        for idx, operation in enumerate(operations):
+            if operation.action == 'create':
+                try:
+                    results[idx] = self._create_game(operation.username, operation.num_players)
+                except HTTPException as error:
+                    results[idx] = error
+            elif operation.action not in BATCH_ACTIONS:
+                results[idx] = HTTPException(status.HTTP_400_BAD_REQUEST, f"unknown action {operation.action!r}")
+            else:
+                by_shard.setdefault(self._shard_index(operation.game_id), []).append(idx)
+        for shard_idx, indexes in by_shard.items():
+            async with self._shards[shard_idx].lock():
+                for idx in indexes:
+                    operation = operations[idx]
+                    try:
+                        if operation.action == 'join':
+                            results[idx] = list(self._seat_player(operation.game_id, operation.username))
+                        elif operation.action == 'start':
+                            results[idx] = (await self._start_game(operation.game_id)).to_dict()
+                        else:
+                            the_game = await self._move(operation.game_id, operation.username, operation.move)
+                            results[idx] = the_game.move_delta()
+                    except HTTPException as error:
+                        results[idx] = error
+        return results
+
+    @timed('db_query_seconds', _QUERY_HELP, query='list_games')
+    async def list_games(self, status: Optional[str] = None, owner: Optional[str] = None,
+                         player: Optional[str] = None, cursor: Optional[str] = None,
+                         limit: int = 50) -> GamePage:
+        """
+        Asks the database for a page of active games, oldest first.
+
+        :param status: only games that are GAME_OPEN, GAME_IN_PROGRESS or GAME_FINISHED
+        :param owner: only games created by this user
+        :param player: only games this user is seated in
+        :param cursor: next_cursor of the previous page, None for the first page
+        :param limit: maximum games in the page
+        :return: list of (game_id, number of players in game) and the cursor of the next page
+        :raises: HTTPException 422 for an unknown status or a malformed cursor
+        """
+        await self._latency.wait('list_games')
+        try:
+            game_ids, next_cursor = self._index.page(status, owner, player, cursor, limit)
+        except ValueError as error:
+            raise HTTPException(status_code=422, detail=str(error))  # `status` is the filter here
+        return GamePage([(game_id, len(self._info(game_id).players)) for game_id in game_ids],
+                        next_cursor)
+
+    @timed('db_query_seconds', _QUERY_HELP, query='get_game')
     async def get_game(self, game_id: str) -> Union[TicTacToe, None]:
         """
         Asks the database for a pointer to a specific game.
 
         :param game_id: the UUID of the specific game
-        :return: None if the game was not found, otherwise pointer to the Blackjack object
+        :return: None if the game was not found, otherwise pointer to the TicTacToe object
         """
-        await asyncio.sleep(self._QUERY_TIME)  # simulate query time
-        return self._current_games.get(game_id, None)
+        await self._latency.wait('get_game')
+        return await self._load_game(game_id)
 
+    @timed('db_query_seconds', _QUERY_HELP, query='del_game')
     async def del_game(self, game_id: str, term_pass: str) -> bool:
         """
         Asks the database to terminate a specific game.
@@ -79,12 +607,19 @@ class AsyncTicTacToeDB(object):
         :param term_pass: the termination password for the game
         :return: False or exception if not found, True if success
         """
-        try:
-            await asyncio.sleep(self._QUERY_TIME)  # simulate query time
-            if self._current_games_info[game_id].termination_password == term_pass:
-                del self._current_games[game_id]
-                return True
-            else:
-                raise HTTPException(status.HTTP_401_UNAUTHORIZED, "user not authorized")
-        except KeyError:
-            raise HTTPException(status.HTTP_404_NOT_FOUND, "game_id not found")
\ No newline at end of file
+        shard = self._shard(game_id)
+        async with shard.lock():
+            try:
+                await self._latency.wait('del_game')
+                if shard.info[game_id].termination_password == term_pass:
+                    shard.games.pop(game_id, None)
+                    del shard.info[game_id]
+                    self._index.remove(game_id)
+                    self._expiry.discard(game_id)
+                    self._mark_dirty(game_id)
+                    self._log(EVENT_DELETE, game_id)
+                    return True
+                else:
+                    raise HTTPException(status.HTTP_401_UNAUTHORIZED, "user not authorized")
+            except KeyError:
+                raise HTTPException(status.HTTP_404_NOT_FOUND, "game_id not found")
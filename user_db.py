@@ -1,13 +1,270 @@
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional, Set
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+import asyncio
+import functools
+import hashlib
 import secrets
+import sqlite3
+import threading
+import time
 import nacl.pwhash
 import nacl.exceptions
 from fastapi import HTTPException, status
+from metrics import REGISTRY
 
 
-class UserDB(object):
+# longest username in UTF-8 bytes; games store player names with a one-byte length (tictactoe.codec)
+MAX_USERNAME_BYTES = 255
+
+
+def _check_username(username: str):
+    if len(username.encode('utf-8')) > MAX_USERNAME_BYTES:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"usernames are limited to {MAX_USERNAME_BYTES} bytes.")
+
+
+def _hash_password(password: bytes, opslimit: int, memlimit: int) -> bytes:
+    return nacl.pwhash.str(password, opslimit=opslimit, memlimit=memlimit)
+
+
+def _verify_password(password_hash: bytes, password: bytes) -> bool:
+    try:
+        return nacl.pwhash.verify(password_hash, password)
+    except nacl.exceptions.InvalidkeyError:
+        return False
+
+
+_HASH_HELP = 'Argon2 hash / verify time on the worker pool, queue wait included'
+_HASH_TIME = {_hash_password: REGISTRY.histogram('user_db_hash_seconds', _HASH_HELP, op='hash'),
+              _verify_password: REGISTRY.histogram('user_db_hash_seconds', _HASH_HELP, op='verify')}
+
+
+@dataclass
+class HashStats:
+    queue_depth: int = 0  # hash jobs waiting for a free worker
+    in_flight: int = 0  # hash jobs running on a worker
+    completed: int = 0
+    total_latency: float = 0.0  # seconds, queue wait included
+    max_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.completed if self.completed else 0.0
+
+
+class CredentialCache(object):
+    """
+    Bounded LRU cache of recently verified (username, token) pairs, so repeat
+    HTTP Basic requests skip Argon2.  Entries are keyed by a BLAKE2b MAC of the
+    credentials under a per-process secret (tokens are never stored), expire
+    after ``ttl`` seconds, and are dropped when the account's stored hash changes.
+    """
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, clock=time.monotonic):
+        self._secret = secrets.token_bytes(32)
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._clock = clock
+        # key -> (expiry, username, account hash the token was verified against)
+        self._entries: 'OrderedDict[bytes, Tuple[float, str, bytes]]' = OrderedDict()
+        self._keys_by_user: Dict[str, Set[bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, username: str, password: str) -> bytes:
+        user = username.encode('utf-8')
+        message = len(user).to_bytes(4, 'little') + user + password.encode('utf-8')
+        return hashlib.blake2b(message, key=self._secret, digest_size=16).digest()
+
+    def _drop(self, key: bytes):
+        _, username, _ = self._entries.pop(key)
+        user_keys = self._keys_by_user[username]
+        user_keys.discard(key)
+        if not user_keys:
+            del self._keys_by_user[username]
+
+    def check(self, username: str, password: str, account_hash: bytes) -> bool:
+        """
+        :param account_hash: the user's currently stored password hash
+        :return: True if these credentials were verified against this hash recently
+        """
+        key = self._key(username, password)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expiry, _, verified_hash = entry
+            if expiry > self._clock() and verified_hash == account_hash:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self._drop(key)
+        self.misses += 1
+        return False
+
+    def add(self, username: str, password: str, account_hash: bytes):
+        """
+        Remembers credentials that were just verified against ``account_hash``.
+        """
+        key = self._key(username, password)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (self._clock() + self._ttl, username, account_hash)
+        self._keys_by_user.setdefault(username, set()).add(key)
+        while len(self._entries) > self._max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, username: str):
+        for key in list(self._keys_by_user.get(username, ())):
+            self._drop(key)
+
+
+class AccountStore(ABC):
+    """
+    username -> Argon2 password hash.  UserDB keeps its accounts in one of
+    these; SQLiteAccountStore lets several server processes share them.
+    """
+    @abstractmethod
+    def get(self, username: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, username: str, password_hash: bytes) -> bool:
+        """
+        Creates an account unless the username is taken, atomically.
+        :return: False if the username was taken
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, username: str) -> bool:
+        """
+        :return: True if the account existed
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __getitem__(self, username: str) -> bytes:
+        password_hash = self.get(username)
+        if password_hash is None:
+            raise KeyError(username)
+        return password_hash
+
+    def __contains__(self, username: str) -> bool:
+        return self.get(username) is not None
+
+
+class MemoryAccountStore(AccountStore):
     def __init__(self):
-        self._accounts: Dict[str, bytes] = {}
+        self._hashes: Dict[str, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def get(self, username: str) -> Optional[bytes]:
+        return self._hashes.get(username)
+
+    def add(self, username: str, password_hash: bytes) -> bool:
+        return self._hashes.setdefault(username, password_hash) is password_hash
+
+    def delete(self, username: str) -> bool:
+        return self._hashes.pop(username, None) is not None
+
+
+class SQLiteAccountStore(AccountStore):
+    """
+    Accounts in a SQLite file (WAL mode) shared by every server process on
+    the host; a user created through one worker can log in through any other.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: database file, created if missing
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS accounts ("
+                           "username TEXT PRIMARY KEY, password_hash BLOB NOT NULL)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+    def get(self, username: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT password_hash FROM accounts WHERE username = ?",
+                                     (username,)).fetchone()
+        return row[0] if row is not None else None
+
+    def add(self, username: str, password_hash: bytes) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("INSERT OR IGNORE INTO accounts (username, password_hash) VALUES (?, ?)",
+                                        (username, password_hash))
+        return cursor.rowcount == 1
+
+    def delete(self, username: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM accounts WHERE username = ?", (username,))
+        return cursor.rowcount == 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class UserDB(object):
+    def __init__(self, max_hash_workers: int = 2,
+                 opslimit: int = nacl.pwhash.argon2id.OPSLIMIT_INTERACTIVE,
+                 memlimit: int = nacl.pwhash.argon2id.MEMLIMIT_INTERACTIVE,
+                 executor: Optional[Executor] = None,
+                 credential_cache: Optional[CredentialCache] = None,
+                 accounts: Optional[AccountStore] = None):
+        """
+        :param max_hash_workers: how many Argon2 hashes may run at once in the async API
+        :param opslimit: Argon2 operations limit for new password hashes
+        :param memlimit: Argon2 memory limit (bytes) for new password hashes
+        :param executor: pool the async API hashes on, e.g. a ProcessPoolExecutor;
+            defaults to a thread pool of max_hash_workers threads
+        :param credential_cache: cache of verified credentials, a default-sized one if None
+        :param accounts: where accounts are kept, in this process's memory if None
+        """
+        self._accounts = accounts if accounts is not None else MemoryAccountStore()
+        self._opslimit = opslimit
+        self._memlimit = memlimit
+        self._max_hash_workers = max_hash_workers
+        self._executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers=max_hash_workers, thread_name_prefix='pwhash')
+        self._hash_slots: Optional[asyncio.Semaphore] = None  # created on the running loop
+        self._hash_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.hash_stats = HashStats()
+        self.credential_cache = credential_cache if credential_cache is not None else CredentialCache()
+
+    @property
+    def num_users(self) -> int:
+        return len(self._accounts)
+
+    def _add_account(self, username: str, password_hash: bytes):
+        """
+        :raises: HTTPException 400 if another request (or process) took the username first
+        """
+        if not self._accounts.add(username, password_hash):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"username {username} is taken.")
+        self.credential_cache.invalidate_user(username)
+
+    def delete_user(self, username: str) -> bool:
+        """
+        Removes a user; their cached credentials stop working immediately.
+        :return: True if the user existed
+        """
+        self.credential_cache.invalidate_user(username)
+        return self._accounts.delete(username)
 
     def create_user(self, username: str) -> Tuple[str, str]:
         """
@@ -17,10 +274,11 @@ class UserDB(object):
         :param username: desired username
         :return: (username, password_token)
         """
+        _check_username(username)
         if username not in self._accounts:
             password = secrets.token_urlsafe()  # password.encode('utf-8')
-            hash_password = nacl.pwhash.str(bytes(password, 'utf-8'))
-            self._accounts[username] = hash_password
+            hash_password = _hash_password(bytes(password, 'utf-8'), self._opslimit, self._memlimit)
+            self._add_account(username, hash_password)
             return username, password
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
@@ -36,10 +294,75 @@ class UserDB(object):
         :param password:
         :return: True if the credentials are valid, False if not.
         """
-        if username in self._accounts:
-            try:
-                return nacl.pwhash.verify(self._accounts[username], password.encode('utf-8'))
-            except nacl.exceptions.InvalidkeyError:
-                return False
+        account_hash = self._accounts.get(username)
+        if account_hash is not None:
+            if self.credential_cache.check(username, password, account_hash):
+                return True
+            if _verify_password(account_hash, password.encode('utf-8')):
+                self.credential_cache.add(username, password, account_hash)
+                return True
+            return False
         else:
-            return False
\ No newline at end of file
+            return False
+
+    async def _run_hash(self, func, *args):
+        """
+        Runs a hashing function on the pool, at most max_hash_workers at a time,
+        so the event loop keeps serving games while Argon2 works.
+        """
+        loop = asyncio.get_running_loop()
+        if self._hash_slots is None or self._hash_loop is not loop:
+            self._hash_slots = asyncio.Semaphore(self._max_hash_workers)
+            self._hash_loop = loop
+        start = time.perf_counter()
+        self.hash_stats.queue_depth += 1
+        queued = True
+        try:
+            async with self._hash_slots:
+                self.hash_stats.queue_depth -= 1
+                queued = False
+                self.hash_stats.in_flight += 1
+                try:
+                    return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+                finally:
+                    self.hash_stats.in_flight -= 1
+        finally:
+            if queued:  # cancelled while waiting for a worker
+                self.hash_stats.queue_depth -= 1
+            latency = time.perf_counter() - start
+            _HASH_TIME[func].record(latency)
+            self.hash_stats.completed += 1
+            self.hash_stats.total_latency += latency
+            self.hash_stats.max_latency = max(self.hash_stats.max_latency, latency)
+
+    async def create_user_async(self, username: str) -> Tuple[str, str]:
+        """
+        Same as create_user, but hashes the token on the worker pool.
+        :raises: HTTPException 400 if the username already exists, 422 if it is too long
+        :param username: desired username
+        :return: (username, password_token)
+        """
+        _check_username(username)
+        if username in self._accounts:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"username {username} is taken.")
+        password = secrets.token_urlsafe()
+        hash_password = await self._run_hash(_hash_password, bytes(password, 'utf-8'),
+                                             self._opslimit, self._memlimit)
+        self._add_account(username, hash_password)  # may have been taken while we were hashing
+        return username, password
+
+    async def is_valid_async(self, username: str, password: str) -> bool:
+        """
+        Same as is_valid, but verifies the hash on the worker pool.
+        :return: True if the credentials are valid, False if not.
+        """
+        account_hash = self._accounts.get(username)
+        if account_hash is None:
+            return False
+        if self.credential_cache.check(username, password, account_hash):
+            return True
+        if await self._run_hash(_verify_password, account_hash, password.encode('utf-8')):
+            self.credential_cache.add(username, password, account_hash)
+            return True
+        return False
@@ -1,61 +1,257 @@
+import os
+import re
+import sys
+import json
+import math
+import functools
+import time
+import httpx
 import uvicorn
-from typing import Optional
-from fastapi import FastAPI, HTTPException, Path, status, Query, Depends
-from tictactoe_db import AsyncTicTacToeDB, TicTacToe
-from user_db import UserDB
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Path, status, Query, Depends, Request
+from tictactoe_db import AsyncTicTacToeDB, TicTacToe, FixedLatency, NO_LATENCY, BatchOp
+from game_storage import SQLiteStorage
+from game_journal import GameJournal
+from user_db import UserDB, SQLiteAccountStore
+from cluster import GameRouter, NodeRegistry
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from game_events import GameEventHub, RESYNC, sse_frame
+from game_index import GAME_STATUSES, GAME_FINISHED
+from matchmaking import Matchmaker, Match, DEFAULT_RATING
+from admission import AdmissionController
+from metrics import REGISTRY, PROFILER
 import asyncio
 from contextlib import AsyncExitStack, asynccontextmanager
 from random import randrange
 from asyncio_mqtt import Client, MqttError
+from mqtt_dispatch import CommandDispatcher, CommandError, Command, reply_topic, error_topic, is_reply
+from mqtt_workers import PartitionedWorkerPool
+from mqtt_publish import PublishQueue
+
+# set TICTACTOE_DB_PATH to keep games in a SQLite file across restarts
+DB_PATH = os.environ.get('TICTACTOE_DB_PATH')
+# set TICTACTOE_QUERY_TIME (seconds) to simulate a remote database
+QUERY_TIME = float(os.environ.get('TICTACTOE_QUERY_TIME', 0))
+MQTT_HOST = os.environ.get('TICTACTOE_MQTT_HOST', 'localhost')
+# MQTT commands for different games / users run concurrently on this many partitions
+MQTT_WORKERS = int(os.environ.get('TICTACTOE_MQTT_WORKERS', 16))
+# independently locked slices of the game store; scale with the number of workers
+NUM_SHARDS = int(os.environ.get('TICTACTOE_SHARDS', 16))
+# MQTT publishes awaiting a broker ack at once
+MQTT_MAX_IN_FLIGHT = int(os.environ.get('TICTACTOE_MQTT_IN_FLIGHT', 64))
+# seconds without a change before an unfinished game is evicted, 0 to keep games forever
+IDLE_TTL = float(os.environ.get('TICTACTOE_IDLE_TTL', 3600))
+# seconds a won or drawn game stays around after its last move, 0 to keep it
+FINISHED_TTL = float(os.environ.get('TICTACTOE_FINISHED_TTL', 600))
+# set TICTACTOE_ARCHIVE_PATH to copy evicted games into a SQLite file
+ARCHIVE_PATH = os.environ.get('TICTACTOE_ARCHIVE_PATH')
+# set TICTACTOE_JOURNAL_DIR to keep games in an append-only event log instead of TICTACTOE_DB_PATH
+JOURNAL_DIR = os.environ.get('TICTACTOE_JOURNAL_DIR')
+# seconds between journal snapshots; startup replays only the events after the latest one
+SNAPSHOT_INTERVAL = float(os.environ.get('TICTACTOE_SNAPSHOT_INTERVAL', 300))
+# set TICTACTOE_USER_DB_PATH to share accounts between server processes through a SQLite file
+USER_DB_PATH = os.environ.get('TICTACTOE_USER_DB_PATH')
+# cluster mode: set TICTACTOE_CLUSTER_DB to a SQLite file every worker can reach and
+# TICTACTOE_NODE_URL to the base url the other workers reach this one at
+CLUSTER_DB = os.environ.get('TICTACTOE_CLUSTER_DB')
+NODE_URL = os.environ.get('TICTACTOE_NODE_URL', '')
+NODE_ID = os.environ.get('TICTACTOE_NODE_ID', NODE_URL)
+# comma-separated usernames allowed to use the /debug routes, which are off while it is empty
+ADMINS = frozenset(name.strip() for name in os.environ.get('TICTACTOE_ADMINS', '').split(',') if name.strip())
+# most operations accepted by one POST /games/batch
+MAX_BATCH = int(os.environ.get('TICTACTOE_MAX_BATCH', 1000))
+# seconds between SSE keep-alive comments on an idle /game/{id}/events stream
+EVENTS_KEEPALIVE = 15
+# requests per second (and burst) allowed for each authenticated user, each client address
+# (anonymous MQTT commands share one) and the whole server, 0 for no limit
+USER_RATE = float(os.environ.get('TICTACTOE_USER_RATE', 20))
+USER_BURST = float(os.environ.get('TICTACTOE_USER_BURST', 40))
+ADDRESS_RATE = float(os.environ.get('TICTACTOE_ADDRESS_RATE', 100))
+ADDRESS_BURST = float(os.environ.get('TICTACTOE_ADDRESS_BURST', 200))
+GLOBAL_RATE = float(os.environ.get('TICTACTOE_GLOBAL_RATE', 5000))
+GLOBAL_BURST = float(os.environ.get('TICTACTOE_GLOBAL_BURST', 10000))
+# account and game creations running at once; more are refused with a 429 rather than queued
+MAX_USER_CREATES = int(os.environ.get('TICTACTOE_MAX_USER_CREATES', 4))
+MAX_GAME_CREATES = int(os.environ.get('TICTACTOE_MAX_GAME_CREATES', 256))
+
+if CLUSTER_DB and not NODE_URL:
+    raise RuntimeError("TICTACTOE_CLUSTER_DB needs TICTACTOE_NODE_URL")
+ROUTER = GameRouter(NodeRegistry(CLUSTER_DB), NODE_ID, NODE_URL) if CLUSTER_DB else None
+USER_DB = UserDB(accounts=SQLiteAccountStore(USER_DB_PATH) if USER_DB_PATH else None)
+GAME_EVENTS = GameEventHub()
+ADMISSION = AdmissionController(USER_RATE, USER_BURST, GLOBAL_RATE, GLOBAL_BURST, ADDRESS_RATE, ADDRESS_BURST,
+                                concurrency={'create_user': MAX_USER_CREATES, 'create_game': MAX_GAME_CREATES})
+TicTacToe_DB = AsyncTicTacToeDB(USER_DB, storage=SQLiteStorage(DB_PATH) if DB_PATH else None,
+                                latency=FixedLatency(QUERY_TIME) if QUERY_TIME else NO_LATENCY,
+                                num_shards=NUM_SHARDS,
+                                idle_ttl=IDLE_TTL or None, finished_ttl=FINISHED_TTL or None,
+                                archive=SQLiteStorage(ARCHIVE_PATH) if ARCHIVE_PATH else None,
+                                on_evict=GAME_EVENTS.close,
+                                new_game_id=ROUTER.new_game_id if ROUTER is not None else None,
+                                journal=GameJournal(JOURNAL_DIR) if JOURNAL_DIR else None,
+                                snapshot_interval=SNAPSHOT_INTERVAL or None)
+
+
+async def notify_match(match: Match):
+    """
+    Pushes a new matchmaking game to both players on users/{username}/match.
+    Only the MQTT process pushes; see MQTT_PUBLISHER.
+    """
+    if MQTT_PUBLISHER is not None:
+        for username in match.players:
+            reply = without_secrets(match_reply(match, username))  # anyone may subscribe to users/+/match
+            await MQTT_PUBLISHER.publish(f"users/{username}/match", json.dumps(reply), qos=1)
+
+
+# pairs queued players into games; each worker matches the players that reached it
+MATCHMAKER = Matchmaker(TicTacToe_DB, notify=notify_match)
+# client forwarding requests to the worker that owns a game, cluster mode only
+FORWARD_CLIENT: Optional[httpx.AsyncClient] = None
+
+REGISTRY.register_callback('games_resident', 'games held in memory', lambda: TicTacToe_DB.resident_games)
+REGISTRY.register_callback('games_evicted_total', 'games evicted by the TTL reaper',
+                           lambda: TicTacToe_DB.evictions, kind='counter')
+REGISTRY.register_callback('db_pending_writes', 'game changes not yet flushed to storage',
+                           lambda: TicTacToe_DB.pending_writes)
+if TicTacToe_DB._journal is not None:
+    REGISTRY.register_callback('journal_pending_bytes', 'journal records waiting for the next batch',
+                               lambda: TicTacToe_DB._journal.pending_bytes)
+REGISTRY.register_callback('matchmaking_queue_length', 'players waiting for a match', lambda: len(MATCHMAKER))
+REGISTRY.register_callback('matchmaking_matches_total', 'games created by matchmaking',
+                           lambda: MATCHMAKER.matches, kind='counter')
+REGISTRY.register_callback('users', 'registered accounts', lambda: USER_DB.num_users)
+REGISTRY.register_callback('admission_requests_total', 'requests let in by admission control',
+                           lambda: ADMISSION.admitted, kind='counter', result='admitted')
+for _reason in ('address', 'user', 'global', 'concurrency'):
+    REGISTRY.register_callback('admission_requests_total', 'requests let in by admission control',
+                               lambda reason=_reason: ADMISSION.throttled[reason], kind='counter',
+                               result='throttled', reason=_reason)
+REGISTRY.register_callback('user_db_hash_queue_depth', 'Argon2 jobs waiting for a worker',
+                           lambda: USER_DB.hash_stats.queue_depth)
+REGISTRY.register_callback('user_db_hash_in_flight', 'Argon2 jobs running',
+                           lambda: USER_DB.hash_stats.in_flight)
+REGISTRY.register_callback('credential_cache_requests_total', 'credential cache lookups',
+                           lambda: USER_DB.credential_cache.hits, kind='counter', result='hit')
+REGISTRY.register_callback('credential_cache_requests_total', 'credential cache lookups',
+                           lambda: USER_DB.credential_cache.misses, kind='counter', result='miss')
+REGISTRY.register_callback('sse_subscriptions', 'open /game/{id}/events streams',
+                           lambda: GAME_EVENTS.active_subscriptions)
+REGISTRY.register_callback('sse_frames_dropped_total', 'SSE frames replaced by a resync',
+                           lambda: GAME_EVENTS.dropped, kind='counter')
+if ROUTER is not None:
+    REGISTRY.register_callback('cluster_forwarded_total', 'requests forwarded to the owning worker',
+                               lambda: ROUTER.forwarded, kind='counter')
+    REGISTRY.register_callback('cluster_nodes', 'live workers on the hash ring', lambda: len(ROUTER.nodes))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global FORWARD_CLIENT
+    if ROUTER is not None:
+        await ROUTER.start()
+        FORWARD_CLIENT = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=None))  # no read timeout for SSE
+    await TicTacToe_DB.start()
+    MATCHMAKER.start()
+    yield
+    await MATCHMAKER.stop()
+    await TicTacToe_DB.close()
+    if ROUTER is not None:
+        await FORWARD_CLIENT.aclose()
+        await ROUTER.stop()
+
 
-USER_DB = UserDB()
-TicTacToe_DB = AsyncTicTacToeDB(USER_DB)
 app = FastAPI(
     title="Tic-Tac-Toe Server",
-    description="Implementation of a simultaneous multi-game Tic-Tac-Toe server by Juan Avila."
+    description="Implementation of a simultaneous multi-game Tic-Tac-Toe server by Juan Avila.",
+    lifespan=lifespan
 )
 
 security = HTTPBasic()
 
+FORWARDED_HEADER = 'x-tictactoe-forwarded'
+_GAME_PATH = re.compile(r'^/game/(?!create/)([^/]+)/')
+_HOP_HEADERS = frozenset(['connection', 'keep-alive', 'transfer-encoding', 'host', 'content-length'])
 
-async def mqtt_setup():
-
-    async with Client("localhost") as client:
-        await client.subscribe("get_game")
-        async with client.unfiltered_messages() as messages:
-            async for message in messages:
-                message_str = message.payload.decode()
 
-                if message_str.startswith("create_user"):
-                    # Delete the command portion of the message ("create_user")
-                    message_params = message_str.replace("create_user", '')
-                    # Then feed the remaining message of only the parameter(s) (username).
-                    await create_user(client, message_params)
+@app.middleware('http')
+async def route_to_owner(request: Request, call_next):
+    """
+    In cluster mode, forwards /game/{game_id}/... requests to the worker that
+    owns the game and streams its response back.  Forwarded requests are
+    always served where they land, so a stale ring can't bounce them around.
+    """
+    match = _GAME_PATH.match(request.url.path)
+    if ROUTER is None or match is None or FORWARDED_HEADER in request.headers:
+        return await call_next(request)
+    owner_url = ROUTER.owner_url(match.group(1))
+    if owner_url is None:
+        return await call_next(request)
+    ROUTER.forwarded += 1
+    request.scope['tictactoe.forwarded'] = True
+    headers = {name: value for name, value in request.headers.items() if name not in _HOP_HEADERS}
+    headers[FORWARDED_HEADER] = ROUTER.node_id
+    url = owner_url + request.url.path + (f"?{request.url.query}" if request.url.query else '')
+    forward = FORWARD_CLIENT.build_request(request.method, url, headers=headers, content=await request.body())
+    try:
+        response = await FORWARD_CLIENT.send(forward, stream=True)
+    except httpx.TransportError as error:
+        return JSONResponse({'detail': f"game owner {owner_url} unreachable: {error}"},
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return StreamingResponse(response.aiter_raw(), status_code=response.status_code,
+                             headers={name: value for name, value in response.headers.items()
+                                      if name not in _HOP_HEADERS},
+                             background=BackgroundTask(response.aclose))
 
-                elif message_str.startswith("create_game"):
-                    message_params = message_str.replace("create_game", '')
-                    await create_game(client, message_params)
 
-                elif message_str.startswith("add_player"):
-                    message_params = message_str.replace("add_player", '')
-                    await add_player(client, message_params)
+def client_address(request: Request) -> Optional[str]:
+    """
+    :return: the address a request is counted against, None for requests
+        another worker forwarded (and already counted)
+    """
+    if ROUTER is not None and FORWARDED_HEADER in request.headers:
+        return None
+    return request.client.host if request.client else ''
 
-                elif message_str.startswith("get_player_idx"):
-                    message_params = message_str.replace("get_player_idx", '')
-                    await get_player_idx(client, message_params)
 
-                elif message_str.startswith("init_game"):
-                    message_params = message_str.replace("init_game", '')
-                    await init_game(client, message_params)
+@app.middleware('http')
+async def admit(request: Request, call_next):
+    """
+    Refuses requests over their address's or the server's rate with a 429
+    before any route (or forwarding) runs; the user's own rate is checked by
+    authenticate().  /metrics is never throttled.
+    """
+    if request.url.path != '/metrics':
+        try:
+            ADMISSION.admit(client_address(request))
+        except HTTPException as error:
+            request.scope['tictactoe.throttled'] = True
+            return JSONResponse({'detail': error.detail}, status_code=error.status_code, headers=error.headers)
+    return await call_next(request)
 
-                elif message_str.startswith("get_winners"):
-                    message_params = message_str.replace("get_winners", '')
-                    await get_winners(client, message_params)
 
-                elif message_str.startswith("delete_game"):
-                    message_params = message_str.replace("delete_game", '')
-                    await delete_game(client, message_params)
+@app.middleware('http')
+async def record_latency(request: Request, call_next):
+    """
+    Records every request in http_request_seconds, labelled with the route
+    template (/game/{game_id}/move) rather than the path, so game ids don't
+    create a series each.
+    """
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        route = request.scope.get('route')
+        if request.scope.get('tictactoe.throttled'):
+            template = 'throttled'
+        elif request.scope.get('tictactoe.forwarded'):
+            template = 'forwarded'
+        else:
+            template = route.path if route is not None else 'unmatched'
+        REGISTRY.histogram('http_request_seconds', 'HTTP request time, forwarding included',
+                           method=request.method, route=template).record(time.perf_counter() - start)
 
 
 async def get_game(game_id: str) -> TicTacToe:
@@ -70,73 +266,270 @@ async def get_game(game_id: str) -> TicTacToe:
     return the_game
 
 
+async def check_credentials(credentials: HTTPBasicCredentials = Depends(security)) -> HTTPBasicCredentials:
+    """
+    Checks HTTP Basic credentials against the UserDB, otherwise raise a 401.
+    Repeat requests are answered from the UserDB's verified-credential cache.
+    """
+    if not await USER_DB.is_valid_async(credentials.username, credentials.password):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail=f"Game unauthorized access and command.")
+    return credentials
+
+
+async def authenticate(credentials: HTTPBasicCredentials = Depends(check_credentials)) -> HTTPBasicCredentials:
+    """
+    check_credentials(), then charges the request to the user's rate.
+    """
+    ADMISSION.charge(credentials.username)
+    return credentials
+
+
+async def require_admin(credentials: HTTPBasicCredentials = Depends(authenticate)) -> HTTPBasicCredentials:
+    """
+    authenticate(), then a 403 unless the user is listed in TICTACTOE_ADMINS.
+    """
+    if credentials.username not in ADMINS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admins only.")
+    return credentials
+
+
 @app.get('/')
 async def home():
     return {"message": "Welcome to TicTacToe! :D"}
 
 
-@app.post('/user/create')
-async def create_user(client, message_param):
-    try:
-        new_username, new_password = USER_DB.create_user(message_param)
-    except ValueError:
-        await client.publish(("users/" + str(message_param) + "/error"),
-                             "That username already exists!", qos=1)
-        raise MqttError("That username already exists!")
-    await client.publish(("users/" + str(new_username) + "/create_success"), "True", qos=1)
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    """
+    Latency histograms, gauges and counters in the Prometheus text format.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
 
 
-@app.get('/game/create/{num_players}', status_code=status.HTTP_201_CREATED)
-async def create_game(credentials: HTTPBasicCredentials = Depends(security)):
-    user = credentials.username
-    password = credentials.password
-    if UserDB.is_valid(self=USER_DB, username=user, password=password):
-        owner_username = user
-        new_uuid, new_term_pass, game_owner = await TicTacToe_DB.add_game()
-        game_info = await TicTacToe_DB.get_game_info(new_uuid)
-        player_list = game_info.players
-        player_list.append(owner_username)
-        return {'success': True,
-                'game_id': new_uuid,
-                'termination_password': new_term_pass,
-                'game_owner': owner_username}
-    else:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail=f"Game unauthorized access and command.")
+@app.get('/debug/profiler')
+async def profiler_status(credentials: HTTPBasicCredentials = Depends(require_admin)):
+    return {'running': PROFILER.running, 'samples': PROFILER.samples, 'interval_ms': PROFILER.interval * 1e3}
+
+
+@app.post('/debug/profiler/start')
+async def profiler_start(interval_ms: float = Query(5.0, ge=1, le=1000, description='milliseconds between samples'),
+                         credentials: HTTPBasicCredentials = Depends(require_admin)):
+    PROFILER.start(interval_ms / 1e3)
+    return {'running': True, 'interval_ms': PROFILER.interval * 1e3}
 
 
-@app.post('/game/{game_id}/add_player', status_code=status.HTTP_400_BAD_REQUEST)
-async def add_player(game_id: str, username: str, credentials: HTTPBasicCredentials = Depends(security)):
+@app.post('/debug/profiler/stop', response_class=PlainTextResponse)
+async def profiler_stop(limit: Optional[int] = Query(None, ge=1, description='only the most frequent stacks'),
+                        credentials: HTTPBasicCredentials = Depends(require_admin)):
+    """
+    Stops the sampling profiler and returns its collapsed stacks, ready for
+    flamegraph.pl or speedscope.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, PROFILER.stop)
+    return PlainTextResponse(PROFILER.collapsed(limit))
+
+
+@app.post('/user/create')
+async def create_user(username: str = Query(..., description='the desired username')):
+    with ADMISSION.limit('create_user'):
+        new_username, new_password = await USER_DB.create_user_async(username)
+    return {'username': new_username,
+            'password': new_password}
+
+
+@app.get('/game/create/{num_players}', status_code=status.HTTP_201_CREATED)
+async def create_game(num_players: int = Path(..., description='seats in the game'),
+                      credentials: HTTPBasicCredentials = Depends(authenticate)):
+    owner_username = credentials.username
+    with ADMISSION.limit('create_game'):
+        new_uuid, new_term_pass, game_owner = await TicTacToe_DB.add_game(owner_username, num_players)
+    return {'success': True,
+            'game_id': new_uuid,
+            'termination_password': new_term_pass,
+            'game_owner': owner_username}
+
+
+@app.post('/game/{game_id}/add_player')
+async def add_player(game_id: str, username: str, credentials: HTTPBasicCredentials = Depends(authenticate)):
     if username is None:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                             detail=f"Username {username} not entered or found.")
     else:
         game_info = await TicTacToe_DB.get_game_info(game_id)
-        player_list = game_info.players
-        if len(player_list) == game_info.num_players:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                detail=f"Game, Max players capped.")
+        if credentials.username == game_info.owner:
+            player_list = await TicTacToe_DB.add_player(game_id, username)
+            player_idx = player_list.index(username)
+            return {'success': True,
+                    'game_id': game_id,
+                    'player_username': username,
+                    'player_idx': player_idx}
         else:
-            if credentials.username == game_info.owner:
-                if username not in player_list:
-                    player_list.append(username)
-                    player_idx = player_list.index(username)
-                    return {'success': True,
-                            'game_id': game_id,
-                            'player_username': username,
-                            'player_idx': player_idx}
-                else:
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                                        detail=f"player already added.")
-            else:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                    detail=f"Game unauthorized access and command.")
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail=f"Game unauthorized access and command.")
+
+
+@app.get('/games')
+async def list_games(status: Optional[Literal[GAME_STATUSES]] = Query(None,
+                                                                      description='open, in_progress or finished'),
+                     owner: Optional[str] = Query(None, description='only games created by this user'),
+                     player: Optional[str] = Query(None, description='only games this user plays in'),
+                     cursor: Optional[str] = Query(None, description='next_cursor of the previous page'),
+                     limit: int = Query(50, ge=1, le=500, description='games per page')):
+    page = await TicTacToe_DB.list_games(status, owner, player, cursor, limit)
+    return {'games': [{'game_id': game_id, 'num_players': num_players}
+                      for game_id, num_players in page.games],
+            'next_cursor': page.next_cursor}
+
+
+class BatchOperation(BaseModel):
+    action: Literal['create', 'join', 'start', 'move']
+    game_id: str = ''  # every action but 'create'
+    username: str = ''  # the player to seat, for 'join'
+    move: int = 0  # box 1-9, for 'move'
+    num_players: int = 2  # for 'create'
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+def batch_error(error: HTTPException) -> dict:
+    return {'success': False, 'status_code': error.status_code, 'detail': error.detail}
+
+
+async def batch_operation(username: str, item: BatchOperation) -> BatchOp:
+    """
+    Applies the per-route authorization rules to one batch item.
+
+    :param username: the authenticated user sending the batch
+    :raises: HTTPException if the user may not perform the operation
+    """
+    if item.action == 'create':
+        return BatchOp('create', username=username, num_players=item.num_players)
+    if ROUTER is not None and not ROUTER.is_local(item.game_id):
+        raise HTTPException(status_code=status.HTTP_421_MISDIRECTED_REQUEST,
+                            detail=f"Game {item.game_id} is served by {ROUTER.owner_url(item.game_id)}.")
+    if item.action == 'move':
+        return BatchOp('move', item.game_id, username, move=item.move)
+    game_info = await TicTacToe_DB.get_game_info(item.game_id)
+    if username != game_info.owner:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail=f"Game unauthorized access and command.")
+    if item.action == 'join':
+        if not item.username:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=f"Username not entered.")
+        return BatchOp('join', item.game_id, item.username)
+    return BatchOp('start', item.game_id)
+
+
+@app.post('/games/batch')
+async def run_batch(batch: BatchRequest, credentials: HTTPBasicCredentials = Depends(check_credentials)):
+    """
+    Creates, joins, starts and plays many games in one request: credentials
+    are checked once and the operations go to the database as one batch.
+    Each item gets the same rules and reply fields as its single route; a
+    failed item reports its status_code and detail and the rest still run.
+    Every operation costs the user and the server a request's worth of rate.
+    """
+    if len(batch.operations) > MAX_BATCH:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {MAX_BATCH} operations per batch.")
+    # the entry check paid the global bucket for the first operation
+    ADMISSION.charge(credentials.username, max(1, len(batch.operations)),
+                     global_cost=len(batch.operations) - 1)
+    results: List[Optional[dict]] = [None] * len(batch.operations)
+    positions: List[int] = []
+    operations: List[BatchOp] = []
+    for idx, item in enumerate(batch.operations):
+        try:
+            operations.append(await batch_operation(credentials.username, item))
+            positions.append(idx)
+        except HTTPException as error:
+            results[idx] = batch_error(error)
+    with ADMISSION.limit('create_game', sum(1 for operation in operations if operation.action == 'create')):
+        outcomes = await TicTacToe_DB.apply_batch(operations)
+    moved: Dict[str, None] = {}
+    for idx, operation, outcome in zip(positions, operations, outcomes):
+        if isinstance(outcome, HTTPException):
+            results[idx] = batch_error(outcome)
+        elif operation.action == 'create':
+            game_id, term_pass, owner = outcome
+            results[idx] = {'success': True, 'game_id': game_id, 'termination_password': term_pass,
+                            'game_owner': owner}
+        elif operation.action == 'join':
+            results[idx] = {'success': True, 'game_id': operation.game_id, 'player_username': operation.username,
+                            'player_idx': outcome.index(operation.username)}
+        elif operation.action == 'start':
+            GAME_EVENTS.publish(operation.game_id, 'snapshot', outcome)
+            results[idx] = {'success': True, 'game_id': operation.game_id}
+        else:
+            GAME_EVENTS.publish(operation.game_id, 'move', outcome)
+            moved[operation.game_id] = None
+            results[idx] = dict(success=True, game_id=operation.game_id, **outcome)
+    for game_id in moved if MQTT_PUBLISHER is not None else ():
+        the_game = await TicTacToe_DB.get_game(game_id)
+        if the_game is not None:
+            await publish_state(game_id, the_game)  # once per game, with its final state
+    failed = sum(1 for result in results if not result['success'])
+    return {'results': results, 'succeeded': len(results) - failed, 'failed': failed}
+
+
+async def match_in_progress(match: Match) -> bool:
+    try:
+        return (await TicTacToe_DB.get_game_info(match.game_id)).status != GAME_FINISHED
+    except HTTPException:  # deleted or expired
+        return False
+
+
+def match_reply(match: Match, username: str) -> dict:
+    reply = {'matched': True,
+             'game_id': match.game_id,
+             'players': list(match.players),
+             'player_idx': match.players.index(username)}
+    if username == match.players[0]:
+        reply['termination_password'] = match.termination_password
+    return reply
+
+
+@app.post('/matchmaking/join')
+async def join_matchmaking(rating: float = Query(DEFAULT_RATING, allow_inf_nan=False,
+                                                description='skill rating to match on'),
+                           wait: float = Query(0, ge=0, le=60, description='seconds to wait for a match'),
+                           credentials: HTTPBasicCredentials = Depends(authenticate)):
+    """
+    Queues the user for a game against the nearest-rated waiting player.  With
+    wait > 0 the request is held until a match is found or the time runs out;
+    the match is also pushed to users/{username}/match over MQTT.  Joining
+    again while queued keeps the original place (and rating) in the queue, and
+    joining again once matched returns the match until its game is over.
+    """
+    match = MATCHMAKER.last_match(credentials.username)
+    if match is not None and await match_in_progress(match):
+        return match_reply(match, credentials.username)
+    future = MATCHMAKER.pending(credentials.username) or MATCHMAKER.enqueue(credentials.username, rating)
+    if wait:
+        try:
+            return match_reply(await asyncio.wait_for(asyncio.shield(future), wait), credentials.username)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return {'matched': False, 'queued': False}  # left the queue while waiting
+    return {'matched': False, 'queued': True, 'queue_length': len(MATCHMAKER)}
+
+
+@app.post('/matchmaking/leave')
+async def leave_matchmaking(credentials: HTTPBasicCredentials = Depends(authenticate)):
+    return {'success': MATCHMAKER.cancel(credentials.username)}
 
 
 @app.get('/game/{game_id}/get_player_idx')
 async def get_player_idx(game_id: str = Path(..., description='the unique game id'),
                          username: str = Query(..., description='the unique game id'),
-                         credentials: HTTPBasicCredentials = Depends(security)):
+                         credentials: HTTPBasicCredentials = Depends(authenticate)):
     game_info = await TicTacToe_DB.get_game_info(game_id)
     player_list = game_info.players
     idx = 0
@@ -157,11 +550,11 @@ async def get_player_idx(game_id: str = Path(..., description='the unique game i
 
 @app.post('/game/{game_id}/initialize')
 async def init_game(game_id: str = Path(..., description='the unique game id'),
-                    credentials: HTTPBasicCredentials = Depends(security)):
+                    credentials: HTTPBasicCredentials = Depends(authenticate)):
     game_info = await TicTacToe_DB.get_game_info(game_id)
     if credentials.username == game_info.owner:
-        the_game = await get_game(game_id)
-        the_game.initial_deal()
+        the_game = await TicTacToe_DB.init_game(game_id)
+        GAME_EVENTS.publish(game_id, 'snapshot', the_game.to_dict())
         return {'success': True}
     else:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
@@ -171,23 +564,263 @@ async def init_game(game_id: str = Path(..., description='the unique game id'),
 @app.get('/game/{game_id}/winners')
 async def get_winners(game_id: str = Path(..., description='the unique game id')):
     the_game = await get_game(game_id)
-    winner_list = the_game.check_win()
+    winner = the_game.winner()
     return {'game_id': game_id,
-            'winners': winner_list}
+            'status': the_game.status(),
+            'winners': [winner] if winner is not None else []}
+
+
+@app.post('/game/{game_id}/move')
+async def make_move(game_id: str = Path(..., description='the unique game id'),
+                    move: int = Query(..., description='the box to play, 1-9'),
+                    credentials: HTTPBasicCredentials = Depends(authenticate)):
+    the_game = await TicTacToe_DB.play_move(game_id, credentials.username, move)
+    GAME_EVENTS.publish(game_id, 'move', the_game.move_delta())
+    await publish_state(game_id, the_game)
+    return {'success': True,
+            'game_id': game_id,
+            'status': the_game.status(),
+            'state': the_game.to_dict()}
+
+
+@app.get('/game/{game_id}/events')
+async def game_events(game_id: str = Path(..., description='the unique game id')):
+    """
+    Server-Sent Events stream of a game: a 'snapshot' event with the full state,
+    then a 'move' event per move ({seq, sign, box, next, status, winner}).  A
+    client that falls behind gets a new 'snapshot' instead of the moves it missed.
+    """
+    the_game = await get_game(game_id)
+    # subscribe and snapshot without awaiting in between, so no move falls in the gap
+    subscription = GAME_EVENTS.subscribe(game_id)
+    snapshot = sse_frame('snapshot', the_game.to_dict())
+
+    async def stream():
+        try:
+            yield snapshot
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.get(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b': keep-alive\n\n'
+                    continue
+                if frame is None:
+                    return
+                if frame is RESYNC:
+                    current = await TicTacToe_DB.get_game(game_id)
+                    if current is None:
+                        return
+                    frame = sse_frame('snapshot', current.to_dict())
+                yield frame
+        finally:
+            GAME_EVENTS.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
+
+
+@app.get('/game/{game_id}/hint')
+async def get_hint(game_id: str = Path(..., description='the unique game id')):
+    the_game = await get_game(game_id)
+    return {'game_id': game_id,
+            'move': the_game.hint()}
 
 
 @app.post('/game/{game_id}/terminate')
 async def delete_game(game_id: str = Path(..., description='the unique game id'),
                       password: str = Query(..., description='the termination password'),
-                      credentials: HTTPBasicCredentials = Depends(security)):
-    the_game = await TicTacToe_DB.del_game(game_id, password, credentials.username)
+                      credentials: HTTPBasicCredentials = Depends(authenticate)):
+    the_game = await TicTacToe_DB.del_game(game_id, password)
     if password is None:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                             detail=f"Game {password} not entered or found.")
     if the_game is False:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Game not found.")
+    GAME_EVENTS.close(game_id)
     return {'success': True, 'deleted_id': game_id}
 
+
+MQTT_COMMANDS = CommandDispatcher(reply_errors=(CommandError, HTTPException))
+MQTT_TOPICS = ['games/+/+', 'users/+/+', 'get_game']
+# outbound queue of the connected MQTT client, None while disconnected.  Only
+# mqtt_setup() (the MQTT process, main()) sets it: the HTTP app run by uvicorn
+# never connects to the broker, so publish_state() and notify_match() do
+# nothing there and HTTP clients use /game/{game_id}/events instead.
+MQTT_PUBLISHER: Optional[PublishQueue] = None
+
+
+async def publish_state(game_id: str, the_game: TicTacToe):
+    """
+    Pushes a game's board to games/{game_id}/state.  Only the latest board of a
+    game is kept while the publish queue is backed up.
+    """
+    if MQTT_PUBLISHER is not None:
+        await MQTT_PUBLISHER.publish(f"games/{game_id}/state",
+                                     json.dumps({'status': the_game.status(), 'state': the_game.to_dict()}),
+                                     qos=1, coalesce=True)
+
+
+# The MQTT commands authenticate with 'username' / 'password' payload fields and
+# reuse the REST handlers above, replying with the same JSON on
+# {root}/{subject}/{action}/reply.
+CREDENTIAL_FIELDS = {'username': str, 'password': str}
+
+
+async def mqtt_credentials(command: Command) -> HTTPBasicCredentials:
+    credentials = HTTPBasicCredentials(username=command.params['username'], password=command.params['password'])
+    return await authenticate(await check_credentials(credentials))
+
+
+def mqtt_anonymous():
+    """
+    Counts a command without credentials.  MQTT doesn't tell us who published
+    it, so all of them share one bucket, like a single client address.
+    """
+    ADMISSION.charge('mqtt', kind='address')
+
+
+# Everyone watching a game subscribes to its reply topics, so passwords are only
+# sent to the 'reply_to' topic the requesting client named.  That keeps them off
+# the shared topics but hides nothing from a client that may subscribe to '#':
+# commands carry passwords in plain JSON, so only the broker's TLS and ACLs keep
+# them confidential (see the README).
+SECRET_FIELDS = frozenset(['password', 'termination_password'])
+_REPLY_TO = re.compile(r'^replies/[A-Za-z0-9_-]{1,128}$')
+
+
+def without_secrets(result: dict) -> dict:
+    return {name: value for name, value in result.items() if name not in SECRET_FIELDS}
+
+
+def mqtt_reply_to(command: Command) -> Optional[str]:
+    """
+    :return: the reply topic the command asked for, None if it gave none or an invalid one
+    """
+    reply_to = command.params.get('reply_to')
+    return reply_to if isinstance(reply_to, str) and _REPLY_TO.match(reply_to) else None
+
+
+async def mqtt_reply(client, command: Command, result: dict):
+    """
+    Publishes a result on the command's reply_to topic, or without its
+    secrets on {root}/{subject}/{action}/reply.
+    """
+    reply_to = mqtt_reply_to(command)
+    if reply_to is not None:
+        await client.publish(reply_to, json.dumps(result), qos=1)
+    else:
+        await client.publish(reply_topic(command), json.dumps(without_secrets(result)), qos=1)
+
+
+@MQTT_COMMANDS.register('users', 'create', legacy_name='create_user')
+async def mqtt_create_user(client, command: Command):
+    if mqtt_reply_to(command) is None:  # the password is never sent on the shared reply topic
+        raise CommandError("creating an account needs a 'reply_to' topic for the password: replies/ and "
+                           "1-128 letters, digits, '-' or '_'")
+    mqtt_anonymous()
+    with ADMISSION.limit('create_user'):
+        new_username, new_password = await USER_DB.create_user_async(command.subject)
+    await mqtt_reply(client, command, {'success': True, 'username': new_username, 'password': new_password})
+
+
+@MQTT_COMMANDS.register('users', 'create_game', CREDENTIAL_FIELDS, legacy_name='create_game')
+async def mqtt_create_game(client, command: Command):
+    credentials = await mqtt_credentials(command)
+    num_players = command.params.get('num_players', 2)
+    if type(num_players) is not int:
+        raise CommandError("field 'num_players' must be an int")
+    await mqtt_reply(client, command, await create_game(num_players, credentials))
+
+
+@MQTT_COMMANDS.register('users', 'matchmake', CREDENTIAL_FIELDS)
+async def mqtt_matchmake(client, command: Command):
+    credentials = await mqtt_credentials(command)
+    rating = command.params.get('rating', DEFAULT_RATING)
+    if isinstance(rating, bool) or not isinstance(rating, (int, float)) or not math.isfinite(rating):
+        raise CommandError("field 'rating' must be a finite number")
+    await mqtt_reply(client, command, await join_matchmaking(rating, 0, credentials))
+
+
+@MQTT_COMMANDS.register('games', 'add_player', dict(CREDENTIAL_FIELDS, player=str), legacy_name='add_player')
+async def mqtt_add_player(client, command: Command):
+    credentials = await mqtt_credentials(command)
+    await mqtt_reply(client, command, await add_player(command.subject, command.params['player'], credentials))
+
+
+@MQTT_COMMANDS.register('games', 'get_player_idx', dict(CREDENTIAL_FIELDS, player=str),
+                        legacy_name='get_player_idx')
+async def mqtt_get_player_idx(client, command: Command):
+    credentials = await mqtt_credentials(command)
+    await mqtt_reply(client, command, await get_player_idx(command.subject, command.params['player'], credentials))
+
+
+@MQTT_COMMANDS.register('games', 'init_game', CREDENTIAL_FIELDS, legacy_name='init_game')
+async def mqtt_init_game(client, command: Command):
+    credentials = await mqtt_credentials(command)
+    await mqtt_reply(client, command, await init_game(command.subject, credentials))
+
+
+@MQTT_COMMANDS.register('games', 'move', dict(CREDENTIAL_FIELDS, move=int))
+async def mqtt_make_move(client, command: Command):
+    credentials = await mqtt_credentials(command)
+    await mqtt_reply(client, command, await make_move(command.subject, command.params['move'], credentials))
+
+
+@MQTT_COMMANDS.register('games', 'winners', legacy_name='get_winners')
+async def mqtt_get_winners(client, command: Command):
+    mqtt_anonymous()
+    await mqtt_reply(client, command, await get_winners(command.subject))
+
+
+@MQTT_COMMANDS.register('games', 'delete_game', dict(CREDENTIAL_FIELDS, termination_password=str),
+                        legacy_name='delete_game')
+async def mqtt_delete_game(client, command: Command):
+    credentials = await mqtt_credentials(command)
+    await mqtt_reply(client, command, await delete_game(command.subject, command.params['termination_password'],
+                                                        credentials))
+
+
+async def mqtt_setup(client_factory=Client):
+    global MQTT_PUBLISHER
+
+    async with client_factory(MQTT_HOST) as client:
+        for topic in MQTT_TOPICS:
+            await client.subscribe(topic)
+        # handlers publish through the queue, so replies don't wait on each other's acks
+        publisher = PublishQueue(client, max_in_flight=MQTT_MAX_IN_FLIGHT)
+        publisher.start()
+        MQTT_PUBLISHER = publisher
+        workers = PartitionedWorkerPool(num_workers=MQTT_WORKERS)
+        workers.start()
+        REGISTRY.register_callback('mqtt_command_queue_depth', 'MQTT commands waiting for a worker',
+                                   lambda: workers.queue_depth)
+        REGISTRY.register_callback('mqtt_publish_queued', 'MQTT publishes waiting to be sent',
+                                   lambda: publisher.stats.queued)
+        REGISTRY.register_callback('mqtt_publish_in_flight', 'MQTT publishes awaiting an ack',
+                                   lambda: publisher.stats.in_flight)
+        try:
+            async with client.unfiltered_messages() as messages:
+                async for message in messages:
+                    topic = getattr(message.topic, 'value', message.topic)
+                    key = MQTT_COMMANDS.partition_key(topic, message.payload)
+                    if ROUTER is not None and not ROUTER.is_local(key):
+                        continue  # every worker sees every command; only the owner of the game / user runs it
+                    if is_reply(topic):
+                        continue  # our own replies, which the dispatcher would skip anyway
+                    try:
+                        ADMISSION.admit(None)  # users are charged once their credentials check out
+                    except HTTPException as error:  # refused before it takes a place in a worker queue
+                        await publisher.publish(error_topic(topic), error.detail, qos=1)
+                        continue
+                    # same game id / username -> same partition, so their commands stay in order
+                    await workers.submit(key, functools.partial(MQTT_COMMANDS.dispatch, publisher, topic,
+                                                                message.payload))
+        finally:
+            MQTT_PUBLISHER = None
+            await workers.stop(drain=False)
+            await publisher.stop(drain=False)
+
+
 """
 if __name__ == '__main__':
     # running from main instead of terminal allows for debugger
@@ -203,15 +836,28 @@ async def main():
     # Run the advanced_example indefinitely. Reconnect automatically
     # if the connection is lost.
     reconnect_interval = 3  # [seconds]
-    while True:
-        try:
-            await mqtt_setup()
-        except MqttError as error:
-            print(f'Error "{error}". Reconnecting in {reconnect_interval} seconds.')
-        finally:
-            await asyncio.sleep(reconnect_interval)
+    if ROUTER is not None:
+        await ROUTER.start()
+    await TicTacToe_DB.start()  # loads stored games, starts the flusher, reaper and journal
+    MATCHMAKER.start()
+    try:
+        while True:
+            try:
+                await mqtt_setup()
+            except MqttError as error:
+                print(f'Error "{error}". Reconnecting in {reconnect_interval} seconds.')
+            finally:
+                await asyncio.sleep(reconnect_interval)
+    finally:
+        await MATCHMAKER.stop()
+        await TicTacToe_DB.close()
+        if ROUTER is not None:
+            await ROUTER.stop()
+
 
-# Change to the "Selector" event loop
-asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-# Run your async application as usual
-asyncio.run(main())
+if __name__ == '__main__':
+    if sys.platform == 'win32':
+        # Change to the "Selector" event loop
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    # Run your async application as usual
+    asyncio.run(main())